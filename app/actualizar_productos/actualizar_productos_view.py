@@ -3,7 +3,6 @@ import os
 
 from PySide6.QtCore import QThread, QDate, Qt
 from PySide6.QtWidgets import QFileDialog, QHeaderView, QHBoxLayout, QLabel, QLineEdit, QPushButton
-from shiboken6 import isValid
 
 from app.actualizar_productos.ui.ui_view_actualizar_productos import Ui_ActualizarProductos
 from app.actualizar_productos.controlador_actualizar_productos import ControladorActualizarProductos, COL_CATEGORIA, COL_PRECIO_COMPRA
@@ -12,7 +11,8 @@ from app.actualizar_productos.worker_actualizar_productos import (
     WorkerAplicarCambios,
 )
 
-from app.core.base_windows import BaseModuleWindow
+from app.core.base_windows import BaseModuleWindow, soltar_hilo
+from app.core.cancelacion import TokenCancelacion
 from app.core.proceso import ProcessDialog
 from app.core.dialogos import mostrar_error, mostrar_info
 from app.core.table_enhancer import TableEnhancer
@@ -38,13 +38,14 @@ class ActualizarProductosView(BaseModuleWindow):
 
         self._build_menu()
 
-        self.controlador = ControladorActualizarProductos()
+        self.controlador = ControladorActualizarProductos(self.catalogo_compartido())
         self.datos_archivo = None
 
         self.thread = None
         self.worker = None
         self.thread_aplicar = None
         self.worker_aplicar = None
+        self.cancelacion: TokenCancelacion | None = None  # del proceso en curso (procesar o aplicar)
 
         self.dialogo = None
         self._procesado = False
@@ -137,22 +138,30 @@ class ActualizarProductosView(BaseModuleWindow):
     # Threads lifecycle
     # ----------------------------
     def _detener_hilos(self):
-        for thread in (self.thread, self.thread_aplicar):
-            if thread and isValid(thread):
-                try:
-                    if thread.isRunning():
-                        thread.quit()
-                        thread.wait()
-                except RuntimeError:
-                    pass
+        soltar_hilo(self.thread, self.worker, self.cancelacion)
+        soltar_hilo(self.thread_aplicar, self.worker_aplicar, self.cancelacion)
 
         self.thread = None
         self.worker = None
         self.thread_aplicar = None
         self.worker_aplicar = None
+        self.cancelacion = None
+
+    def _cancelar(self):
+        if self.dialogo is None:
+            return
+        aplicando = self.thread_aplicar is not None
+        self._cerrar_dialogo()
+        self._detener_hilos()
+        self._set_ocupado(False)
+        self.ui.progressBar.setValue(0)
+        self.ui.lblProcesando.setText("")
+        # Aplicar: los lotes ya enviados quedan aplicados y su estado sigue visible en la tabla.
+        self.ui.labelEstado.setText("Aplicación de cambios cancelada" if aplicando else "Procesamiento cancelado")
 
     def closeEvent(self, event):
         self._detener_hilos()
+        self.controlador.cerrar()
         if getattr(self, 'menu_controller', None):
             try:
                 self.menu_controller.raise_()
@@ -203,10 +212,12 @@ class ActualizarProductosView(BaseModuleWindow):
         self.dialogo.set_titulo("Procesando Productos")
         self.dialogo.reset()
         self.dialogo.set_mensaje("Procesando...")
+        self.dialogo.rejected.connect(self._cancelar)
         self.dialogo.show()
 
+        self.cancelacion = TokenCancelacion()
         self.thread = QThread(self)
-        self.worker = WorkerActualizarProductos(self.controlador, self.datos_archivo)
+        self.worker = WorkerActualizarProductos(self.controlador, self.datos_archivo, self.cancelacion)
         self.worker.moveToThread(self.thread)
 
         self.thread.started.connect(self.worker.ejecutar)
@@ -240,14 +251,17 @@ class ActualizarProductosView(BaseModuleWindow):
         self.dialogo.set_titulo("Aplicando Cambios")
         self.dialogo.reset()
         self.dialogo.set_mensaje("Aplicando cambios...")
+        self.dialogo.rejected.connect(self._cancelar)
         self.dialogo.show()
 
+        self.cancelacion = TokenCancelacion()
         self.thread_aplicar = QThread(self)
-        self.worker_aplicar = WorkerAplicarCambios(self.controlador)
+        self.worker_aplicar = WorkerAplicarCambios(self.controlador, self.cancelacion)
         self.worker_aplicar.moveToThread(self.thread_aplicar)
 
         self.thread_aplicar.started.connect(self.worker_aplicar.ejecutar)
         self.worker_aplicar.progreso.connect(self._actualizar_progreso)
+        self.worker_aplicar.estado.connect(self._actualizar_estado)
         self.worker_aplicar.terminado.connect(self._finalizar_aplicar)
         self.worker_aplicar.error.connect(self._error)
 
@@ -270,13 +284,18 @@ class ActualizarProductosView(BaseModuleWindow):
             self.dialogo.set_progreso(valor)
             self.dialogo.set_mensaje(mensaje)
 
+    def _actualizar_estado(self, registro, estado):
+        # Slot de la ventana: corre en el hilo de la interfaz aunque el worker emita desde el suyo.
+        self.controlador.actualizar_estado(registro, estado)
+
     def _cerrar_dialogo(self):
-        if self.dialogo:
+        # Se suelta antes de cerrarlo: su closeEvent emite rejected, que aquí significa "cancelar".
+        dialogo, self.dialogo = self.dialogo, None
+        if dialogo:
             try:
-                self.dialogo.close()
+                dialogo.close()
             except Exception:
                 pass
-            self.dialogo = None
 
     def _aplicar_columnas_dinamicas(self):
         # Oculta columnas opcionales si no existen datos reales en la data
@@ -332,6 +351,8 @@ class ActualizarProductosView(BaseModuleWindow):
     def _error(self, mensaje):
         self._cerrar_dialogo()
         self._set_ocupado(False)
+        if mensaje == "__CANCELADO__":
+            return
         mostrar_error(mensaje, self)
 
     # ----------------------------
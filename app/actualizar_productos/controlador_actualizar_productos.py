@@ -1,16 +1,24 @@
 # app/actualizar_productos/controlador_actualizar_productos.py
 import csv
 from dataclasses import dataclass
+from functools import partial
 from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from openpyxl import load_workbook, Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, Alignment, PatternFill
 from openpyxl.utils import get_column_letter
 from PySide6.QtCore import QAbstractTableModel, QModelIndex, Qt
 from PySide6.QtGui import QFont
 
-from app.core.cliente_woocommerce import ClienteWooCommerce
+from app.core.cancelacion import TokenCancelacion
+from app.core.cliente_woocommerce import ClienteWooCommerce, LOTE_MAXIMO
+from app.core.excepciones import OperacionCancelada
+from app.core.progreso import AgregadorProgreso
+from app.core.servicio_catalogo import ServicioCatalogo
+from app.core.table_enhancer import SORT_ROLE, SortKeyCache
+from app.core.costos import costo_compra
 
 
 HEADERS_UI = [
@@ -32,6 +40,11 @@ COL_PRECIO_VENTA_ACTUAL = 7
 COL_PRECIO_VENTA_NUEVO = 8
 COL_ESTADO = 9
 
+_COLS_STOCK = (COL_STOCK_ACTUAL, COL_STOCK_NUEVO)
+_COLS_PRECIO = (COL_PRECIO_ACTUAL, COL_PRECIO_COMPRA, COL_PRECIO_VENTA_ACTUAL, COL_PRECIO_VENTA_NUEVO)
+_COLS_EDITABLES = (COL_STOCK_NUEVO, COL_PRECIO_VENTA_NUEVO)
+_CENTAVOS = Decimal("0.01")
+
 
 # ----------------------------
 # Utilidades
@@ -110,27 +123,30 @@ def _fmt_money(x: Any) -> str:
     return s
 
 
-def _get_meta(meta_data: List[dict], key: str) -> Optional[str]:
-    for m in meta_data or []:
-        if m.get("key") == key:
-            v = m.get("value")
-            return None if v is None else str(v)
-    return None
-
-
-def _get_purchase_cost(product: dict) -> Decimal:
-    """
-    Prioridad multi-tienda:
-      1) _purchase_price (ATUM)
-      2) _wc_cog_cost (Cost of Goods)
-      3) purchase_price (legacy/custom)
-    """
-    meta = product.get("meta_data", []) or []
-    for k in ("_purchase_price", "_wc_cog_cost", "purchase_price"):
-        v = _get_meta(meta, k)
-        if v is not None and _to_decimal(v) > 0:
-            return _to_decimal(v)
-    return Decimal("0")
+def _texto_celda(col: int, valor: Any) -> Any:
+    """Lo que muestra la tabla (DisplayRole) para el valor crudo de una celda."""
+    # Evitar celdas vacías en columnas no editables
+    if valor is None:
+        return "N/A"
+    if isinstance(valor, str) and not valor.strip():
+        # En columnas editables permitimos vacío
+        return "" if col in _COLS_EDITABLES else "N/A"
+    # Clamp visual de negativos
+    if col in _COLS_STOCK:
+        try:
+            v = int(float(str(valor).replace(',', '.')))
+            return str(max(v, 0))
+        except Exception:
+            return valor
+    if col in _COLS_PRECIO:
+        try:
+            d = Decimal(str(valor).replace(',', '.')).quantize(_CENTAVOS, rounding=ROUND_HALF_UP)
+            if d < 0:
+                d = Decimal('0.00')
+            return str(d)
+        except Exception:
+            return valor
+    return valor
 
 
 def _to_float_any(x: Any) -> Optional[float]:
@@ -185,9 +201,39 @@ class RegistroProducto:
 
 
 class ModeloActualizarProductos(QAbstractTableModel):
+    """
+    Tabla de registros. Cada fila guarda (valores crudos, textos a mostrar) calculados la primera vez
+    que se pinta; setData y actualizar_estado la invalidan. Pintar, desplazar y ordenar no rehacen
+    la conversión de precios con Decimal.
+    """
+
     def __init__(self, registros: List[RegistroProducto]):
         super().__init__()
         self._registros = registros
+        self._filas: List[Optional[Tuple[tuple, tuple]]] = [None] * len(registros)
+        self._posiciones: Optional[Dict[int, int]] = None  # id(registro) -> fila, se rehace al ordenar
+        self.claves_orden = SortKeyCache(self, self._texto, self._reordenar)
+
+    def _reordenar(self, perm: List[int]) -> None:
+        # En el sitio: el controlador exporta y aplica sobre la misma lista.
+        self._registros[:] = [self._registros[i] for i in perm]
+        self._filas = [self._filas[i] for i in perm]
+        self._posiciones = None
+
+    def _fila_de(self, registro: RegistroProducto) -> Optional[int]:
+        if self._posiciones is None:
+            self._posiciones = {id(r): n for n, r in enumerate(self._registros)}
+        return self._posiciones.get(id(registro))
+
+    def _fila(self, row: int) -> Tuple[tuple, tuple]:
+        fila = self._filas[row]
+        if fila is None:
+            valores = tuple(self._registros[row].como_fila())
+            fila = self._filas[row] = (valores, tuple(_texto_celda(c, v) for c, v in enumerate(valores)))
+        return fila
+
+    def _texto(self, row: int, col: int) -> Any:
+        return self._fila(row)[1][col]
 
     def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
         return len(self._registros)
@@ -199,39 +245,14 @@ class ModeloActualizarProductos(QAbstractTableModel):
         if not index.isValid():
             return None
 
-        r = self._registros[index.row()]
-        fila = r.como_fila()
-        valor = fila[index.column()]
+        if role == Qt.DisplayRole:
+            return self._texto(index.row(), index.column())
 
         if role == Qt.EditRole:
-            return valor
+            return self._fila(index.row())[0][index.column()]
 
-        if role == Qt.DisplayRole:
-            # Evitar celdas vacías en columnas no editables
-            if valor is None:
-                return "N/A"
-            if isinstance(valor, str) and not valor.strip():
-                # En columnas editables permitimos vacío
-                if index.column() in (COL_STOCK_NUEVO, COL_PRECIO_VENTA_NUEVO):
-                    return ""
-                return "N/A"
-            # Clamp visual de negativos
-            if index.column() in (COL_STOCK_ACTUAL, COL_STOCK_NUEVO):
-                try:
-                    v = int(float(str(valor).replace(',', '.')))
-                    return str(max(v, 0))
-                except Exception:
-                    return valor
-            if index.column() in (COL_PRECIO_ACTUAL, COL_PRECIO_COMPRA, COL_PRECIO_VENTA_ACTUAL, COL_PRECIO_VENTA_NUEVO):
-                try:
-                    from decimal import Decimal, ROUND_HALF_UP
-                    d = Decimal(str(valor).replace(',', '.')).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-                    if d < 0:
-                        d = Decimal('0.00')
-                    return str(d)
-                except Exception:
-                    return valor
-            return valor
+        if role == SORT_ROLE:
+            return self.claves_orden.key(index.row(), index.column())
 
         if role == Qt.TextAlignmentRole:
             if index.column() in (
@@ -256,6 +277,8 @@ class ModeloActualizarProductos(QAbstractTableModel):
             return False
 
         r = self._registros[index.row()]
+        self._filas[index.row()] = None
+        self.claves_orden.invalidate_row(index.row())
 
         try:
             if index.column() == COL_STOCK_NUEVO:
@@ -297,21 +320,35 @@ class ModeloActualizarProductos(QAbstractTableModel):
                 return Qt.AlignCenter
         return None
 
-    def actualizar_estado(self, row: int, estado: str):
-        if 0 <= row < len(self._registros):
-            self._registros[row].estado = estado
+    def actualizar_estado(self, registro: RegistroProducto, estado: str) -> bool:
+        """Estado de un registro por identidad: ordenar la tabla mueve las filas. False si no es de este modelo."""
+        row = self._fila_de(registro)
+        if row is not None:
+            registro.estado = estado
+            self._filas[row] = None
+            self.claves_orden.invalidate_row(row)
             idx = self.index(row, COL_ESTADO)
             self.dataChanged.emit(idx, idx, [Qt.DisplayRole])
+        return row is not None
 
 
 class ControladorActualizarProductos:
-    def __init__(self):
+    def __init__(self, catalogo: ServicioCatalogo | None = None):
         self.cliente = ClienteWooCommerce()
+        # Catálogo compartido del menú; sin él (uso aislado), uno propio.
+        self._catalogo_propio = catalogo is None
+        self.catalogo = catalogo or ServicioCatalogo()
         self.simples: List[RegistroProducto] = []
         self.variados: List[RegistroProducto] = []
         self.modelo_simples: Optional[ModeloActualizarProductos] = None
         self.modelo_variados: Optional[ModeloActualizarProductos] = None
 
+    def cerrar(self) -> None:
+        """Libera las conexiones HTTP del cliente (al cerrar la ventana)."""
+        self.cliente.cerrar()
+        if self._catalogo_propio:
+            self.catalogo.cerrar()
+
     # -------- CARGAR ARCHIVO --------
     def cargar_archivo(self, ruta: str) -> Dict[str, Dict[str, Optional[float]]]:
         """
@@ -395,16 +432,23 @@ class ControladorActualizarProductos:
     def procesar_productos(
         self,
         datos_archivo: Dict[str, Dict[str, Optional[float]]],
-        callback: Optional[Callable[[int, str], None]] = None
+        callback: Optional[Callable[[int, str], None]] = None,
+        cancelacion: Optional[TokenCancelacion] = None,
     ) -> Tuple[ModeloActualizarProductos, ModeloActualizarProductos]:
-        productos = self.cliente.obtener_productos()
+        self.catalogo.asegurar(callback, cancelacion=cancelacion)
+        productos = self.catalogo.productos(cancelacion=cancelacion)
+        variaciones_por_producto = self.catalogo.variaciones_por_producto(cancelacion=cancelacion)
 
         self.simples.clear()
         self.variados.clear()
 
         total = max(len(productos), 1)
+        avance = AgregadorProgreso(callback)
 
         for i, p in enumerate(productos, start=1):
+            if cancelacion:
+                cancelacion.verificar()
+
             sku = (p.get("sku") or "").strip()
             excel = datos_archivo.get(sku) if sku else None
 
@@ -415,7 +459,7 @@ class ControladorActualizarProductos:
             categoria_parent = ", ".join(c.get("name", "") for c in (p.get("categories") or []))
 
             if tipo == "simple":
-                costo = _get_purchase_cost(p)
+                costo = costo_compra(p)
                 reg = RegistroProducto(
                     sku=sku,
                     nombre=p.get("name", ""),
@@ -436,7 +480,7 @@ class ControladorActualizarProductos:
             elif tipo == "variable":
                 parent_id = p.get("id")
                 parent_name = p.get("name", "")
-                variaciones = self.cliente.obtener_variaciones_producto(int(parent_id)) if parent_id else []
+                variaciones = variaciones_por_producto.get(int(parent_id), []) if parent_id else []
                 for v in variaciones:
                     sku_v = (v.get("sku") or "").strip()
                     excel_v = datos_archivo.get(sku_v) if sku_v else None
@@ -453,7 +497,7 @@ class ControladorActualizarProductos:
                     variacion_txt = " | ".join(attrs)
                     nombre_mostrar = parent_name if not variacion_txt else f"{parent_name} ({variacion_txt})"
 
-                    costo_v = _get_purchase_cost(v)
+                    costo_v = costo_compra(v)
 
                     regv = RegistroProducto(
                         sku=sku_v,
@@ -473,7 +517,7 @@ class ControladorActualizarProductos:
                     self.variados.append(regv)
 
             else:
-                costo = _get_purchase_cost(p)
+                costo = costo_compra(p)
                 reg = RegistroProducto(
                     sku=sku,
                     nombre=p.get("name", ""),
@@ -491,70 +535,131 @@ class ControladorActualizarProductos:
                 )
                 self.variados.append(reg)
 
-            if callback:
-                callback(int((i / total) * 100), f"Procesando producto {i} de {total}")
+            avance(i, total, "Procesando productos")
+        avance.terminar()
 
         self.modelo_simples = ModeloActualizarProductos(self.simples)
         self.modelo_variados = ModeloActualizarProductos(self.variados)
         return self.modelo_simples, self.modelo_variados
 
     # -------- APLICAR --------
-    def aplicar_cambios(self, callback: Optional[Callable[[int, str], None]] = None):
-        trabajos: List[Tuple[ModeloActualizarProductos, int, RegistroProducto]] = []
+    def aplicar_cambios(
+        self,
+        callback: Optional[Callable[[int, str], None]] = None,
+        cancelacion: Optional[TokenCancelacion] = None,
+        notificar_estado: Optional[Callable[[RegistroProducto, str], None]] = None,
+    ):
+        """
+        Envía los cambios con los endpoints /batch de WooCommerce (hasta LOTE_MAXIMO por petición):
+        simples a /products/batch y variaciones agrupadas por producto padre.
+        Cada fila recibe el resultado de su propio elemento del lote, vía notificar_estado(registro, estado)
+        (por defecto actualizar_estado; desde otro hilo, algo que lo lleve al de la interfaz).
+        Al cancelar no salen más lotes; las filas pendientes quedan como estaban.
+        """
+        notificar = notificar_estado or self.actualizar_estado
+        trabajos: List[RegistroProducto] = []
 
         if self.modelo_simples:
-            for idx, r in enumerate(self.simples):
-                if r.tiene_cambios():
-                    trabajos.append((self.modelo_simples, idx, r))
+            trabajos.extend(r for r in self.simples if r.tiene_cambios())
 
         if self.modelo_variados:
-            for idx, r in enumerate(self.variados):
-                if r.tiene_cambios():
-                    trabajos.append((self.modelo_variados, idx, r))
+            trabajos.extend(r for r in self.variados if r.tiene_cambios())
 
         total = max(len(trabajos), 1)
+        hechos = 0
+        avance = AgregadorProgreso(callback)
 
-        for i, (modelo, row, r) in enumerate(trabajos, start=1):
-            if not r._id:
-                modelo.actualizar_estado(row, "❌ Sin ID")
-                continue
+        def avanzar(n: int):
+            nonlocal hechos
+            hechos += n
+            avance(hechos, total, "Aplicando cambios")
+
+        lote_simples: List[RegistroProducto] = []
+        lotes_variaciones: Dict[int, List[RegistroProducto]] = {}
 
-            if r._tipo == "variation":
+        for r in trabajos:
+            if not r._id:
+                notificar(r, "❌ Sin ID")
+                avanzar(1)
+            elif r._tipo == "variation":
                 if not r._parent_id:
-                    modelo.actualizar_estado(row, "❌ Sin ID padre")
+                    notificar(r, "❌ Sin ID padre")
+                    avanzar(1)
                 else:
-                    try:
-                        self.cliente.actualizar_variacion(
-                            producto_id=int(r._parent_id),
-                            variacion_id=int(r._id),
-                            stock=r.stock_nuevo if r.stock_nuevo is not None else None,
-                            precio=r.precio_venta_nuevo if r.precio_venta_nuevo is not None else None,
-                        )
-                        modelo.actualizar_estado(row, "OK Actualizado")
-                    except Exception as e:
-                        modelo.actualizar_estado(row, f"❌ {str(e)[:60]}")
-                if callback:
-                    callback(int((i / total) * 100), f"Aplicando cambios {i} de {total}")
+                    lotes_variaciones.setdefault(int(r._parent_id), []).append(r)
+            elif r._tipo != "simple":
+                notificar(r, f"⚠ No editable ({r._tipo})")
+                avanzar(1)
+            else:
+                lote_simples.append(r)
+
+        # Lo retenido de las filas sin ID no espera al primer lote.
+        avance.volcar()
+
+        # (enviar, registrar en el catálogo local, filas del lote)
+        envios = []
+        registrar_productos = partial(self.catalogo.registrar_cambios, cancelacion=cancelacion)
+        registrar_variaciones = partial(self.catalogo.registrar_cambios, (), cancelacion=cancelacion)
+        for i in range(0, len(lote_simples), LOTE_MAXIMO):
+            envios.append((self.cliente.actualizar_productos_lote, registrar_productos,
+                           lote_simples[i:i + LOTE_MAXIMO]))
+        for parent_id, items in lotes_variaciones.items():
+            enviar = partial(self.cliente.actualizar_variaciones_lote, parent_id)
+            for i in range(0, len(items), LOTE_MAXIMO):
+                envios.append((enviar, registrar_variaciones, items[i:i + LOTE_MAXIMO]))
+
+        for enviar, registrar, items in envios:
+            if cancelacion:
+                cancelacion.verificar()
+
+            cambios = [
+                {"id": int(r._id), "stock": r.stock_nuevo, "precio": r.precio_venta_nuevo}
+                for r in items
+            ]
+            try:
+                with self.cliente.cancelable(cancelacion):
+                    respuesta = enviar(cambios)
+            except OperacionCancelada:
+                # El lote pudo haberse aplicado en la tienda antes de cancelar.
+                for r in items:
+                    notificar(r, "⚠ Cancelado (sin confirmar)")
+                raise
+            except Exception as e:
+                # Falló la petición completa: solo las filas de este lote quedan con error.
+                for r in items:
+                    notificar(r, f"❌ {str(e)[:60]}")
+                avanzar(len(items))
                 continue
 
-            if r._tipo != "simple":
-                modelo.actualizar_estado(row, f"⚠ No editable ({r._tipo})")
-                if callback:
-                    callback(int((i / total) * 100), f"Aplicando cambios {i} de {total}")
-                continue
+            por_id = {}
+            for it in respuesta:
+                try:
+                    por_id[int(it.get("id") or 0)] = it
+                except (TypeError, ValueError):
+                    continue
 
-            try:
-                self.cliente.actualizar_producto(
-                    producto_id=int(r._id),
-                    stock=r.stock_nuevo if r.stock_nuevo is not None else None,
-                    precio=r.precio_venta_nuevo if r.precio_venta_nuevo is not None else None,
-                )
-                modelo.actualizar_estado(row, "OK Actualizado")
-            except Exception as e:
-                modelo.actualizar_estado(row, f"❌ {str(e)[:60]}")
+            for r in items:
+                it = por_id.get(int(r._id))
+                if it is None:
+                    notificar(r, "❌ Sin respuesta en el lote")
+                elif it.get("error"):
+                    err = it.get("error") or {}
+                    msg = err.get("message") if isinstance(err, dict) else str(err)
+                    notificar(r, f"❌ {str(msg or 'Error')[:60]}")
+                else:
+                    notificar(r, "OK Actualizado")
+
+            # Las variaciones no cambian el date_modified del padre: sin esto el espejo quedaría viejo.
+            registrar(respuesta)
+            avanzar(len(items))
+        avance.terminar()
 
-            if callback:
-                callback(int((i / total) * 100), f"Aplicando cambios {i} de {total}")
+    def actualizar_estado(self, registro: RegistroProducto, estado: str) -> None:
+        """Estado de un registro en la tabla que lo muestra. Solo desde el hilo de la interfaz."""
+        for modelo in (self.modelo_simples, self.modelo_variados):
+            if modelo is not None and modelo.actualizar_estado(registro, estado):
+                return
+        registro.estado = estado
 
     # -------- EXPORTAR --------
     def exportar_excel(self, ruta: str, simples=None, variados=None):
@@ -587,54 +692,51 @@ class ControladorActualizarProductos:
                 r.estado,
             ]
 
-        def aplicar_formato(ws):
-            header_font = Font(bold=True)
-            header_fill = PatternFill("solid", fgColor="D9E1F2")
-            center = Alignment(horizontal="center", vertical="center", wrap_text=True)
+        header_font = Font(bold=True)
+        header_fill = PatternFill("solid", fgColor="D9E1F2")
+        center = Alignment(horizontal="center", vertical="center", wrap_text=True)
+        widths = [18, 48, 30, 10, 14, 14, 18]
 
-            ws.append(HEADERS_EXPORT)
-            for col in range(1, len(HEADERS_EXPORT) + 1):
-                c = ws.cell(row=1, column=col)
-                c.font = header_font
-                c.fill = header_fill
-                c.alignment = center
+        # write_only escribe cada fila al agregarla y no guarda las celdas en memoria,
+        # así que el formato va en la celda (WriteOnlyCell) y no se aplica después.
+        def celda(ws, valor, formato: Optional[str] = None) -> WriteOnlyCell:
+            c = WriteOnlyCell(ws, value=valor)
+            c.alignment = center
+            if formato:
+                c.number_format = formato
+            return c
+
+        def agregar_hoja(titulo: str, registros: List[RegistroProducto]):
+            ws = wb.create_sheet(titulo)
 
             ws.freeze_panes = "A2"
             last_col = get_column_letter(len(HEADERS_EXPORT))
             ws.auto_filter.ref = f"A1:{last_col}1"
-
-            widths = [18, 48, 30, 10, 14, 14, 18]
             for i, w in enumerate(widths, start=1):
                 ws.column_dimensions[get_column_letter(i)].width = w
 
-            # STOCK entero
-            for row in ws.iter_rows(min_row=2, min_col=4, max_col=4):
-                for cell in row:
-                    cell.number_format = "0"
-                    cell.alignment = center
-
-            # precios 2 decimales
-            for row in ws.iter_rows(min_row=2, min_col=5, max_col=6):
-                for cell in row:
-                    cell.number_format = "0.00"
-                    cell.alignment = center
-
-            # estado centrado
-            for row in ws.iter_rows(min_row=2, min_col=7, max_col=7):
-                for cell in row:
-                    cell.alignment = center
-
-        wb = Workbook()
-
-        ws1 = wb.active
-        ws1.title = "Productos Simples"
-        aplicar_formato(ws1)
-        for r in self.simples:
-            ws1.append(fila_export(r))
-
-        ws2 = wb.create_sheet("Productos Variados")
-        aplicar_formato(ws2)
-        for r in self.variados:
-            ws2.append(fila_export(r))
+            encabezado = []
+            for h in HEADERS_EXPORT:
+                c = celda(ws, h)
+                c.font = header_font
+                c.fill = header_fill
+                encabezado.append(c)
+            ws.append(encabezado)
+
+            for r in registros:
+                sku, nombre, categoria, stock, compra, venta, estado = fila_export(r)
+                ws.append([
+                    celda(ws, sku),
+                    celda(ws, nombre),
+                    celda(ws, categoria),
+                    celda(ws, stock, "0"),  # STOCK entero
+                    celda(ws, compra, "0.00"),  # precios 2 decimales
+                    celda(ws, venta, "0.00"),
+                    celda(ws, estado),
+                ])
+
+        wb = Workbook(write_only=True)
+        agregar_hoja("Productos Simples", self.simples)
+        agregar_hoja("Productos Variados", self.variados)
 
         wb.save(ruta)
@@ -1,6 +1,8 @@
 # app/actualizar_productos/worker_actualizar_productos.py
 from PySide6.QtCore import QObject, Signal
 
+from app.core.excepciones import OperacionCancelada
+
 
 class WorkerActualizarProductos(QObject):
     # Para procesar (generar tablas)
@@ -8,18 +10,22 @@ class WorkerActualizarProductos(QObject):
     terminado = Signal(object, object)
     error = Signal(str)
 
-    def __init__(self, controlador, datos_archivo):
+    def __init__(self, controlador, datos_archivo, cancelacion=None):
         super().__init__()
         self.controlador = controlador
         self.datos_archivo = datos_archivo
+        self.cancelacion = cancelacion
 
     def ejecutar(self):
         try:
             modelo_simples, modelo_variados = self.controlador.procesar_productos(
                 self.datos_archivo,
-                callback=self._emitir_progreso
+                callback=self._emitir_progreso,
+                cancelacion=self.cancelacion,
             )
             self.terminado.emit(modelo_simples, modelo_variados)
+        except OperacionCancelada:
+            self.error.emit("__CANCELADO__")
         except Exception as e:
             self.error.emit(str(e))
 
@@ -30,17 +36,26 @@ class WorkerActualizarProductos(QObject):
 class WorkerAplicarCambios(QObject):
     # Para aplicar cambios (actualizar tienda)
     progreso = Signal(int, str)
+    # (registro, estado): la tabla se actualiza en el hilo de la interfaz, no en este.
+    estado = Signal(object, str)
     terminado = Signal()
     error = Signal(str)
 
-    def __init__(self, controlador):
+    def __init__(self, controlador, cancelacion=None):
         super().__init__()
         self.controlador = controlador
+        self.cancelacion = cancelacion
 
     def ejecutar(self):
         try:
-            self.controlador.aplicar_cambios(callback=self._emitir_progreso)
+            self.controlador.aplicar_cambios(
+                callback=self._emitir_progreso,
+                cancelacion=self.cancelacion,
+                notificar_estado=self.estado.emit,
+            )
             self.terminado.emit()
+        except OperacionCancelada:
+            self.error.emit("__CANCELADO__")
         except Exception as e:
             self.error.emit(str(e))
 
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from app.core.rutas import obtener_directorio_app
+
+_ESQUEMA_ESTADO = """
+CREATE TABLE IF NOT EXISTS estado (
+    clave TEXT PRIMARY KEY,
+    valor TEXT
+);
+"""
+
+# Un bloqueo por archivo: dos módulos abiertos a la vez no sincronizan el mismo almacén en paralelo.
+_BLOQUEOS: dict[str, threading.Lock] = {}
+_BLOQUEOS_GUARDA = threading.Lock()
+
+
+def ruta_almacen(nombre: str, base_url: str) -> str:
+    """Un archivo por tienda dentro del directorio de la app: <nombre>_<hash de la URL>.sqlite3"""
+    clave = hashlib.sha1(base_url.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(obtener_directorio_app(), f"{nombre}_{clave}.sqlite3")
+
+
+class AlmacenLocal:
+    """
+    Base de los almacenes SQLite locales.
+    Cada operación abre su propia conexión porque los controladores corren en QThreads distintos;
+    la tabla `estado` guarda marcas de sincronización (clave -> valor).
+    """
+
+    ESQUEMA = ""
+    TABLAS: tuple[str, ...] = ()
+    # Subirla al cambiar ESQUEMA: el archivo existente se vacía y se vuelve a llenar.
+    VERSION = 1
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        with _BLOQUEOS_GUARDA:
+            self.bloqueo = _BLOQUEOS.setdefault(ruta, threading.Lock())
+
+        con = sqlite3.connect(self.ruta, timeout=30)
+        try:
+            # WAL: las lecturas de otro módulo no esperan a que termine una sincronización.
+            con.execute("PRAGMA journal_mode=WAL")
+            con.executescript(_ESQUEMA_ESTADO)
+            if self._leer_estado(con, "version") != str(self.VERSION):
+                for tabla in self.TABLAS:
+                    con.execute(f"DROP TABLE IF EXISTS {tabla}")
+                con.execute("DELETE FROM estado")
+                self._guardar_estado(con, "version", self.VERSION)
+                con.commit()
+            con.executescript(self.ESQUEMA)
+        finally:
+            con.close()
+
+    @contextmanager
+    def _conexion(self):
+        """Conexión en una transacción: commit al salir, rollback si hubo error."""
+        con = sqlite3.connect(self.ruta, timeout=30)
+        try:
+            yield con
+            con.commit()
+        except BaseException:
+            con.rollback()
+            raise
+        finally:
+            con.close()
+
+    @staticmethod
+    def _leer_estado(con: sqlite3.Connection, clave: str, defecto: str | None = None) -> str | None:
+        fila = con.execute("SELECT valor FROM estado WHERE clave = ?", (clave,)).fetchone()
+        return defecto if fila is None or fila[0] is None else fila[0]
+
+    @staticmethod
+    def _guardar_estado(con: sqlite3.Connection, clave: str, valor) -> None:
+        con.execute(
+            "INSERT OR REPLACE INTO estado (clave, valor) VALUES (?, ?)",
+            (clave, None if valor is None else str(valor)),
+        )
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import json
+from datetime import date, datetime, timedelta, timezone
+
+from app.core.almacen_local import AlmacenLocal, ruta_almacen
+from app.core.cliente_woocommerce import ClienteWooCommerce
+from app.core.progreso import AgregadorProgreso
+
+# Margen hacia atrás al pedir cambios (reloj local vs. servidor, pedidos guardados durante la sincronización).
+SOLAPE_MODIFICACION = timedelta(minutes=5)
+
+# Proyección _fields de lo que se guarda: lo que lee Reporte de Ventas.
+# Si cambia, el almacén se vacía y se vuelve a llenar con los campos nuevos.
+CAMPOS_PEDIDO = (
+    "id", "date_created", "status", "customer_note",
+    "billing", "shipping", "meta_data",
+    "line_items.product_id", "line_items.variation_id", "line_items.quantity",
+    "line_items.subtotal", "line_items.total",
+    "shipping_total", "total_tax", "discount_total", "total",
+)
+
+
+def _fecha(pedido: dict) -> str:
+    return (pedido.get("date_created") or "")[:19]
+
+
+def _tramos_faltantes(cubiertos: list[list[str]], desde: date, hasta: date) -> list[tuple[date, date]]:
+    """Partes de [desde, hasta] (días, inclusive) que no están dentro de ningún tramo cubierto."""
+    faltantes = []
+    inicio = desde
+    for a, b in sorted((date.fromisoformat(a), date.fromisoformat(b)) for a, b in cubiertos):
+        if b < inicio:
+            continue
+        if a > hasta:
+            break
+        if a > inicio:
+            faltantes.append((inicio, a - timedelta(days=1)))
+        inicio = max(inicio, b + timedelta(days=1))
+        if inicio > hasta:
+            return faltantes
+    if inicio <= hasta:
+        faltantes.append((inicio, hasta))
+    return faltantes
+
+
+def _unir_tramos(cubiertos: list[list[str]], desde: date, hasta: date) -> list[list[str]]:
+    """Agrega [desde, hasta] a los tramos cubiertos, fusionando los que se tocan."""
+    tramos = sorted(
+        [(date.fromisoformat(a), date.fromisoformat(b)) for a, b in cubiertos] + [(desde, hasta)]
+    )
+    unidos: list[list[date]] = []
+    for a, b in tramos:
+        if unidos and a <= unidos[-1][1] + timedelta(days=1):
+            unidos[-1][1] = max(unidos[-1][1], b)
+        else:
+            unidos.append([a, b])
+    return [[a.isoformat(), b.isoformat()] for a, b in unidos]
+
+
+class AlmacenPedidos(AlmacenLocal):
+    """
+    Pedidos de la tienda guardados en SQLite, por ID y con índice por fecha.
+    Cada sincronización trae los pedidos modificados desde la anterior (modified_after)
+    y, por fecha, solo los días del rango pedido que todavía no estaban cubiertos.
+
+        almacen = AlmacenPedidos(cliente)
+        almacen.sincronizar(desde, hasta, callback_progreso)
+        pedidos = almacen.pedidos(desde, hasta)
+    """
+
+    ESQUEMA = """
+    CREATE TABLE IF NOT EXISTS pedidos (
+        id INTEGER PRIMARY KEY,
+        fecha TEXT NOT NULL,
+        datos TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_pedidos_fecha ON pedidos (fecha, id);
+    """
+    TABLAS = ("pedidos",)
+
+    def __init__(self, cliente: ClienteWooCommerce, ruta: str | None = None):
+        self.cliente = cliente
+        super().__init__(ruta or ruta_almacen("pedidos", cliente.base_url))
+
+    # ----------------------------
+    # Sincronización
+    # ----------------------------
+    def sincronizar(self, desde: date, hasta: date, callback_progreso=None) -> None:
+        """
+        Deja el almacén al día para [desde, hasta].
+        Si el total del rango según la API no coincide con el local (pedidos enviados a la papelera,
+        que modified_after no devuelve), ese rango se vuelve a descargar entero.
+        """
+        with self.bloqueo:
+            # Marca tomada antes de pedir nada: lo que cambie durante la descarga se vuelve a traer.
+            nueva_marca = datetime.now(timezone.utc) - SOLAPE_MODIFICACION
+
+            with self._conexion() as con:
+                if self._leer_estado(con, "campos") != ",".join(CAMPOS_PEDIDO):
+                    con.execute("DELETE FROM pedidos")
+                    con.execute("DELETE FROM estado WHERE clave != 'version'")
+                    self._guardar_estado(con, "campos", ",".join(CAMPOS_PEDIDO))
+                marca = self._leer_estado(con, "marca_modificacion")
+                cubiertos = json.loads(self._leer_estado(con, "tramos_cubiertos", "[]"))
+
+            with self._conexion() as con:
+                if marca:
+                    self._guardar(con, self.cliente.iter_pedidos(campos=CAMPOS_PEDIDO, modificado_despues=marca),
+                                  callback_progreso, "Sincronizando pedidos modificados")
+
+                for a, b in _tramos_faltantes(cubiertos, desde, hasta):
+                    self._guardar(con, self.cliente.iter_pedidos(desde=a, hasta=b, campos=CAMPOS_PEDIDO),
+                                  callback_progreso, f"Descargando pedidos del {a} al {b}")
+                    cubiertos = _unir_tramos(cubiertos, a, b)
+
+                self._guardar_estado(con, "tramos_cubiertos", json.dumps(cubiertos))
+                self._guardar_estado(con, "marca_modificacion", nueva_marca.strftime("%Y-%m-%dT%H:%M:%S"))
+
+            total_remoto = self.cliente.contar_pedidos(desde, hasta)
+            if total_remoto is not None and total_remoto != self.total_pedidos(desde, hasta):
+                with self._conexion() as con:
+                    con.execute("DELETE FROM pedidos WHERE fecha > ? AND fecha < ?", self._limites(desde, hasta))
+                    self._guardar(con, self.cliente.iter_pedidos(desde=desde, hasta=hasta, campos=CAMPOS_PEDIDO),
+                                  callback_progreso, f"Descargando pedidos del {desde} al {hasta}")
+
+    @staticmethod
+    def _guardar(con, paginas, callback_progreso, mensaje: str) -> None:
+        procesados = 0
+        avance = AgregadorProgreso(callback_progreso)
+        for pagina in paginas:
+            con.executemany(
+                "INSERT OR REPLACE INTO pedidos (id, fecha, datos) VALUES (?, ?, ?)",
+                [
+                    (int(o["id"]), _fecha(o), json.dumps(o, ensure_ascii=False))
+                    for o in pagina.items
+                    if o.get("id") and _fecha(o)
+                ],
+            )
+            procesados += len(pagina.items)
+            avance(procesados, pagina.total, mensaje)
+        # Los pedidos repetidos entre tramos se descartan: procesados puede no llegar a pagina.total.
+        avance.terminar()
+
+    # ----------------------------
+    # Lectura
+    # ----------------------------
+    @staticmethod
+    def _limites(desde: date, hasta: date) -> tuple[str, str]:
+        # Mismos límites (exclusivos) que after/before en la API.
+        return f"{desde.isoformat()}T00:00:00", f"{hasta.isoformat()}T23:59:59"
+
+    def total_pedidos(self, desde: date, hasta: date) -> int:
+        with self._conexion() as con:
+            return con.execute(
+                "SELECT COUNT(*) FROM pedidos WHERE fecha > ? AND fecha < ?", self._limites(desde, hasta)
+            ).fetchone()[0]
+
+    def pedidos(self, desde: date, hasta: date) -> list[dict]:
+        """Pedidos del rango ordenados por fecha, como los lista la API."""
+        with self._conexion() as con:
+            return [
+                json.loads(d)
+                for (d,) in con.execute(
+                    "SELECT datos FROM pedidos WHERE fecha > ? AND fecha < ? ORDER BY fecha, id",
+                    self._limites(desde, hasta),
+                )
+            ]
@@ -5,12 +5,17 @@ import os
 from PySide6.QtWidgets import QMainWindow, QMessageBox, QApplication, QDialog
 from PySide6.QtGui import QAction, QPixmap
 from PySide6.QtCore import Qt
+from shiboken6 import isValid
 
 from app.core.credenciales_view import CredencialesApiWooView
 from app.core.dialogos import mostrar_error
 from app.core.configuracion import Configuracion
 from app.core.excepciones import ConfiguracionError
 
+# Hilos soltados por soltar_hilo() que todavía no terminaron: (thread, worker).
+_HILOS_SUELTOS: set = set()
+
+
 def aplicar_tema_claro(app: QApplication) -> None:
     if not app:
         return
@@ -20,6 +25,41 @@ def aplicar_tema_claro(app: QApplication) -> None:
         pass
 
 
+def soltar_hilo(thread, worker, cancelacion=None) -> None:
+    """
+    Detiene el hilo de un módulo sin bloquear la interfaz: cancela su TokenCancelacion,
+    silencia al worker (sus señales ya no llegan a la ventana) y deja que el hilo termine solo.
+    Mientras tanto queda guardado aquí, sin padre, para que cerrar la ventana no lo destruya en marcha.
+    """
+    if cancelacion is not None:
+        cancelacion.cancelar()
+    if not thread or not isValid(thread):
+        return
+    try:
+        if worker is not None and isValid(worker):
+            worker.blockSignals(True)
+        if not thread.isRunning():
+            return
+        par = (thread, worker)
+        _HILOS_SUELTOS.add(par)
+        thread.setParent(None)
+        thread.finished.connect(lambda: _HILOS_SUELTOS.discard(par), Qt.QueuedConnection)
+        # Surte efecto en cuanto ejecutar() retorne; con el token cancelado, enseguida.
+        thread.quit()
+    except RuntimeError:
+        pass
+
+
+def esperar_hilos_sueltos(ms: int = 2000) -> None:
+    """Al cerrar la aplicación: espera (acotado) a que terminen los hilos soltados."""
+    for thread, _worker in list(_HILOS_SUELTOS):
+        try:
+            if isValid(thread) and thread.isRunning():
+                thread.wait(ms)
+        except RuntimeError:
+            pass
+
+
 class BaseModuleWindow(QMainWindow):
     def __init__(self, menu_controller, parent=None):
         super().__init__(parent)
@@ -38,6 +78,10 @@ class BaseModuleWindow(QMainWindow):
         act_cred.triggered.connect(self._abrir_credenciales)
         menu_woo.addAction(act_cred)
 
+        act_catalogo = QAction("Actualizar catálogo", self)
+        act_catalogo.triggered.connect(lambda: self.menu_controller and self.menu_controller.refrescar_catalogo())
+        menu_woo.addAction(act_catalogo)
+
         menu_mod = menubar.addMenu("Módulos")
 
         act_ventas = QAction("Reporte Ventas", self)
@@ -60,9 +104,20 @@ class BaseModuleWindow(QMainWindow):
         act_about.triggered.connect(self._acerca_de)
         menu_help.addAction(act_about)
 
+    def catalogo_compartido(self):
+        """ServicioCatalogo del menú principal (None si la ventana se abrió sin menú)."""
+        return getattr(self.menu_controller, "catalogo", None)
+
     def _abrir_credenciales(self):
         dlg = CredencialesApiWooView(self)
-        dlg.exec()
+        if dlg.exec() == QDialog.Accepted:
+            self._credenciales_cambiadas()
+
+    def _credenciales_cambiadas(self):
+        # Otra tienda (u otra clave): el catálogo compartido se vuelve a abrir al próximo uso.
+        catalogo = self.catalogo_compartido()
+        if catalogo is not None:
+            catalogo.reiniciar()
 
     def asegurar_credenciales(self) -> bool:
         try:
@@ -71,6 +126,7 @@ class BaseModuleWindow(QMainWindow):
         except ConfiguracionError:
             dlg = CredencialesApiWooView(self)
             if dlg.exec() == QDialog.Accepted:
+                self._credenciales_cambiadas()
                 try:
                     Configuracion().obtener_credenciales()
                     return True
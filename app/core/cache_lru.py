@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+from app.core.excepciones import OperacionCancelada
+
+CACHE_ENTRADAS = 5000
+CACHE_TTL = 300.0  # segundos
+
+_FALTA = object()
+
+
+class _Vuelo:
+    """Una carga en curso: quienes piden la misma clave esperan su resultado."""
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.valor: Any = None
+        self.error: BaseException | None = None
+
+
+class CacheLRU:
+    """
+    Caché en memoria acotada por número de entradas (desaloja la menos usada) y con caducidad (TTL).
+    Thread-safe. obtener() coalesce las cargas: si varios hilos piden la misma clave a la vez,
+    solo uno la carga y el resto espera ese resultado (single-flight).
+    """
+
+    def __init__(self, maximo: int = CACHE_ENTRADAS, ttl: float = CACHE_TTL,
+                 reloj: Callable[[], float] = time.monotonic):
+        self.maximo = max(1, int(maximo))
+        self.ttl = float(ttl)
+        self._reloj = reloj
+
+        self._datos: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._en_vuelo: dict[Hashable, _Vuelo] = {}
+        self._lock = threading.Lock()
+
+        self.aciertos = 0
+        self.fallos = 0
+        self.expirados = 0
+        self.desalojos = 0
+        self.coalescidas = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._datos)
+
+    def _buscar(self, clave: Hashable):
+        """Valor vigente o _FALTA. Llamar con el lock tomado."""
+        entrada = self._datos.get(clave)
+        if entrada is None:
+            return _FALTA
+        expira, valor = entrada
+        if expira <= self._reloj():
+            del self._datos[clave]
+            self.expirados += 1
+            return _FALTA
+        self._datos.move_to_end(clave)
+        return valor
+
+    def buscar(self, clave: Hashable, defecto=None):
+        with self._lock:
+            valor = self._buscar(clave)
+            if valor is _FALTA:
+                self.fallos += 1
+                return defecto
+            self.aciertos += 1
+            return valor
+
+    def guardar(self, clave: Hashable, valor: Any) -> None:
+        with self._lock:
+            self._datos[clave] = (self._reloj() + self.ttl, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.maximo:
+                self._datos.popitem(last=False)
+                self.desalojos += 1
+
+    def obtener(self, clave: Hashable, cargar: Callable[[], Any]) -> Any:
+        """
+        Valor en caché o, si falta o caducó, el resultado de cargar() (una sola carga por clave a la vez).
+        Si quien cargaba canceló su operación, los que esperaban no heredan la cancelación: vuelven a
+        intentar (uno de ellos pasa a cargar).
+        """
+        while True:
+            with self._lock:
+                valor = self._buscar(clave)
+                if valor is not _FALTA:
+                    self.aciertos += 1
+                    return valor
+
+                vuelo = self._en_vuelo.get(clave)
+                lider = vuelo is None
+                if lider:
+                    vuelo = self._en_vuelo[clave] = _Vuelo()
+                    self.fallos += 1
+                else:
+                    self.coalescidas += 1
+
+            if lider:
+                break
+            vuelo.evento.wait()
+            if isinstance(vuelo.error, OperacionCancelada):
+                continue
+            if vuelo.error is not None:
+                raise vuelo.error
+            return vuelo.valor
+
+        try:
+            vuelo.valor = cargar()
+            self.guardar(clave, vuelo.valor)
+            return vuelo.valor
+        except BaseException as e:
+            vuelo.error = e
+            raise
+        finally:
+            with self._lock:
+                self._en_vuelo.pop(clave, None)
+            vuelo.evento.set()
+
+    def invalidar(self, clave: Hashable = _FALTA) -> None:
+        """Borra una clave, o toda la caché si no se indica ninguna."""
+        with self._lock:
+            if clave is _FALTA:
+                self._datos.clear()
+            else:
+                self._datos.pop(clave, None)
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                "entradas": len(self._datos),
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "expirados": self.expirados,
+                "desalojos": self.desalojos,
+                "coalescidas": self.coalescidas,
+            }
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import threading
+
+from app.core.excepciones import OperacionCancelada
+
+# Cada cuánto (segundos) revisa el token quien espera una petición o un bloqueo.
+INTERVALO_CANCELACION = 0.05
+
+
+class TokenCancelacion:
+    """
+    Cancelación cooperativa de una operación larga.
+    La vista lo crea y lo cancela; el worker, el controlador y ClienteWooCommerce lo consultan
+    y lanzan OperacionCancelada en el siguiente punto seguro (entre filas, páginas o peticiones).
+
+        token = TokenCancelacion()
+        worker = WorkerInventario(controlador, filtro, token)
+        ...
+        token.cancelar()  # p. ej. al cerrar la ventana
+    """
+
+    def __init__(self):
+        self._evento = threading.Event()
+
+    def cancelar(self) -> None:
+        self._evento.set()
+
+    @property
+    def cancelado(self) -> bool:
+        return self._evento.is_set()
+
+    def verificar(self) -> None:
+        """Lanza OperacionCancelada si se canceló."""
+        if self._evento.is_set():
+            raise OperacionCancelada()
+
+    def esperar(self, segundos: float) -> None:
+        """time.sleep que se interrumpe (con OperacionCancelada) al cancelar."""
+        if self._evento.wait(max(0.0, segundos)):
+            raise OperacionCancelada()
@@ -0,0 +1,351 @@
+from __future__ import annotations
+
+import json
+import time
+from contextlib import nullcontext
+from datetime import datetime, timedelta, timezone
+
+from app.core.almacen_local import AlmacenLocal, ruta_almacen
+from app.core.cliente_woocommerce import ClienteWooCommerce
+from app.core.cliente_woocommerce_async import AsyncClienteWooCommerce
+from app.core.excepciones import WooCommerceConexionError
+from app.core.progreso import AgregadorProgreso
+
+# Cada cuánto se rehace el espejo completo. modified_after no detecta borrados ni las variaciones
+# nuevas (o editadas fuera de la app) de un producto cuyo date_modified no cambió.
+RESYNC_COMPLETA = 24 * 3600  # segundos
+
+# Margen hacia atrás al pedir cambios, por productos guardados en el mismo segundo que la marca.
+SOLAPE_MODIFICACION = timedelta(minutes=1)
+
+# Proyección _fields: unión de lo que leen Inventario, Actualizar Productos y Lista de Distribuidores.
+CAMPOS_PRODUCTO = (
+    "id", "type", "name", "sku", "status", "categories", "permalink",
+    "price", "regular_price", "purchase_price", "meta_data",
+    "stock_quantity", "manage_stock", "stock_status", "date_modified_gmt",
+)
+CAMPOS_VARIACION = (
+    "id", "sku", "attributes",
+    "price", "regular_price", "purchase_price", "meta_data",
+    "stock_quantity", "manage_stock", "stock_status",
+)
+# Lo que una venta cambia sin tocar date_modified: se refresca para lo vendido desde la última sincronización.
+CAMPOS_STOCK = ("id", "stock_quantity", "stock_status", "manage_stock", "price", "regular_price")
+CAMPOS_PEDIDO_STOCK = ("id", "line_items.product_id", "line_items.variation_id")
+
+# Margen hacia atrás al pedir los pedidos modificados (la marca sale del reloj local, no del servidor).
+SOLAPE_PEDIDOS = timedelta(minutes=5)
+
+_FORMATO_MARCA = "%Y-%m-%dT%H:%M:%S"
+
+
+def _tipo(p: dict) -> str:
+    return (p.get("type") or "").strip().lower()
+
+
+def _columnas_stock(obj: dict) -> tuple[str, int, int]:
+    """(stock_status, manage_stock, stock) tal como se guardan para filtrar en SQL."""
+    try:
+        stock = int(float(obj.get("stock_quantity") or 0))
+    except (TypeError, ValueError, OverflowError):
+        stock = 0
+    return (obj.get("stock_status") or "").strip().lower(), int(bool(obj.get("manage_stock"))), stock
+
+
+def _condicion_stock(filtro_stock: str | None, tabla: str) -> str:
+    """
+    WHERE equivalente a los filtros de los módulos:
+    - con_stock / sin_stock (Inventario): con manage_stock manda la cantidad; sin manage_stock, stock_status.
+    - con_unidades (Lista de Distribuidores): cantidad > 0, sin mirar manage_stock.
+    """
+    if filtro_stock == "con_unidades":
+        return f"{tabla}.stock > 0"
+    con_stock = (
+        f"(CASE WHEN {tabla}.manage_stock THEN {tabla}.stock > 0 "
+        f"ELSE {tabla}.stock_status = 'instock' END)"
+    )
+    if filtro_stock == "con_stock":
+        return con_stock
+    if filtro_stock == "sin_stock":
+        return f"NOT {con_stock}"
+    return "1"
+
+
+class CatalogoLocal(AlmacenLocal):
+    """
+    Espejo SQLite de productos y variaciones de la tienda.
+    La primera sincronización descarga todo; las siguientes solo los productos con
+    date_modified posterior a la última marca (modified_after) y las variaciones de esos productos.
+
+        catalogo = CatalogoLocal(cliente)
+        catalogo.sincronizar(callback_progreso)
+        productos = catalogo.productos()
+
+    Con `cliente_async`, las variaciones de cada página (una petición por producto variable)
+    se piden todas a la vez en un event loop del hilo que sincroniza, en vez del pool de hilos del cliente.
+    """
+
+    ESQUEMA = """
+    CREATE TABLE IF NOT EXISTS productos (
+        id INTEGER PRIMARY KEY,
+        posicion INTEGER NOT NULL,
+        tipo TEXT NOT NULL,
+        stock_status TEXT NOT NULL,
+        manage_stock INTEGER NOT NULL,
+        stock INTEGER NOT NULL,
+        datos TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_productos_posicion ON productos (posicion);
+
+    CREATE TABLE IF NOT EXISTS variaciones (
+        id INTEGER PRIMARY KEY,
+        producto_id INTEGER NOT NULL,
+        posicion INTEGER NOT NULL,
+        stock_status TEXT NOT NULL,
+        manage_stock INTEGER NOT NULL,
+        stock INTEGER NOT NULL,
+        datos TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_variaciones_producto ON variaciones (producto_id, posicion);
+    """
+    TABLAS = ("productos", "variaciones")
+    VERSION = 2
+
+    def __init__(self, cliente: ClienteWooCommerce, ruta: str | None = None,
+                 cliente_async: AsyncClienteWooCommerce | None = None):
+        self.cliente = cliente
+        self.cliente_async = cliente_async
+        super().__init__(ruta or ruta_almacen("catalogo", cliente.base_url))
+
+    # ----------------------------
+    # Sincronización
+    # ----------------------------
+    def sincronizar(self, callback_progreso=None, completa: bool = False) -> None:
+        """
+        Pone el espejo al día. Hace una sincronización completa la primera vez, si se pide,
+        si la última completa tiene más de RESYNC_COMPLETA o si el total remoto no cuadra (borrados).
+        La incremental, además de los productos modificados, refresca stock y precio de lo vendido
+        en los pedidos modificados desde la anterior (_refrescar_stock): una venta no mueve date_modified.
+        """
+        with self.bloqueo, (self.cliente_async.abierto() if self.cliente_async else nullcontext()):
+            # Marca tomada antes de pedir nada: lo vendido durante la descarga se vuelve a mirar.
+            nueva_marca_pedidos = (datetime.now(timezone.utc) - SOLAPE_PEDIDOS).strftime(_FORMATO_MARCA)
+
+            with self._conexion() as con:
+                marca = self._leer_estado(con, "marca_modificacion")
+                marca_pedidos = self._leer_estado(con, "marca_pedidos")
+                ultima_completa = float(self._leer_estado(con, "ultima_completa", "0"))
+
+            if completa or not marca or not marca_pedidos or time.time() - ultima_completa > RESYNC_COMPLETA:
+                self._sincronizar(callback_progreso)
+            else:
+                self._sincronizar(callback_progreso, marca=marca)
+                self._refrescar_stock(marca_pedidos, callback_progreso)
+
+                total_remoto = self.cliente.contar_productos()
+                if total_remoto is not None and total_remoto != self.total_productos():
+                    self._sincronizar(callback_progreso)
+
+            with self._conexion() as con:
+                self._guardar_estado(con, "marca_pedidos", nueva_marca_pedidos)
+
+    def _sincronizar(self, callback_progreso=None, marca: str | None = None) -> None:
+        """Sin marca: reemplaza el espejo entero. Con marca: aplica solo los productos modificados."""
+        completa = marca is None
+        desde = None
+        if not completa:
+            desde = datetime.strptime(marca[:19], _FORMATO_MARCA) - SOLAPE_MODIFICACION
+
+        nueva_marca = marca
+        procesados = 0
+        nuevos: list[int] = []
+        avance = AgregadorProgreso(callback_progreso)
+
+        with self._conexion() as con:
+            if completa:
+                con.execute("DELETE FROM productos")
+                con.execute("DELETE FROM variaciones")
+                existentes = set()
+            else:
+                existentes = {pid for (pid,) in con.execute("SELECT id FROM productos")}
+                primera_posicion = con.execute("SELECT MIN(posicion) FROM productos").fetchone()[0] or 0
+
+            for pagina in self.cliente.iter_productos(campos=CAMPOS_PRODUCTO, modificado_despues=desde):
+                productos = [p for p in pagina.items if p.get("id")]
+
+                ids_variables = [int(p["id"]) for p in productos if _tipo(p) == "variable"]
+                avance.volcar()  # las variaciones de la página pueden tardar
+                variaciones = {}
+                for res in self._variaciones(ids_variables):
+                    if not res.ok:
+                        raise WooCommerceConexionError(res.error)
+                    variaciones[res.producto_id] = res.variaciones
+
+                for p in productos:
+                    pid = int(p["id"])
+                    fila = (_tipo(p), *_columnas_stock(p), json.dumps(p, ensure_ascii=False), pid)
+                    if pid in existentes:
+                        con.execute(
+                            "UPDATE productos SET tipo = ?, stock_status = ?, manage_stock = ?, stock = ?, datos = ? "
+                            "WHERE id = ?",
+                            fila,
+                        )
+                    else:
+                        con.execute(
+                            "INSERT INTO productos (tipo, stock_status, manage_stock, stock, datos, id, posicion) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            fila + (procesados,),
+                        )
+                        existentes.add(pid)
+                        nuevos.append(pid)
+
+                    con.execute("DELETE FROM variaciones WHERE producto_id = ?", (pid,))
+                    con.executemany(
+                        "INSERT OR REPLACE INTO variaciones "
+                        "(id, producto_id, posicion, stock_status, manage_stock, stock, datos) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        [
+                            (int(v["id"]), pid, n, *_columnas_stock(v), json.dumps(v, ensure_ascii=False))
+                            for n, v in enumerate(variaciones.get(pid, []))
+                            if v.get("id")
+                        ],
+                    )
+
+                    modificado = (p.get("date_modified_gmt") or "")[:19]
+                    if modificado and (nueva_marca is None or modificado > nueva_marca):
+                        nueva_marca = modificado
+                    procesados += 1
+
+                avance(procesados, pagina.total, "Sincronizando catálogo")
+            avance.terminar()
+
+            if not completa and nuevos:
+                # El listado viene del más nuevo al más viejo: los productos nuevos van arriba.
+                con.executemany(
+                    "UPDATE productos SET posicion = ? WHERE id = ?",
+                    [(primera_posicion - len(nuevos) + n, pid) for n, pid in enumerate(nuevos)],
+                )
+
+            self._guardar_estado(con, "marca_modificacion", nueva_marca)
+            if completa:
+                self._guardar_estado(con, "ultima_completa", time.time())
+
+    def _variaciones(self, producto_ids: list[int]):
+        if self.cliente_async is None:
+            return self.cliente.obtener_variaciones_productos(producto_ids, campos=CAMPOS_VARIACION)
+        return self.cliente_async.correr(
+            self.cliente_async.obtener_variaciones_productos(producto_ids, campos=CAMPOS_VARIACION)
+        )
+
+    def _refrescar_stock(self, marca_pedidos: str, callback_progreso=None) -> None:
+        """
+        Stock y precio (CAMPOS_STOCK) de los productos y variaciones de los pedidos modificados
+        desde `marca_pedidos` (ventas, cancelaciones y reembolsos que devuelven stock).
+        Solo actualiza filas que ya están en el espejo; el resto queda para la sincronización completa.
+        """
+        avance = AgregadorProgreso(callback_progreso)
+        procesados = 0
+        vendidos: set[int] = set()
+        variaciones_vendidas: dict[int, set[int]] = {}
+        for pagina in self.cliente.iter_pedidos(campos=CAMPOS_PEDIDO_STOCK, modificado_despues=marca_pedidos):
+            for pedido in pagina.items:
+                for linea in pedido.get("line_items") or []:
+                    pid = int(linea.get("product_id") or 0)
+                    vid = int(linea.get("variation_id") or 0)
+                    if not pid:
+                        continue
+                    # El padre también: sus variaciones pueden usar el stock del producto.
+                    vendidos.add(pid)
+                    if vid:
+                        variaciones_vendidas.setdefault(pid, set()).add(vid)
+            procesados += len(pagina.items)
+            avance(procesados, pagina.total, "Revisando ventas")
+        avance.terminar()
+
+        if vendidos:
+            with self._conexion() as con:
+                existentes = {pid for (pid,) in con.execute("SELECT id FROM productos")}
+            vendidos &= existentes
+            variaciones_vendidas = {pid: vids for pid, vids in variaciones_vendidas.items() if pid in existentes}
+        if not vendidos:
+            return
+
+        # Sin la caché del cliente: puede tener el stock de antes de la venta.
+        productos = self.cliente.obtener_productos_por_ids(vendidos, campos=CAMPOS_STOCK, refrescar=True)
+        variaciones = self.cliente.obtener_variaciones_por_ids(
+            variaciones_vendidas, campos=CAMPOS_STOCK, refrescar=True
+        ) if variaciones_vendidas else {}
+
+        with self._conexion() as con:
+            self._fusionar(con, "productos", productos.values(), CAMPOS_STOCK)
+            self._fusionar(con, "variaciones", variaciones.values(), CAMPOS_STOCK)
+
+    def registrar_cambios(self, productos=(), variaciones=()) -> None:
+        """
+        Refleja en el espejo lo que devolvió una escritura (p. ej. un lote de actualización),
+        sin mover la marca: el cambio de una variación no altera el date_modified del padre.
+        """
+        with self.bloqueo, self._conexion() as con:
+            self._fusionar(con, "productos", productos, CAMPOS_PRODUCTO)
+            self._fusionar(con, "variaciones", variaciones, CAMPOS_VARIACION)
+
+    @staticmethod
+    def _fusionar(con, tabla: str, objetos, campos) -> None:
+        """Pisa en las filas existentes de `tabla` las claves `campos` de cada objeto (los que no están se ignoran)."""
+        for obj in objetos:
+            if not obj or not obj.get("id") or obj.get("error"):
+                continue
+            fila = con.execute(f"SELECT datos FROM {tabla} WHERE id = ?", (int(obj["id"]),)).fetchone()
+            if fila is None:
+                continue
+            datos = json.loads(fila[0])
+            datos.update({k: obj[k] for k in campos if k in obj})
+            con.execute(
+                f"UPDATE {tabla} SET stock_status = ?, manage_stock = ?, stock = ?, datos = ? WHERE id = ?",
+                (*_columnas_stock(datos), json.dumps(datos, ensure_ascii=False), int(obj["id"])),
+            )
+
+    # ----------------------------
+    # Lectura
+    # ----------------------------
+    def total_productos(self) -> int:
+        with self._conexion() as con:
+            return con.execute("SELECT COUNT(*) FROM productos").fetchone()[0]
+
+    def productos(self, filtro_stock: str | None = None, tipos=None) -> list[dict]:
+        """
+        Productos en el mismo orden que los lista la API.
+        filtro_stock (ver _condicion_stock): los variables entran si alguna variación cumple.
+        tipos: solo esos tipos (ej. ("simple", "variable")).
+        """
+        condiciones = []
+        params: list = []
+        if filtro_stock in ("con_stock", "sin_stock", "con_unidades"):
+            condiciones.append(
+                "((tipo = 'variable' AND EXISTS (SELECT 1 FROM variaciones"
+                " WHERE variaciones.producto_id = productos.id"
+                f" AND {_condicion_stock(filtro_stock, 'variaciones')}))"
+                f" OR (tipo != 'variable' AND {_condicion_stock(filtro_stock, 'productos')}))"
+            )
+        if tipos:
+            tipos = list(tipos)
+            condiciones.append(f"tipo IN ({', '.join('?' * len(tipos))})")
+            params.extend(tipos)
+
+        sql = "SELECT datos FROM productos"
+        if condiciones:
+            sql += " WHERE " + " AND ".join(condiciones)
+        with self._conexion() as con:
+            return [json.loads(d) for (d,) in con.execute(sql + " ORDER BY posicion", params)]
+
+    def variaciones_por_producto(self, filtro_stock: str | None = None) -> dict[int, list[dict]]:
+        """producto_id -> variaciones en el orden de la API (solo las que cumplen filtro_stock), en una consulta."""
+        resultado: dict[int, list[dict]] = {}
+        with self._conexion() as con:
+            for pid, datos in con.execute(
+                "SELECT producto_id, datos FROM variaciones"
+                f" WHERE {_condicion_stock(filtro_stock, 'variaciones')}"
+                " ORDER BY producto_id, posicion"
+            ):
+                resultado.setdefault(pid, []).append(json.loads(datos))
+        return resultado
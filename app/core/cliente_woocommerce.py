@@ -1,158 +1,662 @@
+import math
+import threading
+import time as _time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait as _esperar_futuros
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
 import requests
+from requests.adapters import HTTPAdapter
 from decimal import Decimal, ROUND_HALF_UP
-from datetime import date, datetime, time
+from datetime import date, datetime, time, timedelta
 
+from app.core.cache_lru import CacheLRU
+from app.core.cancelacion import INTERVALO_CANCELACION, TokenCancelacion
 from app.core.configuracion import Configuracion
+from app.core.control_concurrencia import (
+    ESTADOS_REINTENTABLES,
+    ESTADOS_SATURACION,
+    REINTENTOS,
+    ControlAIMD,
+    LimitadorConcurrencia,
+    espera_reintento,
+)
 from app.core.excepciones import WooCommerceConexionError
 
+# Pool de conexiones HTTP (keep-alive) compartido por todas las llamadas del cliente.
+POOL_HOSTS = 4          # hosts distintos con pool propio
+POOL_POR_HOST = 10      # conexiones simultáneas como máximo por host
+
+# Páginas descargadas en paralelo una vez conocido X-WP-TotalPages.
+HILOS_PAGINAS = 6
+
+# Pedidos: un rango de fechas largo se parte en tramos de unas PAGINAS_POR_TRAMO páginas
+# que se descargan en paralelo (en lugar de paginar una única ventana after/before).
+PAGINAS_POR_TRAMO = 5
+
+
+def _resolver_credenciales(override_cred: dict | None) -> tuple[str, tuple[str, str]]:
+    """Devuelve (base_url de la API, (consumer_key, consumer_secret))."""
+    if override_cred is not None:
+        cred = override_cred
+    else:
+        config = Configuracion()
+        cred = config.obtener_credenciales() or {}
+
+    url = (cred.get("url") or "").strip().rstrip("/")
+    ck = (cred.get("consumer_key") or "").strip()
+    cs = (cred.get("consumer_secret") or "").strip()
+
+    if not url:
+        raise WooCommerceConexionError("URL de WooCommerce no configurada.")
+    if not ck:
+        raise WooCommerceConexionError("Consumer Key no configurado.")
+    if not cs:
+        raise WooCommerceConexionError("Consumer Secret no configurado.")
+
+    return f"{url}/wp-json/wc/v3", (ck, cs)
+
+
+def _total_paginas(headers, per_page: int) -> int | None:
+    """Total de páginas según X-WP-TotalPages (o X-WP-Total / per_page). None si no vienen."""
+    for cabecera in ("X-WP-TotalPages", "X-WP-Total"):
+        valor = (headers.get(cabecera) or "").strip()
+        if not valor.isdigit():
+            continue
+        n = int(valor)
+        return n if cabecera == "X-WP-TotalPages" else math.ceil(n / max(per_page, 1))
+    return None
+
+
+# Máximo de elementos por petición a los endpoints /batch de WooCommerce.
+LOTE_MAXIMO = 100
+
+
+def _datos_actualizacion(stock=None, precio=None) -> dict:
+    data = {}
+
+    if stock is not None:
+        data["manage_stock"] = True
+        data["stock_quantity"] = int(stock)
+
+    if precio is not None:
+        p = Decimal(str(precio)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+        data["regular_price"] = f"{p:.2f}"
+
+    return data
+
+
+def _to_rfc3339_utc(d, end_of_day: bool = False) -> str:
+
+    if isinstance(d, datetime):
+        dt = d
+    elif isinstance(d, date):
+        dt = datetime.combine(d, time(23, 59, 59) if end_of_day else time(0, 0, 0))
+    else:
+        return str(d)
+
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _params_pedidos(desde=None, hasta=None) -> dict:
+    """
+    Filtra correctamente por rango de fechas usando RFC3339 con Z.
+    Incluye status=any para traer todos los estados dentro del rango.
+    """
+    params = {
+        "orderby": "date",
+        "order": "asc",
+        "status": "any",
+    }
+
+    if desde:
+        params["after"] = _to_rfc3339_utc(desde, end_of_day=False)
+    if hasta:
+        params["before"] = _to_rfc3339_utc(hasta, end_of_day=True)
+
+    return params
+
+
+def _es_dia(d) -> bool:
+    return isinstance(d, date) and not isinstance(d, datetime)
+
+
+def _tramos_fechas(desde: date, hasta: date, total: int, per_page: int = 100) -> list[tuple[date, date]]:
+    """
+    Divide [desde, hasta] (días, inclusive) en tramos de ~PAGINAS_POR_TRAMO páginas según el total
+    de pedidos del rango (X-WP-Total), suponiendo que se reparten parejo.
+    Los tramos son de semanas enteras, o de días si una semana ya pasa de ese tamaño.
+    """
+    dias = (hasta - desde).days + 1
+    n = math.ceil(total / (max(per_page, 1) * PAGINAS_POR_TRAMO))
+    if n <= 1 or dias <= 1:
+        return [(desde, hasta)]
+
+    largo = math.ceil(dias / n)
+    if largo >= 7:
+        largo = math.ceil(largo / 7) * 7
+
+    tramos = []
+    inicio = desde
+    while inicio <= hasta:
+        fin = min(inicio + timedelta(days=largo - 1), hasta)
+        tramos.append((inicio, fin))
+        inicio = fin + timedelta(days=1)
+    return tramos
+
+
+def _params_tramo(tramos: list[tuple[date, date]], i: int) -> dict:
+    """
+    after/before del tramo i. Los extremos del rango quedan igual que en _params_pedidos;
+    entre tramos el corte es a medianoche, así un pedido de las 23:59:59 no cae entre dos tramos.
+    """
+    a, b = tramos[i]
+    desde = a if i == 0 else datetime.combine(a, time(0, 0, 0)) - timedelta(seconds=1)
+    hasta = b if i == len(tramos) - 1 else datetime.combine(b + timedelta(days=1), time(0, 0, 0))
+    return _params_pedidos(desde, hasta)
+
+
+def _sin_repetidos(pedidos: list[dict], vistos: set) -> list[dict]:
+    """Quita los pedidos ya entregados por otro tramo (o desplazados entre páginas) por ID."""
+    unicos = []
+    for o in pedidos:
+        oid = o.get("id")
+        if oid is not None:
+            if oid in vistos:
+                continue
+            vistos.add(oid)
+        unicos.append(o)
+    return unicos
+
+
+def _params_modificados(modificado_despues=None) -> dict:
+    """Filtro modified_after (fecha GMT, 'YYYY-MM-DDTHH:MM:SS') para pedir solo lo cambiado."""
+    if not modificado_despues:
+        return {}
+    if isinstance(modificado_despues, datetime):
+        modificado_despues = modificado_despues.strftime("%Y-%m-%dT%H:%M:%S")
+    return {"modified_after": str(modificado_despues), "dates_are_gmt": "true"}
+
+
+def _con_campos(params: dict | None, campos=None) -> dict:
+    """Agrega la proyección _fields (solo las claves que el módulo lee)."""
+    params = dict(params or {})
+    if campos:
+        params["_fields"] = ",".join(campos)
+    return params
+
+
+@dataclass
+class Pagina:
+    """Una página de un listado. total_paginas/total valen 0 si el servidor no envía las cabeceras."""
+    numero: int
+    total_paginas: int
+    total: int
+    items: list[dict]
+
+
+@dataclass
+class ResultadoVariaciones:
+    """Variaciones de un producto variable, o el error al pedirlas."""
+    producto_id: int
+    variaciones: list[dict] = field(default_factory=list)
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
 class ClienteWooCommerce:
-    def __init__(self, override_cred: dict | None = None):
-        if override_cred is not None:
-            cred = override_cred
-        else:
-            config = Configuracion()
-            cred = config.obtener_credenciales() or {}
-
-        url = (cred.get("url") or "").strip().rstrip("/")
-        ck = (cred.get("consumer_key") or "").strip()
-        cs = (cred.get("consumer_secret") or "").strip()
-
-        if not url:
-            raise WooCommerceConexionError("URL de WooCommerce no configurada.")
-        if not ck:
-            raise WooCommerceConexionError("Consumer Key no configurado.")
-        if not cs:
-            raise WooCommerceConexionError("Consumer Secret no configurado.")
-
-        self.base_url = f"{url}/wp-json/wc/v3"
-        self.auth = (ck, cs)
-
-        self._cache_productos: dict[int, dict] = {}
-        self._cache_variaciones: dict[tuple[int, int], dict] = {}
+    def __init__(
+        self,
+        override_cred: dict | None = None,
+        pool_hosts: int = POOL_HOSTS,
+        pool_por_host: int = POOL_POR_HOST,
+        keep_alive: bool = True,
+        hilos: int = HILOS_PAGINAS,
+        reintentos: int = REINTENTOS,
+    ):
+        self.base_url, self.auth = _resolver_credenciales(override_cred)
+
+        # Acotadas, con TTL y una sola petición por ID aunque lo pidan varios hilos a la vez.
+        self._cache_productos = CacheLRU()
+        self._cache_variaciones = CacheLRU()
+
+        self._pool_hosts = max(1, int(pool_hosts))
+        self._pool_por_host = max(1, int(pool_por_host))
+        self._keep_alive = keep_alive
+        self._hilos = max(1, int(hilos))
+        self._reintentos = max(0, int(reintentos))
+        self._reintentos_hechos = 0
+        self._conexiones_cerradas = {"abiertas": 0, "peticiones": 0}
+
+        # Peticiones en vuelo: arranca en `hilos` y se adapta (AIMD) hasta el tamaño del pool por host.
+        self._limitador = LimitadorConcurrencia(
+            ControlAIMD(inicial=min(self._hilos, self._pool_por_host), maximo=self._pool_por_host)
+        )
+        self._session = self._crear_sesion()
+
+        # Con un token activo (ver cancelable()) las peticiones corren en este pool y quien
+        # las pidió solo espera el resultado: al cancelar deja de esperar sin cortar el socket.
+        # El token es por hilo: el cliente lo comparten el catálogo y los módulos.
+        self._local = threading.local()
+        self._peticiones: ThreadPoolExecutor | None = None
+        self._peticiones_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc):
+        self.cerrar()
+
+    # ----------------------------
+    # Sesión HTTP
+    # ----------------------------
+    def _crear_sesion(self) -> requests.Session:
+        """Sesión con pool keep-alive; pool_block evita superar el límite por host."""
+        session = requests.Session()
+        session.auth = self.auth
+
+        adapter = HTTPAdapter(
+            pool_connections=self._pool_hosts,
+            pool_maxsize=self._pool_por_host,
+            pool_block=True,
+            max_retries=0,
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        if not self._keep_alive:
+            session.headers["Connection"] = "close"
+        return session
+
+    @contextmanager
+    def cancelable(self, cancelacion: TokenCancelacion | None):
+        """
+        Mientras dure el bloque, las peticiones de este hilo (y de los hilos de paginación que lance)
+        respetan `cancelacion`: al cancelarla se deja de paginar, las peticiones en cola no salen y quien
+        espera una en vuelo recibe OperacionCancelada de inmediato. Otros hilos que usen el cliente no lo ven.
+        """
+        anterior = self._cancelacion()
+        self._local.cancelacion = cancelacion
+        try:
+            yield
+        finally:
+            self._local.cancelacion = anterior
+
+    def _cancelacion(self) -> TokenCancelacion | None:
+        return getattr(self._local, "cancelacion", None)
+
+    def _con_cancelacion(self, fn):
+        """fn para un pool propio (páginas, tramos, variaciones) con el token del hilo que la encarga."""
+        cancelacion = self._cancelacion()
+        if cancelacion is None:
+            return fn
+
+        def envuelta(*args):
+            with self.cancelable(cancelacion):
+                return fn(*args)
+
+        return envuelta
+
+    def _enviar(self, cancelacion: TokenCancelacion | None, metodo: str, ruta: str, timeout: int,
+                intento: int, kwargs: dict):
+        """
+        Un intento de la petición, pasando por el limitador adaptativo. Devuelve (respuesta, reintentar).
+        Si se cancela mientras espera lugar en el limitador, no sale.
+        Solo 429/503 y los timeouts cuentan como saturación; un corte de conexión se reintenta
+        y cualquier otro error libera el lugar sin tocar el límite.
+        """
+        self._limitador.adquirir(cancelacion)
+        inicio = _time.monotonic()
+        try:
+            r = self._session.request(metodo, f"{self.base_url}{ruta}", timeout=timeout, **kwargs)
+        except requests.Timeout:
+            self._limitador.liberar(_time.monotonic() - inicio, True)
+            if intento >= self._reintentos:
+                raise
+            return None, True
+        except requests.ConnectionError:
+            self._limitador.soltar()
+            if intento >= self._reintentos:
+                raise
+            return None, True
+        except BaseException:
+            self._limitador.soltar()
+            raise
+        self._limitador.liberar(_time.monotonic() - inicio, r.status_code in ESTADOS_SATURACION)
+        return r, r.status_code in ESTADOS_REINTENTABLES
+
+    def _enviar_cancelable(self, cancelacion: TokenCancelacion, *args):
+        cancelacion.verificar()
+        with self._peticiones_lock:
+            if self._peticiones is None:
+                self._peticiones = ThreadPoolExecutor(max_workers=self._pool_por_host * 2)
+            futuro = self._peticiones.submit(self._enviar, cancelacion, *args)
+
+        while not _esperar_futuros((futuro,), timeout=INTERVALO_CANCELACION).done:
+            if cancelacion.cancelado:
+                # En cola: no llega a salir. En vuelo: termina sola y su respuesta se descarta.
+                futuro.cancel()
+                cancelacion.verificar()
+        return futuro.result()
+
+    def _solicitar(self, metodo: str, ruta: str, timeout: int = 30, **kwargs) -> requests.Response:
+        """
+        Una petición a la API, pasando por el limitador adaptativo.
+        429/502/503/504, timeouts y cortes de conexión se reintentan con backoff
+        exponencial con jitter (o lo que indique Retry-After).
+        """
+        cancelacion = self._cancelacion()
+        intento = 0
+        while True:
+            if cancelacion is None:
+                r, reintentar = self._enviar(None, metodo, ruta, timeout, intento, kwargs)
+            else:
+                r, reintentar = self._enviar_cancelable(cancelacion, metodo, ruta, timeout, intento, kwargs)
+
+            if not reintentar or intento >= self._reintentos:
+                r.raise_for_status()
+                return r
+
+            espera = espera_reintento(intento, r.headers.get("Retry-After") if r is not None else None)
+            if cancelacion is None:
+                _time.sleep(espera)
+            else:
+                cancelacion.esperar(espera)
+            intento += 1
+            self._reintentos_hechos += 1
+
+    def _iter_paginas(self, ruta: str, params: dict | None = None, per_page: int = 100, hilos: int | None = None):
+        """
+        Genera las páginas de un listado en orden.
+        Tras la primera (que indica el total), hasta `hilos` (por defecto self._hilos) páginas
+        siguientes se descargan en segundo plano mientras quien consume procesa la actual.
+        """
+        hilos = max(1, hilos or self._hilos)
+        base = dict(params or {})
+        base["per_page"] = per_page
+
+        @self._con_cancelacion
+        def pagina(n: int) -> list[dict]:
+            return list(self._solicitar("GET", ruta, params={**base, "page": n}, timeout=30).json() or [])
+
+        r = self._solicitar("GET", ruta, params={**base, "page": 1}, timeout=30)
+        items = list(r.json() or [])
+        total_paginas = _total_paginas(r.headers, per_page)
+
+        if total_paginas is None:
+            # Sin cabeceras de paginación: recorrido secuencial hasta una página vacía.
+            n = 1
+            while items:
+                yield Pagina(n, 0, 0, items)
+                n += 1
+                items = pagina(n)
+            return
+
+        total_txt = (r.headers.get("X-WP-Total") or "").strip()
+        total = int(total_txt) if total_txt.isdigit() else 0
+
+        if total_paginas <= 1:
+            yield Pagina(1, total_paginas, total, items)
+            return
+
+        ex = ThreadPoolExecutor(max_workers=min(hilos, total_paginas - 1))
+        pendientes = deque()
+        siguiente = 2
+        try:
+            while siguiente <= total_paginas and len(pendientes) < hilos:
+                pendientes.append((siguiente, ex.submit(pagina, siguiente)))
+                siguiente += 1
+
+            yield Pagina(1, total_paginas, total, items)
+
+            while pendientes:
+                n, futuro = pendientes.popleft()
+                items = futuro.result()
+                if siguiente <= total_paginas:
+                    pendientes.append((siguiente, ex.submit(pagina, siguiente)))
+                    siguiente += 1
+                yield Pagina(n, total_paginas, total, items)
+        finally:
+            ex.shutdown(wait=False, cancel_futures=True)
+
+    def _obtener_paginado(self, ruta: str, params: dict | None = None, per_page: int = 100,
+                          hilos: int | None = None) -> list[dict]:
+        """Todas las páginas de un listado unidas en orden."""
+        todos = []
+        for pagina in self._iter_paginas(ruta, params, per_page=per_page, hilos=hilos):
+            todos.extend(pagina.items)
+        return todos
+
+    def _iter_listado(self, ruta: str, params: dict | None = None, per_page: int = 100):
+        try:
+            yield from self._iter_paginas(ruta, params, per_page=per_page)
+        except Exception as e:
+            raise WooCommerceConexionError(str(e))
+
+    def _contar_conexiones(self) -> dict:
+        abiertas = 0
+        peticiones = 0
+        for adapter in set(self._session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                abiertas += int(getattr(pool, "num_connections", 0))
+                peticiones += int(getattr(pool, "num_requests", 0))
+        return {"abiertas": abiertas, "peticiones": peticiones}
+
+    def estadisticas_conexiones(self) -> dict:
+        """
+        Conexiones abiertas vs reutilizadas desde que se creó el cliente.
+        Incluye las de pools ya cerrados con cerrar().
+        """
+        actuales = self._contar_conexiones()
+        abiertas = actuales["abiertas"] + self._conexiones_cerradas["abiertas"]
+        peticiones = actuales["peticiones"] + self._conexiones_cerradas["peticiones"]
+        return {
+            "abiertas": abiertas,
+            "reutilizadas": max(peticiones - abiertas, 0),
+            "peticiones": peticiones,
+            "reintentos": self._reintentos_hechos,
+            "limite_en_vuelo": self._limitador.control.en_vuelo_permitidas(),
+        }
+
+    def cerrar(self) -> None:
+        """
+        Cierra las conexiones del pool y el pool de peticiones cancelables (las que no salieron se descartan).
+        El cliente puede seguir usándose (reabre ambos bajo demanda).
+        """
+        actuales = self._contar_conexiones()
+        self._conexiones_cerradas["abiertas"] += actuales["abiertas"]
+        self._conexiones_cerradas["peticiones"] += actuales["peticiones"]
+        self._session.close()
+
+        with self._peticiones_lock:
+            if self._peticiones is not None:
+                self._peticiones.shutdown(wait=False, cancel_futures=True)
+                self._peticiones = None
 
     def obtener_producto(self, producto_id: int) -> dict:
         """Obtiene un producto por ID con caché en memoria."""
-        if producto_id in self._cache_productos:
-            return self._cache_productos[producto_id]
+        def cargar():
+            return self._solicitar("GET", f"/products/{producto_id}", timeout=30).json()
+
         try:
-            r = requests.get(
-                f"{self.base_url}/products/{producto_id}",
-                auth=self.auth,
-                timeout=30,
-            )
-            r.raise_for_status()
-            data = r.json()
-            self._cache_productos[producto_id] = data
-            return data
+            return self._cache_productos.obtener(int(producto_id), cargar)
         except Exception as e:
             raise WooCommerceConexionError(str(e))
 
     def obtener_variacion(self, producto_id: int, variacion_id: int) -> dict:
         """Obtiene una variación por ID con caché en memoria."""
-        key = (producto_id, variacion_id)
-        if key in self._cache_variaciones:
-            return self._cache_variaciones[key]
-        try:
-            r = requests.get(
-                f"{self.base_url}/products/{producto_id}/variations/{variacion_id}",
-                auth=self.auth,
-                timeout=30,
-            )
-            r.raise_for_status()
-            data = r.json()
-            self._cache_variaciones[key] = data
-            return data
+        def cargar():
+            return self._solicitar("GET", f"/products/{producto_id}/variations/{variacion_id}", timeout=30).json()
+
+        try:
+            return self._cache_variaciones.obtener((int(producto_id), int(variacion_id)), cargar)
+        except Exception as e:
+            raise WooCommerceConexionError(str(e))
+
+    def obtener_productos_por_ids(self, producto_ids, campos=None, refrescar: bool = False) -> dict[int, dict]:
+        """
+        Varios productos por ID: los que no están en caché se piden en consultas include= de hasta
+        LOTE_MAXIMO IDs, en paralelo, y se guardan en la caché. Devuelve {id: producto};
+        los IDs que no existen (o son variaciones) no aparecen.
+        Con campos, la caché se usa con la misma proyección (clave (id, campos)).
+        Con refrescar, se piden todos aunque estén en caché (y la caché queda con lo nuevo).
+        """
+        campos = tuple(campos) if campos else None
+        ids = dict.fromkeys(int(i) for i in producto_ids if i)
+        grupos = {"/products": [(pid if campos is None else (pid, campos), pid) for pid in ids]}
+        return self._obtener_por_ids(self._cache_productos, grupos, campos, refrescar)
+
+    def obtener_variaciones_por_ids(self, ids_por_producto: dict, campos=None,
+                                    refrescar: bool = False) -> dict[int, dict]:
+        """
+        Como obtener_productos_por_ids, para variaciones agrupadas por padre
+        ({producto_id: [variacion_id, ...]}). Devuelve {variacion_id: variacion}.
+        """
+        campos = tuple(campos) if campos else None
+        grupos = {}
+        for pid, vids in ids_por_producto.items():
+            pid = int(pid)
+            claves = [(pid, vid) for vid in dict.fromkeys(int(v) for v in vids if v)]
+            if pid and claves:
+                grupos[f"/products/{pid}/variations"] = [
+                    (k if campos is None else (k, campos), k[1]) for k in claves
+                ]
+        return self._obtener_por_ids(self._cache_variaciones, grupos, campos, refrescar)
+
+    def _obtener_por_ids(self, cache: CacheLRU, grupos: dict[str, list], campos,
+                         refrescar: bool = False) -> dict[int, dict]:
+        """grupos: {ruta del listado: [(clave de caché, id), ...]}"""
+        resultado: dict[int, dict] = {}
+        consultas = []
+        for ruta, items in grupos.items():
+            faltantes = {}
+            for clave, id_ in items:
+                obj = None if refrescar else cache.buscar(clave)
+                if obj is None:
+                    faltantes[id_] = clave
+                else:
+                    resultado[id_] = obj
+            ids = list(faltantes)
+            for i in range(0, len(ids), LOTE_MAXIMO):
+                consultas.append((ruta, ids[i:i + LOTE_MAXIMO], faltantes))
+
+        @self._con_cancelacion
+        def cargar(consulta) -> tuple[dict, list[dict]]:
+            ruta, ids, claves = consulta
+            params = _con_campos({"include": ",".join(str(i) for i in ids)}, campos)
+            return claves, self._obtener_paginado(ruta, params, per_page=LOTE_MAXIMO)
+
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, min(self._hilos, len(consultas)))) as ex:
+                for claves, objetos in ex.map(cargar, consultas):
+                    for obj in objetos:
+                        id_ = int(obj.get("id") or 0)
+                        if id_ in claves:
+                            cache.guardar(claves[id_], obj)
+                            resultado[id_] = obj
         except Exception as e:
             raise WooCommerceConexionError(str(e))
 
+        return resultado
+
+    def estadisticas_cache(self) -> dict:
+        return {
+            "productos": self._cache_productos.estadisticas(),
+            "variaciones": self._cache_variaciones.estadisticas(),
+        }
+
     def probar_conexion(self):
         try:
-            r = requests.get(
-                f"{self.base_url}/system_status",
-                auth=self.auth,
-                timeout=10
-            )
-            r.raise_for_status()
+            self._solicitar("GET", "/system_status", timeout=10)
             return True
         except Exception as e:
             raise WooCommerceConexionError(str(e))
 
     def _to_rfc3339_utc(self, d, end_of_day: bool = False) -> str:
+        return _to_rfc3339_utc(d, end_of_day=end_of_day)
 
-        if isinstance(d, datetime):
-            dt = d
-        elif isinstance(d, date):
-            dt = datetime.combine(d, time(23, 59, 59) if end_of_day else time(0, 0, 0))
-        else:
-            return str(d)
-
-        return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
-
-    def obtener_pedidos(self, desde=None, hasta=None, per_page=100):
+    def obtener_pedidos(self, desde=None, hasta=None, per_page=100, campos=None):
         """
         Filtra correctamente por rango de fechas usando RFC3339 con Z.
         Incluye status=any para traer todos los estados dentro del rango.
+        campos: proyección _fields opcional (ej. ("id", "date_created", "total")).
         """
-        page = 1
-        todos = []
         try:
-            while True:
-                params = {
-                    "per_page": per_page,
-                    "page": page,
-                    "orderby": "date",
-                    "order": "asc",
-                    "status": "any",
-                }
-
-                if desde:
-                    params["after"] = self._to_rfc3339_utc(desde, end_of_day=False)
-                if hasta:
-                    params["before"] = self._to_rfc3339_utc(hasta, end_of_day=True)
-
-                r = requests.get(
-                    f"{self.base_url}/orders",
-                    auth=self.auth,
-                    params=params,
-                    timeout=30
-                )
-                r.raise_for_status()
-
-                data = r.json()
-                if not data:
-                    break
-
-                todos.extend(data)
-                page += 1
-
-            return todos
+            return [o for pagina in self.iter_pedidos(desde, hasta, per_page, campos) for o in pagina.items]
         except Exception as e:
             raise WooCommerceConexionError(str(e))
 
-    def obtener_ordenes(self, *args, **kwargs):
-        return self.obtener_pedidos(*args, **kwargs)
+    def iter_pedidos(self, desde=None, hasta=None, per_page=100, campos=None, modificado_despues=None):
+        """
+        Como obtener_pedidos, pero entrega Pagina por Pagina mientras descarga las siguientes.
+        Con modificado_despues (GMT) solo trae los pedidos cambiados desde esa fecha.
+        Un rango de días largo se descarga por tramos en paralelo (ver _iter_pedidos_por_tramos).
+        """
+        if modificado_despues is None and _es_dia(desde) and _es_dia(hasta):
+            return self._iter_pedidos_por_tramos(desde, hasta, per_page, campos)
+        params = {**_params_pedidos(desde, hasta), **_params_modificados(modificado_despues)}
+        return self._iter_listado("/orders", _con_campos(params, campos), per_page=per_page)
 
-    def obtener_productos(self, per_page=100, filtro_stock=None):
-        page = 1
-        todos = []
+    def _iter_pedidos_por_tramos(self, desde: date, hasta: date, per_page: int = 100, campos=None):
+        """
+        Parte [desde, hasta] en tramos de fechas según X-WP-Total (_tramos_fechas) y descarga hasta
+        self._hilos tramos a la vez; el limitador adaptativo reparte las conexiones entre ellos.
+        Entrega una Pagina por tramo, en orden de fecha y sin pedidos repetidos entre tramos.
+        """
+        total = self.contar_pedidos(desde, hasta)
+        tramos = _tramos_fechas(desde, hasta, total or 0, per_page)
+        if len(tramos) == 1:
+            yield from self._iter_listado("/orders", _con_campos(_params_pedidos(desde, hasta), campos), per_page)
+            return
+
+        hilos = min(self._hilos, len(tramos))
+        # Con varios tramos en vuelo, cada uno adelanta menos páginas propias.
+        hilos_tramo = max(1, self._hilos // hilos)
+
+        @self._con_cancelacion
+        def tramo(i: int) -> list[dict]:
+            params = _con_campos(_params_tramo(tramos, i), campos)
+            return self._obtener_paginado("/orders", params, per_page=per_page, hilos=hilos_tramo)
+
+        vistos: set = set()
+        ex = ThreadPoolExecutor(max_workers=hilos)
+        pendientes = deque()
+        siguiente = 0
         try:
-            while True:
-                params = {"per_page": per_page, "page": page}
-
-                r = requests.get(
-                    f"{self.base_url}/products",
-                    auth=self.auth,
-                    params=params,
-                    timeout=30
-                )
-                r.raise_for_status()
+            while siguiente < len(tramos) or pendientes:
+                while siguiente < len(tramos) and len(pendientes) < hilos:
+                    pendientes.append((siguiente, ex.submit(tramo, siguiente)))
+                    siguiente += 1
+
+                i, futuro = pendientes.popleft()
+                try:
+                    items = _sin_repetidos(futuro.result(), vistos)
+                except Exception as e:
+                    raise WooCommerceConexionError(str(e))
+                yield Pagina(i + 1, len(tramos), total or 0, items)
+        finally:
+            ex.shutdown(wait=False, cancel_futures=True)
+
+    def contar_pedidos(self, desde=None, hasta=None) -> int | None:
+        """Pedidos en el rango (cabecera X-WP-Total) con una petición mínima; None si no viene."""
+        return self._contar("/orders", _params_pedidos(desde, hasta))
 
-                productos = r.json()
-                if not productos:
-                    break
+    def obtener_ordenes(self, *args, **kwargs):
+        return self.obtener_pedidos(*args, **kwargs)
 
-                todos.extend(productos)
-                page += 1
+    def obtener_productos(self, per_page=100, filtro_stock=None, campos=None):
+        if campos and filtro_stock:
+            campos = tuple(campos) + ("stock_quantity",)
+        try:
+            todos = self._obtener_paginado("/products", _con_campos(None, campos), per_page=per_page)
 
             if filtro_stock == "sin_stock":
                 todos = [p for p in todos if int(p.get("stock_quantity") or 0) <= 0]
@@ -163,77 +667,131 @@ class ClienteWooCommerce:
         except Exception as e:
             raise WooCommerceConexionError(str(e))
 
-    def obtener_variaciones_producto(self, producto_id: int, per_page: int = 100):
-        page = 1
-        todos = []
-        try:
-            while True:
-                params = {"per_page": per_page, "page": page}
-                r = requests.get(
-                    f"{self.base_url}/products/{producto_id}/variations",
-                    auth=self.auth,
-                    params=params,
-                    timeout=30
-                )
-                r.raise_for_status()
+    def iter_productos(self, per_page=100, campos=None, modificado_despues=None):
+        """
+        Como obtener_productos, pero entrega Pagina por Pagina mientras descarga las siguientes.
+        Con modificado_despues (GMT) solo trae los productos cambiados desde esa fecha.
+        """
+        params = _con_campos(_params_modificados(modificado_despues), campos)
+        return self._iter_listado("/products", params, per_page=per_page)
+
+    def contar_productos(self) -> int | None:
+        """Total de productos de la tienda (cabecera X-WP-Total) con una petición mínima; None si no viene."""
+        return self._contar("/products")
 
-                data = r.json()
-                if not data:
-                    break
+    def _contar(self, ruta: str, params: dict | None = None) -> int | None:
+        try:
+            r = self._solicitar("GET", ruta, params={**(params or {}), "per_page": 1, "_fields": "id"})
+            total = (r.headers.get("X-WP-Total") or "").strip()
+            return int(total) if total.isdigit() else None
+        except Exception as e:
+            raise WooCommerceConexionError(str(e))
 
-                todos.extend(data)
-                page += 1
+    def iter_variaciones(self, producto_id: int, per_page: int = 100, campos=None):
+        """Como obtener_variaciones_producto, pero entrega Pagina por Pagina."""
+        return self._iter_listado(
+            f"/products/{producto_id}/variations",
+            _con_campos(None, campos),
+            per_page=per_page,
+        )
 
-            return todos
+    def obtener_variaciones_producto(self, producto_id: int, per_page: int = 100, campos=None):
+        try:
+            return self._obtener_paginado(
+                f"/products/{producto_id}/variations",
+                _con_campos(None, campos),
+                per_page=per_page,
+            )
         except Exception as e:
             raise WooCommerceConexionError(str(e))
 
-    def actualizar_producto(self, producto_id: int, stock=None, precio=None):
-        data = {}
+    def obtener_variaciones_productos(self, producto_ids, per_page: int = 100, campos=None) -> list[ResultadoVariaciones]:
+        """
+        Variaciones de varios productos variables en paralelo (como máximo self._hilos a la vez).
+        Devuelve un resultado por producto, en el mismo orden de producto_ids;
+        un fallo en un producto no detiene a los demás.
+        """
+        ids = [int(pid) for pid in producto_ids]
+        if not ids:
+            return []
+
+        @self._con_cancelacion
+        def cargar(pid: int) -> ResultadoVariaciones:
+            try:
+                return ResultadoVariaciones(
+                    pid, self.obtener_variaciones_producto(pid, per_page=per_page, campos=campos)
+                )
+            except Exception as e:
+                return ResultadoVariaciones(pid, error=str(e))
 
-        if stock is not None:
-            data["manage_stock"] = True
-            data["stock_quantity"] = int(stock)
+        with ThreadPoolExecutor(max_workers=min(self._hilos, len(ids))) as ex:
+            return list(ex.map(cargar, ids))
 
-        if precio is not None:
-            p = Decimal(str(precio)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-            data["regular_price"] = f"{p:.2f}"
+    def actualizar_producto(self, producto_id: int, stock=None, precio=None):
+        data = _datos_actualizacion(stock=stock, precio=precio)
 
         try:
-            r = requests.put(
-                f"{self.base_url}/products/{producto_id}",
-                auth=self.auth,
+            r = self._solicitar(
+                "PUT",
+                f"/products/{producto_id}",
                 json=data,
                 timeout=30
             )
-            r.raise_for_status()
+            self._cache_productos.invalidar(int(producto_id))
             return r.json()
         except Exception as e:
             raise WooCommerceConexionError(str(e))
 
     def actualizar_variacion(self, producto_id: int, variacion_id: int, stock=None, precio=None):
-        data = {}
-
-        if stock is not None:
-            data["manage_stock"] = True
-            data["stock_quantity"] = int(stock)
-
-        if precio is not None:
-            p = Decimal(str(precio)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-            data["regular_price"] = f"{p:.2f}"
+        data = _datos_actualizacion(stock=stock, precio=precio)
 
         try:
-            r = requests.put(
-                f"{self.base_url}/products/{producto_id}/variations/{variacion_id}",
-                auth=self.auth,
+            r = self._solicitar(
+                "PUT",
+                f"/products/{producto_id}/variations/{variacion_id}",
                 json=data,
                 timeout=30
             )
-            r.raise_for_status()
+            self._cache_variaciones.invalidar((int(producto_id), int(variacion_id)))
             return r.json()
         except Exception as e:
             raise WooCommerceConexionError(str(e))
 
+    def actualizar_productos_lote(self, cambios: list[dict]) -> list[dict]:
+        """
+        POST /products/batch. cambios: [{"id", "stock", "precio"}, ...] (máx. LOTE_MAXIMO).
+        Devuelve la lista "update" de la respuesta: un objeto por elemento,
+        con la clave "error" en los que WooCommerce rechazó.
+        """
+        respuesta = self._actualizar_lote("/products/batch", cambios)
+        for c in cambios:
+            self._cache_productos.invalidar(int(c["id"]))
+        return respuesta
+
+    def actualizar_variaciones_lote(self, producto_id: int, cambios: list[dict]) -> list[dict]:
+        """POST /products/{producto_id}/variations/batch. Igual que actualizar_productos_lote."""
+        respuesta = self._actualizar_lote(f"/products/{producto_id}/variations/batch", cambios)
+        for c in cambios:
+            self._cache_variaciones.invalidar((int(producto_id), int(c["id"])))
+        return respuesta
+
+    def _actualizar_lote(self, ruta: str, cambios: list[dict]) -> list[dict]:
+        if len(cambios) > LOTE_MAXIMO:
+            raise ValueError(f"Un lote admite como máximo {LOTE_MAXIMO} elementos.")
+
+        payload = {
+            "update": [
+                {"id": int(c["id"]), **_datos_actualizacion(stock=c.get("stock"), precio=c.get("precio"))}
+                for c in cambios
+            ]
+        }
+
+        try:
+            r = self._solicitar("POST", ruta, json=payload, timeout=60)
+            return list((r.json() or {}).get("update") or [])
+        except Exception as e:
+            raise WooCommerceConexionError(str(e))
+
     def obtener_sku_producto(self, producto_id: int) -> str:
         try:
             p = self.obtener_producto(producto_id)
@@ -0,0 +1,354 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+import aiohttp
+
+from app.core.cache_lru import CacheLRU
+from app.core.cancelacion import INTERVALO_CANCELACION, TokenCancelacion
+from app.core.cliente_woocommerce import (
+    HILOS_PAGINAS,
+    LOTE_MAXIMO,
+    ResultadoVariaciones,
+    _con_campos,
+    _datos_actualizacion,
+    _es_dia,
+    _params_pedidos,
+    _params_tramo,
+    _resolver_credenciales,
+    _sin_repetidos,
+    _total_paginas,
+    _tramos_fechas,
+)
+from app.core.control_concurrencia import (
+    ESTADOS_REINTENTABLES,
+    ESTADOS_SATURACION,
+    REINTENTOS,
+    ControlAIMD,
+    LimitadorConcurrenciaAsync,
+    espera_reintento,
+)
+from app.core.excepciones import WooCommerceConexionError
+
+# Peticiones en vuelo como máximo (límite adaptativo + límite del conector).
+CONCURRENCIA = 20
+
+
+class AsyncClienteWooCommerce:
+    """
+    Variante asyncio de ClienteWooCommerce con las mismas operaciones.
+    Todo corre en un event loop del hilo que la usa; la concurrencia la limita un semáforo
+    adaptativo (ControlAIMD), no hilos. Reintenta y cuenta la saturación igual que el cliente síncrono.
+
+    Desde un Worker (ya dentro de su QThread):
+        cliente = AsyncClienteWooCommerce()
+        with cliente.abierto(), cliente.cancelable(token):
+            variaciones = cliente.correr(cliente.obtener_variaciones_productos(ids))
+    """
+
+    def __init__(self, override_cred: dict | None = None, concurrencia: int = CONCURRENCIA,
+                 reintentos: int = REINTENTOS):
+        self.base_url, self.auth = _resolver_credenciales(override_cred)
+        self._concurrencia = max(1, int(concurrencia))
+        self._reintentos = max(0, int(reintentos))
+
+        # Event loop, sesión, limitador y token son del hilo: cada QThread corre su propio loop.
+        self._local = threading.local()
+
+        self._cache_productos = CacheLRU()
+        self._cache_variaciones = CacheLRU()
+
+    # ----------------------------
+    # Event loop del hilo
+    # ----------------------------
+    @contextmanager
+    def abierto(self):
+        """
+        Mantiene un event loop (y su sesión HTTP) en el hilo actual mientras dure el bloque:
+        las llamadas a correr() dentro de él reutilizan las conexiones.
+        """
+        if getattr(self._local, "loop", None) is not None:
+            yield self
+            return
+
+        loop = asyncio.new_event_loop()
+        self._local.loop = loop
+        try:
+            yield self
+        finally:
+            try:
+                loop.run_until_complete(self.cerrar())
+                loop.run_until_complete(loop.shutdown_asyncgens())
+            finally:
+                self._local.loop = None
+                loop.close()
+
+    @contextmanager
+    def cancelable(self, cancelacion: TokenCancelacion | None):
+        """Como ClienteWooCommerce.cancelable: correr() en este hilo respeta `cancelacion` mientras dure el bloque."""
+        anterior = self._cancelacion()
+        self._local.cancelacion = cancelacion
+        try:
+            yield
+        finally:
+            self._local.cancelacion = anterior
+
+    def _cancelacion(self) -> TokenCancelacion | None:
+        return getattr(self._local, "cancelacion", None)
+
+    def correr(self, corrutina):
+        """
+        Ejecuta la corrutina en el event loop del hilo (el de abierto(), o uno solo para esta llamada).
+        Al cancelarse el token del hilo, las peticiones en vuelo se cancelan y sale OperacionCancelada.
+        """
+        principal = self._vigilar(corrutina, self._cancelacion())
+        loop = getattr(self._local, "loop", None)
+        if loop is not None:
+            return loop.run_until_complete(principal)
+
+        async def _una_vez():
+            try:
+                return await principal
+            finally:
+                await self.cerrar()
+
+        return asyncio.run(_una_vez())
+
+    @staticmethod
+    async def _vigilar(corrutina, cancelacion: TokenCancelacion | None):
+        tarea = asyncio.ensure_future(corrutina)
+        if cancelacion is None:
+            return await tarea
+        while True:
+            hecho, _pendiente = await asyncio.wait({tarea}, timeout=INTERVALO_CANCELACION)
+            if hecho:
+                return tarea.result()
+            if cancelacion.cancelado:
+                tarea.cancel()
+                # Deja que las peticiones canceladas liberen el limitador y sus conexiones.
+                await asyncio.wait({tarea})
+                cancelacion.verificar()
+
+    async def cerrar(self) -> None:
+        session = getattr(self._local, "session", None)
+        if session is not None and not session.closed:
+            await session.close()
+        self._local.session = None
+        self._local.limitador = None
+
+    # ----------------------------
+    # Sesión HTTP
+    # ----------------------------
+    def _sesion(self) -> aiohttp.ClientSession:
+        session = getattr(self._local, "session", None)
+        if session is None or session.closed:
+            session = self._local.session = aiohttp.ClientSession(
+                headers={"Authorization": aiohttp.encode_basic_auth(*self.auth)},
+                connector=aiohttp.TCPConnector(limit=self._concurrencia, limit_per_host=self._concurrencia),
+                timeout=aiohttp.ClientTimeout(total=30),
+            )
+            self._local.limitador = LimitadorConcurrenciaAsync(
+                ControlAIMD(inicial=min(HILOS_PAGINAS, self._concurrencia), maximo=self._concurrencia)
+            )
+        return session
+
+    async def _solicitar(self, metodo: str, ruta: str, **kwargs):
+        """
+        Devuelve (json, cabeceras) de la respuesta. Reintenta 429/502/503/504 y errores de red;
+        solo 429/503 y los timeouts reducen la concurrencia (como ClienteWooCommerce._enviar).
+        """
+        session = self._sesion()
+        limitador = self._local.limitador
+        intento = 0
+        while True:
+            await limitador.adquirir()
+            inicio = time.monotonic()
+            try:
+                async with session.request(metodo, f"{self.base_url}{ruta}", **kwargs) as r:
+                    cuerpo = await r.read()
+            except asyncio.TimeoutError:
+                limitador.liberar(time.monotonic() - inicio, True)
+                if intento >= self._reintentos:
+                    raise
+                retry_after = None
+            except aiohttp.ClientConnectionError:
+                limitador.soltar()
+                if intento >= self._reintentos:
+                    raise
+                retry_after = None
+            except BaseException:
+                limitador.soltar()
+                raise
+            else:
+                limitador.liberar(time.monotonic() - inicio, r.status in ESTADOS_SATURACION)
+                if r.status not in ESTADOS_REINTENTABLES or intento >= self._reintentos:
+                    r.raise_for_status()
+                    return (json.loads(cuerpo) if cuerpo else None), r.headers
+                retry_after = r.headers.get("Retry-After")
+
+            await asyncio.sleep(espera_reintento(intento, retry_after))
+            intento += 1
+
+    async def _obtener_paginado(self, ruta: str, params: dict | None = None, per_page: int = 100) -> list[dict]:
+        """Primera página + el resto en paralelo según X-WP-TotalPages, unidas en orden."""
+        base = dict(params or {})
+        base["per_page"] = per_page
+
+        data, headers = await self._solicitar("GET", ruta, params={**base, "page": 1})
+        todos = list(data or [])
+        total = _total_paginas(headers, per_page)
+
+        if total is None:
+            n = 2
+            while todos:
+                data, _headers = await self._solicitar("GET", ruta, params={**base, "page": n})
+                if not data:
+                    break
+                todos.extend(data)
+                n += 1
+            return todos
+
+        paginas = await asyncio.gather(
+            *(self._solicitar("GET", ruta, params={**base, "page": n}) for n in range(2, total + 1))
+        )
+        for data, _headers in paginas:
+            todos.extend(data or [])
+        return todos
+
+    # ----------------------------
+    # Operaciones
+    # ----------------------------
+    async def probar_conexion(self):
+        try:
+            await self._solicitar("GET", "/system_status")
+            return True
+        except Exception as e:
+            raise WooCommerceConexionError(str(e))
+
+    async def obtener_producto(self, producto_id: int) -> dict:
+        """Obtiene un producto por ID con caché en memoria."""
+        data = self._cache_productos.buscar(int(producto_id))
+        if data is not None:
+            return data
+        try:
+            data, _headers = await self._solicitar("GET", f"/products/{producto_id}")
+            self._cache_productos.guardar(int(producto_id), data)
+            return data
+        except Exception as e:
+            raise WooCommerceConexionError(str(e))
+
+    async def obtener_variacion(self, producto_id: int, variacion_id: int) -> dict:
+        """Obtiene una variación por ID con caché en memoria."""
+        key = (int(producto_id), int(variacion_id))
+        data = self._cache_variaciones.buscar(key)
+        if data is not None:
+            return data
+        try:
+            data, _headers = await self._solicitar("GET", f"/products/{producto_id}/variations/{variacion_id}")
+            self._cache_variaciones.guardar(key, data)
+            return data
+        except Exception as e:
+            raise WooCommerceConexionError(str(e))
+
+    async def obtener_pedidos(self, desde=None, hasta=None, per_page=100, campos=None):
+        """Un rango de días largo se parte en tramos de fechas que se piden a la vez (como el cliente síncrono)."""
+        try:
+            if _es_dia(desde) and _es_dia(hasta):
+                _data, headers = await self._solicitar(
+                    "GET", "/orders", params={**_params_pedidos(desde, hasta), "per_page": 1, "_fields": "id"}
+                )
+                total = (headers.get("X-WP-Total") or "").strip()
+                tramos = _tramos_fechas(desde, hasta, int(total) if total.isdigit() else 0, per_page)
+                if len(tramos) > 1:
+                    partes = await asyncio.gather(*(
+                        self._obtener_paginado("/orders", _con_campos(_params_tramo(tramos, i), campos), per_page)
+                        for i in range(len(tramos))
+                    ))
+                    vistos: set = set()
+                    return [o for parte in partes for o in _sin_repetidos(parte, vistos)]
+
+            params = _con_campos(_params_pedidos(desde, hasta), campos)
+            return await self._obtener_paginado("/orders", params, per_page=per_page)
+        except Exception as e:
+            raise WooCommerceConexionError(str(e))
+
+    async def obtener_productos(self, per_page=100, campos=None):
+        try:
+            return await self._obtener_paginado("/products", _con_campos(None, campos), per_page=per_page)
+        except Exception as e:
+            raise WooCommerceConexionError(str(e))
+
+    async def obtener_variaciones_producto(self, producto_id: int, per_page: int = 100, campos=None):
+        try:
+            return await self._obtener_paginado(
+                f"/products/{producto_id}/variations",
+                _con_campos(None, campos),
+                per_page=per_page,
+            )
+        except Exception as e:
+            raise WooCommerceConexionError(str(e))
+
+    async def obtener_variaciones_productos(self, producto_ids, per_page: int = 100, campos=None) -> list[ResultadoVariaciones]:
+        """Un resultado por producto, en el orden de producto_ids; los fallos no detienen al resto."""
+        async def cargar(pid: int) -> ResultadoVariaciones:
+            try:
+                return ResultadoVariaciones(
+                    pid, await self.obtener_variaciones_producto(pid, per_page=per_page, campos=campos)
+                )
+            except Exception as e:
+                return ResultadoVariaciones(pid, error=str(e))
+
+        return list(await asyncio.gather(*(cargar(int(pid)) for pid in producto_ids)))
+
+    async def actualizar_producto(self, producto_id: int, stock=None, precio=None):
+        data = _datos_actualizacion(stock=stock, precio=precio)
+        try:
+            respuesta, _headers = await self._solicitar("PUT", f"/products/{producto_id}", json=data)
+            self._cache_productos.invalidar(int(producto_id))
+            return respuesta
+        except Exception as e:
+            raise WooCommerceConexionError(str(e))
+
+    async def actualizar_variacion(self, producto_id: int, variacion_id: int, stock=None, precio=None):
+        data = _datos_actualizacion(stock=stock, precio=precio)
+        try:
+            respuesta, _headers = await self._solicitar(
+                "PUT", f"/products/{producto_id}/variations/{variacion_id}", json=data
+            )
+            self._cache_variaciones.invalidar((int(producto_id), int(variacion_id)))
+            return respuesta
+        except Exception as e:
+            raise WooCommerceConexionError(str(e))
+
+    async def actualizar_productos_lote(self, cambios: list[dict]) -> list[dict]:
+        respuesta = await self._actualizar_lote("/products/batch", cambios)
+        for c in cambios:
+            self._cache_productos.invalidar(int(c["id"]))
+        return respuesta
+
+    async def actualizar_variaciones_lote(self, producto_id: int, cambios: list[dict]) -> list[dict]:
+        respuesta = await self._actualizar_lote(f"/products/{producto_id}/variations/batch", cambios)
+        for c in cambios:
+            self._cache_variaciones.invalidar((int(producto_id), int(c["id"])))
+        return respuesta
+
+    async def _actualizar_lote(self, ruta: str, cambios: list[dict]) -> list[dict]:
+        if len(cambios) > LOTE_MAXIMO:
+            raise ValueError(f"Un lote admite como máximo {LOTE_MAXIMO} elementos.")
+
+        payload = {
+            "update": [
+                {"id": int(c["id"]), **_datos_actualizacion(stock=c.get("stock"), precio=c.get("precio"))}
+                for c in cambios
+            ]
+        }
+
+        try:
+            respuesta, _headers = await self._solicitar("POST", ruta, json=payload)
+            return list((respuesta or {}).get("update") or [])
+        except Exception as e:
+            raise WooCommerceConexionError(str(e))
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from app.core.cancelacion import INTERVALO_CANCELACION, TokenCancelacion
+
+# Respuestas que se reintentan; solo las de "servidor saturado" reducen además la concurrencia.
+ESTADOS_REINTENTABLES = {429, 502, 503, 504}
+ESTADOS_SATURACION = {429, 503}
+
+REINTENTOS = 5
+ESPERA_BASE = 0.5       # segundos
+ESPERA_MAXIMA = 30.0    # segundos
+
+
+def espera_reintento(intento: int, retry_after: str | None = None,
+                     base: float = ESPERA_BASE, maximo: float = ESPERA_MAXIMA) -> float:
+    """
+    Segundos a esperar antes del reintento número `intento` (0, 1, 2...).
+    Respeta Retry-After (segundos o fecha HTTP); si no viene, backoff exponencial con jitter completo.
+    """
+    valor = (retry_after or "").strip()
+    if valor:
+        if valor.isdigit():
+            return min(float(valor), maximo)
+        try:
+            cuando = parsedate_to_datetime(valor)
+            if cuando.tzinfo is None:
+                cuando = cuando.replace(tzinfo=timezone.utc)
+            segundos = (cuando - datetime.now(timezone.utc)).total_seconds()
+            return min(max(segundos, 0.0), maximo)
+        except (TypeError, ValueError):
+            pass
+    return random.uniform(0, min(maximo, base * (2 ** intento)))
+
+
+class ControlAIMD:
+    """
+    Límite de peticiones en vuelo (additive increase / multiplicative decrease).
+    - Respuesta normal y rápida: el límite sube ~1 por cada "ventana" completa de peticiones.
+    - Saturación (429/503, timeout) o latencia muy por encima de la habitual: el límite se reduce a la mitad,
+      como máximo una vez por intervalo de latencia para no desplomarlo con errores simultáneos.
+    No es thread-safe por sí mismo: lo protegen los limitadores de abajo.
+    """
+
+    def __init__(self, inicial: float = 4, minimo: float = 1, maximo: float = 10,
+                 factor_latencia: float = 3.0, reduccion: float = 0.5):
+        self.minimo = max(1.0, float(minimo))
+        self.maximo = max(self.minimo, float(maximo))
+        self.limite = min(max(float(inicial), self.minimo), self.maximo)
+        self.factor_latencia = factor_latencia
+        self.reduccion = reduccion
+
+        self.latencia_base: float | None = None   # EWMA de latencias sin saturación
+        self.tasa_error = 0.0                     # EWMA de errores de saturación
+        self.reducciones = 0
+        self._ultima_reduccion = 0.0
+
+    def registrar(self, latencia: float, saturado: bool) -> None:
+        self.tasa_error = 0.9 * self.tasa_error + (0.1 if saturado else 0.0)
+
+        if saturado:
+            self._reducir(latencia)
+            return
+
+        lenta = (
+            self.latencia_base is not None
+            and latencia > self.factor_latencia * self.latencia_base
+        )
+        # La referencia sigue también a las respuestas lentas: si el servidor se vuelve
+        # lento de forma sostenida, deja de contarse como congestión.
+        self.latencia_base = latencia if self.latencia_base is None else 0.8 * self.latencia_base + 0.2 * latencia
+
+        if lenta:
+            self._reducir(latencia)
+        else:
+            self.limite = min(self.maximo, self.limite + 1.0 / self.limite)
+
+    def _reducir(self, latencia: float) -> None:
+        ahora = time.monotonic()
+        if ahora - self._ultima_reduccion < max(latencia, self.latencia_base or 0.0):
+            return
+        self._ultima_reduccion = ahora
+        self.limite = max(self.minimo, self.limite * self.reduccion)
+        self.reducciones += 1
+
+    def en_vuelo_permitidas(self) -> int:
+        return max(1, int(self.limite))
+
+
+class LimitadorConcurrencia:
+    """Semáforo de tamaño variable (según ControlAIMD) para hilos."""
+
+    def __init__(self, control: ControlAIMD):
+        self.control = control
+        self._cond = threading.Condition()
+        self._en_vuelo = 0
+
+    def adquirir(self, cancelacion: TokenCancelacion | None = None) -> None:
+        """Espera un lugar libre. Con `cancelacion`, una petición en cola que se cancela no llega a salir."""
+        with self._cond:
+            while self._en_vuelo >= self.control.en_vuelo_permitidas():
+                if cancelacion is None:
+                    self._cond.wait()
+                else:
+                    cancelacion.verificar()
+                    self._cond.wait(INTERVALO_CANCELACION)
+            if cancelacion is not None:
+                cancelacion.verificar()
+            self._en_vuelo += 1
+
+    def liberar(self, latencia: float, saturado: bool) -> None:
+        with self._cond:
+            self._en_vuelo -= 1
+            self.control.registrar(latencia, saturado)
+            self._cond.notify_all()
+
+    def soltar(self) -> None:
+        """Libera el lugar sin registrar la petición (falló por algo que no dice nada de la carga)."""
+        with self._cond:
+            self._en_vuelo -= 1
+            self._cond.notify_all()
+
+
+class LimitadorConcurrenciaAsync:
+    """
+    Igual que LimitadorConcurrencia, para las corrutinas de un solo event loop.
+    Liberar no espera: se puede llamar desde un finally aunque la tarea se esté cancelando.
+    """
+
+    def __init__(self, control: ControlAIMD):
+        self.control = control
+        self._en_vuelo = 0
+        self._esperando: deque[asyncio.Future] = deque()
+
+    async def adquirir(self) -> None:
+        while self._en_vuelo >= self.control.en_vuelo_permitidas():
+            futuro = asyncio.get_running_loop().create_future()
+            self._esperando.append(futuro)
+            try:
+                await futuro
+            except asyncio.CancelledError:
+                # Despertada justo al cancelarse: el lugar pasa a la siguiente.
+                if not futuro.cancelled():
+                    self._despertar()
+                raise
+        self._en_vuelo += 1
+
+    def liberar(self, latencia: float, saturado: bool) -> None:
+        self._en_vuelo -= 1
+        self.control.registrar(latencia, saturado)
+        self._despertar()
+
+    def soltar(self) -> None:
+        """Libera el lugar sin registrar la petición (falló por algo que no dice nada de la carga)."""
+        self._en_vuelo -= 1
+        self._despertar()
+
+    def _despertar(self) -> None:
+        libres = self.control.en_vuelo_permitidas() - self._en_vuelo
+        while libres > 0 and self._esperando:
+            futuro = self._esperando.popleft()
+            if not futuro.done():
+                futuro.set_result(None)
+                libres -= 1
@@ -39,13 +39,13 @@ class ControladorCredenciales:
             raise ValueError("Debe ingresar el Consumer Secret.")
 
         try:
-            cliente = ClienteWooCommerce(
+            with ClienteWooCommerce(
                 override_cred={
                     "url": url,
                     "consumer_key": ck,
                     "consumer_secret": cs,
                 }
-            )
-            return cliente.probar_conexion()
+            ) as cliente:
+                return cliente.probar_conexion()
         except WooCommerceConexionError as e:
             raise WooCommerceConexionError(f"No se pudo conectar con WooCommerce: {e}")
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+from decimal import Decimal, InvalidOperation
+from typing import Iterable, List, Optional
+
+# Metas con el costo de compra, por prioridad (multi-tienda):
+#   1) _purchase_price (ATUM)
+#   2) _wc_cog_cost (Cost of Goods)
+#   3) purchase_price (legacy/custom)
+CLAVES_COSTO = ("_purchase_price", "_wc_cog_cost", "purchase_price")
+
+# Proyección _fields suficiente para resolver el costo.
+CAMPOS_COSTO = ("id", "meta_data")
+
+
+def _to_decimal(x) -> Decimal:
+    if x is None:
+        return Decimal("0")
+    s = str(x).strip()
+    if not s:
+        return Decimal("0")
+    s = s.replace(",", ".")
+    try:
+        return Decimal(s)
+    except InvalidOperation:
+        return Decimal("0")
+
+
+def obtener_meta(meta_data: List[dict], key: str) -> Optional[str]:
+    for m in meta_data or []:
+        if m.get("key") == key:
+            v = m.get("value")
+            return None if v is None else str(v)
+    return None
+
+
+def costo_compra(obj: dict) -> Decimal:
+    """Costo de compra de un producto o variación según CLAVES_COSTO; 0 si no tiene."""
+    meta = obj.get("meta_data", []) or []
+    for k in CLAVES_COSTO:
+        v = obtener_meta(meta, k)
+        if v is not None and _to_decimal(v) > 0:
+            return _to_decimal(v)
+    return Decimal("0")
+
+
+def resolver_costos(cliente, pares: Iterable[tuple[int, int]]) -> dict[tuple[int, int], Decimal]:
+    """
+    Costo de compra de cada (producto_id, variacion_id) (variacion_id 0 = sin variación), en bloque:
+    productos con include= y variaciones con include= por padre, a través de la caché del cliente.
+    Una variación sin costo propio usa el de su producto padre.
+    Los pares sin costo conocido (ni propio ni del padre, o borrados de la tienda) no aparecen.
+    """
+    pares = {(int(pid or 0), int(vid or 0)) for pid, vid in pares}
+
+    ids_por_producto: dict[int, list[int]] = {}
+    for pid, vid in pares:
+        if pid and vid:
+            ids_por_producto.setdefault(pid, []).append(vid)
+
+    productos = cliente.obtener_productos_por_ids({pid for pid, _vid in pares if pid}, campos=CAMPOS_COSTO)
+    variaciones = cliente.obtener_variaciones_por_ids(ids_por_producto, campos=CAMPOS_COSTO)
+
+    costos = {}
+    for pid, vid in pares:
+        costo = costo_compra(variaciones[vid]) if vid in variaciones else Decimal("0")
+        if costo <= 0 and pid in productos:
+            costo = costo_compra(productos[pid])
+        if costo > 0:
+            costos[(pid, vid)] = costo
+    return costos
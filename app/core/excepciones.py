@@ -12,3 +12,14 @@ class ConfiguracionError(PyWooError):
 class WooCommerceConexionError(PyWooError):
     """Errores de conexión con WooCommerce"""
     pass
+
+
+class OperacionCancelada(BaseException):
+    """
+    El usuario canceló la operación (ver TokenCancelacion).
+    Hereda de BaseException, como asyncio.CancelledError, para atravesar los `except Exception`
+    que convierten errores de red en WooCommerceConexionError o en errores por fila.
+    """
+
+    def __init__(self, mensaje: str = "__CANCELADO__"):
+        super().__init__(mensaje)
@@ -1,13 +1,26 @@
 from __future__ import annotations
 
-from PySide6.QtWidgets import QDialog
-from PySide6.QtCore import Qt
+from collections import deque
+
+from PySide6.QtWidgets import QDialog, QFileDialog, QMessageBox, QPushButton
+from PySide6.QtCore import Qt, QTimer
+from PySide6.QtGui import QTextCursor
 
 from app.core.ui.ui_proceso import Ui_ProcessDialog
 
+# Líneas que muestra el registro del diálogo; las anteriores se descartan.
+LINEAS_LOG = 500
+# Cada cuánto (ms) se vuelcan al registro los mensajes acumulados.
+INTERVALO_LOG_MS = 100
+
 
 class ProcessDialog(QDialog):
-    """Diálogo de progreso reutilizable para todo el sistema."""
+    """
+    Diálogo de progreso reutilizable para todo el sistema.
+    El registro guarda solo las últimas LINEAS_LOG líneas y, junto con el subtítulo, se redibuja por tandas
+    con un temporizador: cuesta lo mismo con 100 mensajes que con 100.000.
+    El registro completo va a un archivo solo si el usuario lo pide ("Guardar registro…").
+    """
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -23,14 +36,35 @@ class ProcessDialog(QDialog):
         self.ui.lblTitulo.setAlignment(Qt.AlignCenter)
         self.ui.lblSubtitulo.setAlignment(Qt.AlignCenter)
 
+        self._lineas: deque[str] = deque(maxlen=LINEAS_LOG)
+        self._pendientes = 0  # líneas de _lineas que todavía no están en textLog
+        self._total_lineas = 0
+        self._archivo = None
+
+        self.ui.textLog.document().setMaximumBlockCount(LINEAS_LOG)
+        self._timer_log = QTimer(self)
+        self._timer_log.setSingleShot(True)
+        self._timer_log.setInterval(INTERVALO_LOG_MS)
+        self._timer_log.timeout.connect(self._volcar_log)
+
+        self.btnGuardarLog = QPushButton("Guardar registro…", self)
+        self.ui.hboxLayout.insertWidget(1, self.btnGuardarLog)
+
         self.reset()
 
         self.ui.btnCancelar.clicked.connect(self.reject)
+        self.btnGuardarLog.clicked.connect(self._guardar_log)
 
     def closeEvent(self, event):
         self.reject()
         event.ignore()
 
+    def done(self, resultado: int):
+        self._timer_log.stop()
+        self._volcar_log()
+        self._cerrar_archivo()
+        super().done(resultado)
+
     def set_titulo(self, texto: str):
         self.ui.lblTitulo.setText(texto)
 
@@ -48,10 +82,78 @@ class ProcessDialog(QDialog):
         self.ui.progressBar.setValue(int(valor))
 
     def set_mensaje(self, texto: str):
-        self.ui.lblSubtitulo.setText(texto)
-        self.ui.textLog.append(texto)
+        self._lineas.append(texto)
+        self._pendientes = min(self._pendientes + 1, LINEAS_LOG)
+        self._total_lineas += 1
+        if self._archivo is not None:
+            self._escribir(texto)
+
+        if not self._timer_log.isActive():
+            self._timer_log.start()
 
     def reset(self):
         self.set_indeterminado(True)
+        self._timer_log.stop()
+        self._lineas.clear()
+        self._pendientes = 0
+        self._total_lineas = 0
         self.ui.textLog.clear()
         self.ui.lblSubtitulo.setText("")
+
+    # ----------------------------
+    # Registro
+    # ----------------------------
+    def _volcar_log(self):
+        """Pasa a textLog las líneas acumuladas desde el último volcado, en una sola edición."""
+        if not self._pendientes:
+            return
+        self.ui.lblSubtitulo.setText(self._lineas[-1])
+        log = self.ui.textLog
+        if self._pendientes >= len(self._lineas):
+            log.setPlainText("\n".join(self._lineas))
+        else:
+            nuevas = list(self._lineas)[-self._pendientes:]
+            cursor = QTextCursor(log.document())
+            cursor.movePosition(QTextCursor.End)
+            prefijo = "\n" if not log.document().isEmpty() else ""
+            cursor.insertText(prefijo + "\n".join(nuevas))
+        self._pendientes = 0
+
+        barra = log.verticalScrollBar()
+        barra.setValue(barra.maximum())
+
+    def _guardar_log(self):
+        if self._archivo is not None:
+            return
+        ruta, _ = QFileDialog.getSaveFileName(self, "Guardar registro", "registro.txt", "Texto (*.txt)")
+        if not ruta:
+            return
+        try:
+            self._archivo = open(ruta, "w", encoding="utf-8")
+            descartadas = self._total_lineas - len(self._lineas)
+            if descartadas:
+                self._escribir(f"… ({descartadas} líneas anteriores no se conservaron)")
+            for linea in self._lineas:
+                self._escribir(linea)
+        except OSError as e:
+            self._cerrar_archivo()
+            QMessageBox.warning(self, "Guardar registro", f"No se pudo guardar el registro:\n{e}")
+            return
+
+        # Desde aquí cada mensaje nuevo se escribe también en el archivo, hasta que se cierre el diálogo.
+        self.btnGuardarLog.setEnabled(False)
+        self.btnGuardarLog.setText("Guardando registro")
+
+    def _escribir(self, linea: str):
+        try:
+            self._archivo.write(linea + "\n")
+        except OSError:
+            self._cerrar_archivo()
+
+    def _cerrar_archivo(self):
+        if self._archivo is not None:
+            try:
+                self._archivo.close()
+            except OSError:
+                pass
+            self._archivo = None
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import time
+from typing import Callable, Optional
+
+# Actualizaciones de progreso por segundo que llegan, como mucho, a la interfaz.
+FPS_PROGRESO = 10
+
+
+def _fmt_duracion(segundos: float) -> str:
+    s = max(0, int(round(segundos)))
+    if s < 60:
+        return f"{s} s"
+    if s < 3600:
+        return f"{s // 60} min {s % 60:02d} s"
+    return f"{s // 3600} h {(s % 3600) // 60:02d} min"
+
+
+def _fmt_ritmo(por_segundo: float) -> str:
+    return f"{por_segundo:.1f}/s" if por_segundo < 10 else f"{por_segundo:.0f}/s"
+
+
+class AgregadorProgreso:
+    """
+    Entre el bucle de un controlador y su callback_progreso(valor, mensaje), que en los workers es
+    una señal Qt hacia la interfaz. Agrupa los avances por elemento: el callback recibe como mucho
+    `fps` actualizaciones por segundo, pero siempre el cambio de etapa y el último elemento.
+    El mensaje lleva el ritmo (elementos/s) y el tiempo restante estimado de la etapa.
+    terminar() al salir del bucle envía lo que quedó retenido, como etapa completa; volcar(), antes de
+    una espera larga dentro de la etapa, lo envía tal cual.
+
+        avance = AgregadorProgreso(callback_progreso)
+        for i, p in enumerate(productos, start=1):
+            ...
+            avance(i, total, "Procesando productos")
+        avance.terminar()
+    """
+
+    def __init__(self, callback: Optional[Callable[[int, str], None]], fps: float = FPS_PROGRESO,
+                 reloj: Callable[[], float] = time.monotonic):
+        self.callback = callback
+        self._intervalo = 1.0 / max(fps, 0.1)
+        self._reloj = reloj
+
+        self._etapa: str | None = None
+        self._inicio = 0.0
+        self._base = 0
+        self._ultimo = 0.0
+        self._hechos = 0
+        self._pendiente: tuple[int, int] | None = None  # (hechos, total) retenido por el límite de fps
+        self._completa = False  # ya se envió el final de la etapa
+
+    def __call__(self, hechos: int, total: int, etapa: str) -> None:
+        if self.callback is None:
+            return
+
+        ahora = self._reloj()
+        nueva_etapa = etapa != self._etapa
+        if nueva_etapa:
+            self._etapa = etapa
+            self._inicio = ahora
+            self._base = hechos
+
+        total = max(total, hechos, 1)
+        final = hechos >= total
+        self._hechos = hechos
+        self._completa = final
+        if not (nueva_etapa or final) and ahora - self._ultimo < self._intervalo:
+            self._pendiente = (hechos, total)
+            return
+
+        self._enviar(hechos, total, ahora)
+
+    def _enviar(self, hechos: int, total: int, ahora: float) -> None:
+        self._pendiente = None
+        self._ultimo = ahora
+        self.callback(int((hechos / total) * 100), self._mensaje(hechos, total, ahora))
+
+    def volcar(self) -> None:
+        """Envía el último avance si quedó retenido (antes de una espera sin avances, p. ej. de red)."""
+        if self.callback is not None and self._pendiente is not None:
+            self._enviar(*self._pendiente, self._reloj())
+
+    def terminar(self) -> None:
+        """
+        Fin de la etapa: si el último avance quedó retenido o no llegó al total (el total era una
+        estimación, p. ej. pedidos repetidos entre tramos), lo envía como 100 %.
+        """
+        if self.callback is None or self._etapa is None or self._completa:
+            return
+        self._completa = True
+        self._pendiente = None
+        self._ultimo = ahora = self._reloj()
+        self.callback(100, self._mensaje(self._hechos, self._hechos, ahora))
+
+    def _mensaje(self, hechos: int, total: int, ahora: float) -> str:
+        partes = [f"{self._etapa}: {hechos} de {total}"]
+        transcurrido = ahora - self._inicio
+        if transcurrido > 0 and hechos > self._base:
+            ritmo = (hechos - self._base) / transcurrido
+            partes.append(_fmt_ritmo(ritmo))
+            if hechos < total:
+                partes.append(f"quedan {_fmt_duracion((total - hechos) / ritmo)}")
+        return " · ".join(partes)
@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import threading
+import time
+
+from app.core.cancelacion import INTERVALO_CANCELACION, TokenCancelacion
+from app.core.catalogo_local import CatalogoLocal
+from app.core.cliente_woocommerce import ClienteWooCommerce
+from app.core.cliente_woocommerce_async import AsyncClienteWooCommerce
+
+# Antigüedad máxima (segundos) del catálogo antes de volver a sincronizarlo al generar un módulo.
+VIGENCIA = 10 * 60
+
+
+class ServicioCatalogo:
+    """
+    Catálogo compartido por los módulos (lo crea MenuPrincipalView y lo reciben los controladores).
+    Envuelve el espejo local y decide cuándo sincronizarlo:
+    - Vencida la `vigencia`: sincronización incremental (productos modificados y stock de lo vendido,
+      ver CatalogoLocal.sincronizar).
+    - "Actualizar catálogo" del menú (invalidar()): sincronización completa, que además recoge
+      borrados y variaciones nuevas.
+    Dentro de la vigencia no consulta la tienda: abrir Inventario y luego Lista de Distribuidores no descarga dos veces.
+
+    Si un módulo pide el catálogo mientras otro hilo lo está sincronizando (la precarga del menú),
+    se engancha a esa sincronización: recibe su progreso y espera a que termine, sin otra descarga.
+    """
+
+    def __init__(self, vigencia: float = VIGENCIA):
+        self.vigencia = vigencia
+        self._lock = threading.RLock()
+        self._cliente: ClienteWooCommerce | None = None
+        self._catalogo: CatalogoLocal | None = None
+        self.actualizado: float | None = None  # time.time() de la última sincronización
+        self._reinicio_pendiente = False
+        self._completa_pendiente = False
+
+        self._oyentes: list = []
+        self._oyentes_lock = threading.Lock()
+        self.progreso: tuple[int, str] | None = None  # último avance de la sincronización en curso
+
+    def _espejo(self, cancelacion: TokenCancelacion | None = None) -> CatalogoLocal:
+        # El cliente se crea al primer uso: antes puede no haber credenciales.
+        # Espera a una sincronización en curso, pero quien cancela deja de esperar.
+        self._adquirir(cancelacion)
+        try:
+            self._aplicar_reinicio()
+            if self._catalogo is None:
+                self._cliente = ClienteWooCommerce()
+                self._catalogo = CatalogoLocal(self._cliente, cliente_async=AsyncClienteWooCommerce())
+            return self._catalogo
+        finally:
+            self._lock.release()
+
+    def vigente(self) -> bool:
+        # invalidar() durante otra sincronización: esa deja `actualizado` al día, pero falta la completa.
+        return (
+            not self._completa_pendiente
+            and self.actualizado is not None
+            and time.time() - self.actualizado < self.vigencia
+        )
+
+    def sincronizando(self) -> bool:
+        return self.progreso is not None
+
+    def asegurar(self, callback_progreso=None, forzar: bool = False,
+                 cancelacion: TokenCancelacion | None = None) -> bool:
+        """
+        Sincroniza si el catálogo no está vigente (o si forzar). Devuelve True si sincronizó.
+        Cancelar a quien espera una sincronización ajena solo lo desengancha; cancelar a quien
+        la lanzó la interrumpe (el espejo queda como estaba).
+        """
+        self._suscribir(callback_progreso)
+        try:
+            self._adquirir(cancelacion)
+            try:
+                if not forzar and self.vigente():
+                    return False
+                espejo = self._espejo()
+                completa, self._completa_pendiente = self._completa_pendiente, False
+                self.progreso = (0, "Sincronizando catálogo")
+                try:
+                    with espejo.cliente.cancelable(cancelacion), espejo.cliente_async.cancelable(cancelacion):
+                        espejo.sincronizar(
+                            lambda pct, msg: self._notificar(callback_progreso, pct, msg), completa=completa
+                        )
+                except BaseException:
+                    # Cancelada o fallida: la próxima vuelve a intentar la completa pedida.
+                    self._completa_pendiente = self._completa_pendiente or completa
+                    raise
+                finally:
+                    self.progreso = None
+                # Si cambiaron las credenciales durante la descarga, lo bajado es de la tienda anterior.
+                if not self._reinicio_pendiente:
+                    self.actualizado = time.time()
+                return True
+            finally:
+                self._lock.release()
+        finally:
+            self._desuscribir(callback_progreso)
+
+    def _adquirir(self, cancelacion: TokenCancelacion | None) -> None:
+        if cancelacion is None:
+            self._lock.acquire()
+            return
+        while not self._lock.acquire(timeout=INTERVALO_CANCELACION):
+            cancelacion.verificar()
+
+    def _suscribir(self, callback) -> None:
+        if callback is None:
+            return
+        with self._oyentes_lock:
+            self._oyentes.append(callback)
+            progreso = self.progreso
+        if progreso is not None:
+            callback(*progreso)
+
+    def _desuscribir(self, callback) -> None:
+        with self._oyentes_lock:
+            if callback in self._oyentes:
+                self._oyentes.remove(callback)
+
+    def _notificar(self, propio, pct: int, mensaje: str) -> None:
+        """
+        Reparte el avance a todos los que esperan esta sincronización.
+        Un error en el callback de quien la lanzó la interrumpe (cancelación);
+        el de un módulo enganchado solo lo desengancha.
+        """
+        self.progreso = (pct, mensaje)
+        with self._oyentes_lock:
+            oyentes = list(self._oyentes)
+        for callback in oyentes:
+            if callback is propio:
+                callback(pct, mensaje)
+                continue
+            try:
+                callback(pct, mensaje)
+            except Exception:
+                self._desuscribir(callback)
+
+    def invalidar(self) -> None:
+        """Refresco pedido por el usuario: la próxima sincronización es completa, no incremental."""
+        self._completa_pendiente = True
+        self.actualizado = None
+
+    def reiniciar(self) -> None:
+        """
+        Tras cambiar las credenciales: el próximo uso abre el catálogo de la tienda nueva.
+        No espera a una sincronización en curso (se llama desde la interfaz): el cambio se aplica al terminar.
+        """
+        self._reinicio_pendiente = True
+        self.actualizado = None
+        if self._lock.acquire(blocking=False):
+            try:
+                self._aplicar_reinicio()
+            finally:
+                self._lock.release()
+
+    def _aplicar_reinicio(self) -> None:
+        if self._reinicio_pendiente:
+            self._reinicio_pendiente = False
+            self._cerrar_cliente()
+
+    def cerrar(self) -> None:
+        with self._lock:
+            self._cerrar_cliente()
+
+    def _cerrar_cliente(self) -> None:
+        if self._cliente is not None:
+            self._cliente.cerrar()
+        self._cliente = None
+        self._catalogo = None
+
+    # ----------------------------
+    # Lectura / escritura (ver CatalogoLocal)
+    # ----------------------------
+    def productos(self, filtro_stock: str | None = None, tipos=None,
+                  cancelacion: TokenCancelacion | None = None) -> list[dict]:
+        return self._espejo(cancelacion).productos(filtro_stock=filtro_stock, tipos=tipos)
+
+    def variaciones_por_producto(self, filtro_stock: str | None = None,
+                                 cancelacion: TokenCancelacion | None = None) -> dict[int, list[dict]]:
+        return self._espejo(cancelacion).variaciones_por_producto(filtro_stock=filtro_stock)
+
+    def registrar_cambios(self, productos=(), variaciones=(),
+                          cancelacion: TokenCancelacion | None = None) -> None:
+        """
+        Espera a una sincronización en curso antes de escribir, pero quien cancela deja de esperar.
+        Lo que no llegó al espejo ya está en la tienda: la próxima sincronización es completa.
+        """
+        try:
+            self._adquirir(cancelacion)
+        except BaseException:
+            self.invalidar()
+            raise
+        try:
+            self._espejo().registrar_cambios(productos, variaciones)
+        finally:
+            self._lock.release()
@@ -2,13 +2,24 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from decimal import Decimal, InvalidOperation
-from typing import Iterable, Sequence
+from typing import Callable, Iterable, Sequence
 import re
 from datetime import datetime
 
-from PySide6.QtCore import Qt, QSortFilterProxyModel, QRegularExpression, QModelIndex
+from PySide6.QtCore import (
+    Qt, QAbstractProxyModel, QModelIndex, QPersistentModelIndex, QRegularExpression, QSortFilterProxyModel, QTimer,
+)
 from PySide6.QtWidgets import QTableView, QHeaderView
 
+# Rol con la clave de orden tipada de cada celda (ver sort_key / SortKeyCache).
+SORT_ROLE = Qt.UserRole + 1
+
+# Espera (ms) desde la última tecla antes de filtrar.
+BUSQUEDA_ESPERA_MS = 150
+
+_FECHA = re.compile(r"^(\d{4}-\d{2}-\d{2})(?:\s+(\d{2}:\d{2})(?::(\d{2}))?)?")
+_NO_NUMERICO = re.compile(r"[^0-9.\-]")
+
 
 def _as_decimal(x) -> Decimal:
     """Convierte a Decimal.
@@ -20,17 +31,160 @@ def _as_decimal(x) -> Decimal:
         return Decimal("0")
     s = s.replace(",", ".")
     # Quita símbolos comunes (moneda / espacios)
-    s = re.sub(r"[^0-9.\-]", "", s)
+    s = _NO_NUMERICO.sub("", s)
     try:
         return Decimal(s)
     except (InvalidOperation, ValueError):
         return Decimal("0")
 
 
+def _parse_datetime(s: str):
+    """Intenta parsear fechas comunes (Woo: YYYY-MM-DD HH:MM)."""
+    m = _FECHA.match(s)
+    if not m:
+        return None
+
+    date_part = m.group(1)
+    time_part = m.group(2) or "00:00"
+    sec_part = m.group(3)
+    try:
+        if sec_part is None:
+            return datetime.strptime(f"{date_part} {time_part}", "%Y-%m-%d %H:%M")
+        return datetime.strptime(f"{date_part} {time_part}:{sec_part}", "%Y-%m-%d %H:%M:%S")
+    except Exception:
+        return None
+
+
+def sort_key(value) -> tuple:
+    """
+    Clave de orden tipada para el texto de una celda:
+    vacío < fecha (datetime) < número (Decimal) < texto (casefold).
+    """
+    s = str(value if value is not None else "").strip()
+    if not s:
+        return (0,)
+
+    dt = _parse_datetime(s)
+    if dt is not None:
+        return (1, dt)
+
+    if any(ch.isdigit() for ch in s):
+        return (2, _as_decimal(s))
+
+    return (3, s.casefold())
+
+
+class SortKeyCache:
+    """
+    Claves de orden (sort_key del texto que muestra cada celda) de un modelo, por columna:
+    se calculan para toda la columna la primera vez que se ordena por ella. También guarda el texto
+    de búsqueda de cada fila (search_texts), con el que filtra IndexedFilterProxy.
+    `texto(row, col)` es lo mismo que el DisplayRole, pero sin pasar por Qt. El modelo la guarda
+    en `claves_orden` y la expone en SORT_ROLE:
+
+        self.claves_orden = SortKeyCache(self, self._texto, self._reordenar)
+        ...
+        if role == SORT_ROLE:
+            return self.claves_orden.key(index.row(), index.column())
+
+    Con `reordenar` (recibe la permutación: fila nueva -> fila anterior), IndexedFilterProxy
+    ordena el modelo con sort() en vez de comparar celda a celda desde Qt, que con decenas de miles
+    de filas son cientos de miles de llamadas a data(). El orden es estable respecto del actual,
+    como al ordenar en QSortFilterProxyModel.
+    Si una fila cambia, el modelo llama invalidate_row(row) y lo suyo se recalcula al pedirlo.
+    """
+
+    def __init__(self, model, texto: Callable[[int, int], object],
+                 reordenar: Callable[[list[int]], None] | None = None):
+        self._model = model
+        self._texto = texto
+        self._reordenar = reordenar
+        self._cols: dict[int, list] = {}
+        self._busqueda: dict[tuple[int, ...], list] = {}
+        self._pos: list[int] | None = None  # posición original de cada fila actual
+
+    @property
+    def ordenable(self) -> bool:
+        return self._reordenar is not None
+
+    def key(self, row: int, col: int) -> tuple:
+        keys = self._cols.get(col)
+        if keys is None:
+            keys = self._column(col)
+        k = keys[row]
+        if k is None:
+            k = keys[row] = sort_key(self._texto(row, col))
+        return k
+
+    def _column(self, col: int) -> list:
+        """Claves de toda la columna, recalculando las invalidadas."""
+        keys = self._cols.get(col)
+        if keys is None:
+            keys = self._cols[col] = [sort_key(self._texto(r, col)) for r in range(self._model.rowCount())]
+        else:
+            for r, k in enumerate(keys):
+                if k is None:
+                    keys[r] = sort_key(self._texto(r, col))
+        return keys
+
+    def search_texts(self, cols: Sequence[int]) -> list[str]:
+        """Texto de búsqueda de cada fila: el de las columnas `cols`, en minúsculas (casefold) y unido."""
+        cols = tuple(cols)
+        textos = self._busqueda.get(cols)
+        if textos is None:
+            textos = self._busqueda[cols] = [self._texto_busqueda(r, cols) for r in range(self._model.rowCount())]
+        elif None in textos:
+            for r, t in enumerate(textos):
+                if t is None:
+                    textos[r] = self._texto_busqueda(r, cols)
+        return textos
+
+    def _texto_busqueda(self, row: int, cols: tuple[int, ...]) -> str:
+        # Sin \n en la búsqueda (se escribe en una línea), no hay coincidencias entre dos columnas.
+        return "\n".join(str(self._texto(row, c) or "").casefold() for c in cols)
+
+    def invalidate_row(self, row: int) -> None:
+        for keys in (*self._cols.values(), *self._busqueda.values()):
+            if 0 <= row < len(keys):
+                keys[row] = None
+
+    def sort(self, col: int, order: Qt.SortOrder = Qt.AscendingOrder) -> None:
+        """Reordena las filas del modelo por la columna (col < 0: orden original)."""
+        m = self._model
+        n = m.rowCount()
+        if self._reordenar is None or n == 0:
+            return
+
+        pos = self._pos if self._pos is not None else list(range(n))
+        if col >= 0:
+            perm = sorted(range(n), key=self._column(col).__getitem__, reverse=order == Qt.DescendingOrder)
+        else:
+            perm = sorted(range(n), key=pos.__getitem__)
+        if all(i == r for r, i in enumerate(perm)):
+            return
+
+        m.layoutAboutToBeChanged.emit()
+        self._reordenar(perm)
+        self._pos = [pos[i] for i in perm]
+        for c, keys in self._cols.items():
+            self._cols[c] = [keys[i] for i in perm]
+        for c, textos in self._busqueda.items():
+            self._busqueda[c] = [textos[i] for i in perm]
+
+        nueva = [0] * n
+        for r, i in enumerate(perm):
+            nueva[i] = r
+        antes = m.persistentIndexList()
+        m.changePersistentIndexList(antes, [m.index(nueva[i.row()], i.column()) for i in antes])
+        m.layoutChanged.emit()
+
+
 class MultiColumnSortFilterProxy(QSortFilterProxyModel):
     """Proxy con:
     - Filtro por múltiples columnas (ej. SKU + NOMBRE)
-    - Ordenamiento que intenta comparar números como números
+    - Ordenamiento tipado: compara las claves de SORT_ROLE del modelo (fechas, números, texto);
+      si el modelo no las expone, las calcula del DisplayRole en cada comparación.
+    Para modelos con `claves_orden` ordenable, TableEnhancer usa IndexedFilterProxy.
     """
 
     def __init__(self, search_columns: Sequence[int] = (0, 1), parent=None):
@@ -38,6 +192,7 @@ class MultiColumnSortFilterProxy(QSortFilterProxyModel):
         self._search_columns = tuple(search_columns)
         self.setFilterCaseSensitivity(Qt.CaseInsensitive)
         self.setDynamicSortFilter(True)
+        # lessThan lee SORT_ROLE; el rol de orden solo decide qué dataChanged reordenan.
         self.setSortRole(Qt.DisplayRole)
 
     def set_search_columns(self, cols: Sequence[int]) -> None:
@@ -60,62 +215,200 @@ class MultiColumnSortFilterProxy(QSortFilterProxyModel):
                 return True
         return False
 
-    def _try_parse_datetime(self, s: str):
-        """Intenta parsear fechas comunes (Woo: YYYY-MM-DD HH:MM)."""
-        s = (s or "").strip()
-        if not s:
-            return None
+    def lessThan(self, left: QModelIndex, right: QModelIndex) -> bool:
+        l = left.data(SORT_ROLE)
+        r = right.data(SORT_ROLE)
+        if l is None or r is None:
+            l = sort_key(left.data(Qt.DisplayRole))
+            r = sort_key(right.data(Qt.DisplayRole))
+        return l < r
 
-        m = re.match(r"^(\d{4}-\d{2}-\d{2})(?:\s+(\d{2}:\d{2})(?::(\d{2}))?)?", s)
-        if not m:
-            return None
 
-        date_part = m.group(1)
-        time_part = m.group(2) or "00:00"
-        sec_part = m.group(3)
-        fmt = "%Y-%m-%d %H:%M" if sec_part is None else "%Y-%m-%d %H:%M:%S"
-        try:
-            if sec_part is None:
-                return datetime.strptime(f"{date_part} {time_part}", "%Y-%m-%d %H:%M")
-            return datetime.strptime(f"{date_part} {time_part}:{sec_part}", "%Y-%m-%d %H:%M:%S")
-        except Exception:
-            return None
+def _indexable(model) -> bool:
+    claves = getattr(model, "claves_orden", None)
+    return isinstance(claves, SortKeyCache) and claves.ordenable
 
-    def lessThan(self, left: QModelIndex, right: QModelIndex) -> bool:
-        l = left.data(Qt.DisplayRole)
-        r = right.data(Qt.DisplayRole)
 
-        ls = str(l or "").strip()
-        rs = str(r or "").strip()
+class IndexedFilterProxy(QAbstractProxyModel):
+    """
+    Proxy de búsqueda y orden para modelos con `claves_orden` ordenable (ver SortKeyCache).
+    Las filas visibles son una lista de filas del modelo: filtrar es buscar la subcadena en los textos
+    de búsqueda que cachea el modelo (en Python, sin llamar a data() por fila) y hacer un reset,
+    tras el cual Qt solo pregunta por las filas que se ven. Si la búsqueda nueva contiene a la anterior
+    (se siguió escribiendo), solo se revisan las filas que ya coincidían.
+    sort() lo hace el modelo; el proxy mantiene el filtro y la selección al cambiar el orden.
+    """
+
+    def __init__(self, search_columns: Sequence[int] = (0, 1), parent=None):
+        super().__init__(parent)
+        self._search_columns = tuple(search_columns)
+        self._busqueda = ""                     # búsqueda aplicada (casefold)
+        self._filas: list[int] | None = None    # fila del modelo de cada fila visible (None: todas)
+        self._posiciones: list[int] | None = None  # inversa de _filas (-1: oculta), al pedirla
+        self._persistentes: list = []
+        self._conexiones: list = []
+
+    # ----------------------------
+    # Modelo de origen
+    # ----------------------------
+    def setSourceModel(self, model) -> None:
+        for senal, slot in self._conexiones:
+            senal.disconnect(slot)
+        self._conexiones = []
+
+        self.beginResetModel()
+        super().setSourceModel(model)
+        self._busqueda = ""
+        self._filas = None
+        self._posiciones = None
+        if model is not None:
+            for senal, slot in (
+                (model.dataChanged, self._datos_cambiados),
+                (model.headerDataChanged, self.headerDataChanged),
+                (model.layoutAboutToBeChanged, self._antes_de_ordenar),
+                (model.layoutChanged, self._despues_de_ordenar),
+                (model.modelAboutToBeReset, self.beginResetModel),
+                (model.modelReset, self._modelo_reiniciado),
+            ):
+                senal.connect(slot)
+                self._conexiones.append((senal, slot))
+            # El índice se arma al asignar el modelo: la primera tecla ya no lo paga.
+            model.claves_orden.search_texts(self._search_columns)
+        self.endResetModel()
+
+    def _datos_cambiados(self, desde: QModelIndex, hasta: QModelIndex, roles=()) -> None:
+        for fila in range(desde.row(), hasta.row() + 1):
+            a = self.mapFromSource(desde.siblingAtRow(fila))
+            if a.isValid():
+                self.dataChanged.emit(a, a.siblingAtColumn(hasta.column()), roles)
+
+    def _antes_de_ordenar(self, *args) -> None:
+        self.layoutAboutToBeChanged.emit()
+        self._persistentes = [
+            (p, QPersistentModelIndex(self.mapToSource(p))) for p in self.persistentIndexList()
+        ]
+
+    def _despues_de_ordenar(self, *args) -> None:
+        if self._filas is not None:
+            self._filas = self._filtrar(range(self.sourceModel().rowCount()))
+            self._posiciones = None
+        antes = [p for p, _ in self._persistentes]
+        despues = [self.mapFromSource(QModelIndex(s)) for _, s in self._persistentes]
+        self._persistentes = []
+        self.changePersistentIndexList(antes, despues)
+        self.layoutChanged.emit()
+
+    def _modelo_reiniciado(self) -> None:
+        self._busqueda = ""
+        self._filas = None
+        self._posiciones = None
+        self.endResetModel()
+
+    # ----------------------------
+    # Búsqueda / orden
+    # ----------------------------
+    def set_search_text(self, text: str) -> None:
+        busqueda = (text or "").strip().casefold()
+        model = self.sourceModel()
+        if busqueda == self._busqueda or model is None:
+            return
+
+        if not busqueda:
+            filas = None
+        elif self._busqueda and self._busqueda in busqueda and self._filas is not None:
+            filas = self._filtrar(self._filas, busqueda)
+        else:
+            filas = self._filtrar(range(model.rowCount()), busqueda)
+
+        self.beginResetModel()
+        self._busqueda = busqueda
+        self._filas = filas
+        self._posiciones = None
+        self.endResetModel()
+
+    def _filtrar(self, candidatas, busqueda: str | None = None) -> list[int]:
+        busqueda = self._busqueda if busqueda is None else busqueda
+        textos = self.sourceModel().claves_orden.search_texts(self._search_columns)
+        return [r for r in candidatas if busqueda in textos[r]]
+
+    def sort(self, column: int, order: Qt.SortOrder = Qt.AscendingOrder) -> None:
+        model = self.sourceModel()
+        if model is not None:
+            model.claves_orden.sort(column, order)
+
+    # ----------------------------
+    # QAbstractProxyModel
+    # ----------------------------
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        model = self.sourceModel()
+        if model is None or parent.isValid():
+            return 0
+        return model.rowCount() if self._filas is None else len(self._filas)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        model = self.sourceModel()
+        if model is None or parent.isValid():
+            return 0
+        return model.columnCount()
 
-        # 1) Fechas primero
-        ldtt = self._try_parse_datetime(ls)
-        rdtt = self._try_parse_datetime(rs)
-        if ldtt is not None and rdtt is not None:
-            return ldtt < rdtt
+    def index(self, row: int, column: int, parent: QModelIndex = QModelIndex()) -> QModelIndex:
+        if parent.isValid() or not (0 <= row < self.rowCount() and 0 <= column < self.columnCount()):
+            return QModelIndex()
+        return self.createIndex(row, column)
 
-        # 2) Numérico
-        try:
-            if ls and rs:
-                if any(ch.isdigit() for ch in ls) and any(ch.isdigit() for ch in rs):
-                    ld = _as_decimal(ls)
-                    rd = _as_decimal(rs)
-                    return ld < rd
-        except Exception:
-            pass
+    def parent(self, index: QModelIndex | None = None):
+        if index is None:
+            return super().parent()  # QObject.parent()
+        return QModelIndex()
 
-        # 3) Texto
-        return ls.casefold() < rs.casefold()
+    def mapToSource(self, proxy_index: QModelIndex) -> QModelIndex:
+        model = self.sourceModel()
+        if model is None or not proxy_index.isValid():
+            return QModelIndex()
+        row = proxy_index.row()
+        if self._filas is not None:
+            row = self._filas[row]
+        return model.index(row, proxy_index.column())
+
+    def mapFromSource(self, source_index: QModelIndex) -> QModelIndex:
+        if not source_index.isValid():
+            return QModelIndex()
+        row = source_index.row()
+        if self._filas is not None:
+            if self._posiciones is None:
+                self._posiciones = [-1] * self.sourceModel().rowCount()
+                for i, r in enumerate(self._filas):
+                    self._posiciones[r] = i
+            row = self._posiciones[row]
+            if row < 0:
+                return QModelIndex()
+        return self.createIndex(row, source_index.column())
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
+        # Directo al modelo: evita que Qt pase por mapToSource y data() como dos llamadas a Python.
+        model = self.sourceModel()
+        if model is None or not index.isValid():
+            return None
+        return model.data(self.mapToSource(index), role)
 
 
 @dataclass
 class EnhancedTable:
     table: QTableView
     proxy: MultiColumnSortFilterProxy
+    indexed: IndexedFilterProxy
+
+    def active_proxy(self):
+        """El proxy que usa la tabla con su modelo actual."""
+        return self.indexed if self.table.model() is self.indexed else self.proxy
 
 
 class TableEnhancer:
-    """Aplica sorting por encabezados + búsqueda con resaltado (selección azul)."""
+    """
+    Aplica sorting por encabezados + búsqueda con resaltado (selección azul).
+    La búsqueda espera BUSQUEDA_ESPERA_MS desde la última tecla; con modelos indexables
+    (ver IndexedFilterProxy) filtra sin recorrer el modelo desde Qt.
+    """
 
     def __init__(
         self,
@@ -125,7 +418,8 @@ class TableEnhancer:
         self._items: list[EnhancedTable] = []
         for t in tables:
             proxy = MultiColumnSortFilterProxy(search_columns=search_columns, parent=t)
-            self._items.append(EnhancedTable(table=t, proxy=proxy))
+            indexed = IndexedFilterProxy(search_columns=search_columns, parent=t)
+            self._items.append(EnhancedTable(table=t, proxy=proxy, indexed=indexed))
 
             t.setSortingEnabled(True)
             t.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
@@ -142,11 +436,24 @@ class TableEnhancer:
                 " }"
             )
 
+        self._pendiente: tuple[QTableView, str] | None = None
+        self._timer_busqueda = QTimer()
+        self._timer_busqueda.setSingleShot(True)
+        self._timer_busqueda.setInterval(BUSQUEDA_ESPERA_MS)
+        self._timer_busqueda.timeout.connect(self._buscar_pendiente)
+
     def set_models(self, models: Sequence) -> None:
         """Asigna modelos en el mismo orden en que se pasaron las tablas."""
+        self._cancelar_pendiente()
         for it, m in zip(self._items, models):
-            it.proxy.setSourceModel(m)
-            it.table.setModel(it.proxy)
+            if _indexable(m):
+                it.proxy.setSourceModel(None)
+                it.indexed.setSourceModel(m)
+                it.table.setModel(it.indexed)
+            else:
+                it.indexed.setSourceModel(None)
+                it.proxy.setSourceModel(m)
+                it.table.setModel(it.proxy)
 
             it.table.setSortingEnabled(True)
             hdr = it.table.horizontalHeader()
@@ -158,27 +465,51 @@ class TableEnhancer:
             it.table.sortByColumn(col, order)
 
     def clear(self) -> None:
+        self._cancelar_pendiente()
         for it in self._items:
             it.table.setModel(None)
             it.proxy.setSourceModel(None)
+            it.indexed.setSourceModel(None)
 
     def apply_search(self, table: QTableView, text: str) -> None:
+        """Programa la búsqueda; vaciar el cuadro se aplica al instante."""
+        if not (text or "").strip():
+            self._cancelar_pendiente()
+            self._buscar(table, "")
+            return
+        self._pendiente = (table, text)
+        self._timer_busqueda.start()
+
+    def _cancelar_pendiente(self) -> None:
+        self._timer_busqueda.stop()
+        self._pendiente = None
+
+    def _buscar_pendiente(self) -> None:
+        if self._pendiente is not None:
+            table, text = self._pendiente
+            self._pendiente = None
+            self._buscar(table, text)
+
+    def _buscar(self, table: QTableView, text: str) -> None:
         text = (text or "").strip()
         for it in self._items:
             if it.table is table:
+                proxy = it.active_proxy()
+
+                if proxy is it.indexed:
+                    proxy.set_search_text(text)
+                elif not text:
+                    proxy.setFilterRegularExpression(QRegularExpression(""))
+                else:
+                    pattern = re.escape(text)
+                    rx = QRegularExpression(pattern, QRegularExpression.CaseInsensitiveOption)
+                    proxy.setFilterRegularExpression(rx)
 
                 if not text:
-                    it.proxy.setFilterRegularExpression(QRegularExpression(""))
                     it.table.clearSelection()
-                    return
-
-                pattern = re.escape(text)
-                rx = QRegularExpression(pattern, QRegularExpression.CaseInsensitiveOption)
-                it.proxy.setFilterRegularExpression(rx)
-
-                if it.proxy.rowCount() > 0:
+                elif proxy.rowCount() > 0:
                     it.table.selectRow(0)
-                    it.table.scrollTo(it.proxy.index(0, 0))
+                    it.table.scrollTo(proxy.index(0, 0))
                 else:
                     it.table.clearSelection()
                 return
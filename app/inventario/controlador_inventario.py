@@ -7,8 +7,11 @@ from PySide6.QtCore import QAbstractTableModel, Qt
 from PySide6.QtGui import QFont
 import xlsxwriter
 
-from app.core.cliente_woocommerce import ClienteWooCommerce
+from app.core.cancelacion import TokenCancelacion
+from app.core.progreso import AgregadorProgreso
+from app.core.servicio_catalogo import ServicioCatalogo
 from app.core.column_utils import prune_empty_columns
+from app.core.table_enhancer import SORT_ROLE, SortKeyCache
 
 HEADERS = ["SKU", "NOMBRE", "CATEGORÍA", "STOCK", "PRECIO", "ESTADO"]
 COLUMN_KEYS = ["sku", "nombre", "categoria", "stock", "precio", "estado"]
@@ -128,6 +131,10 @@ class ModeloTablaInventario(QAbstractTableModel):
         self._filtro = filtro
         self._headers = headers
         self._keys = keys
+        self.claves_orden = SortKeyCache(self, self._texto, self._reordenar)
+
+    def _reordenar(self, perm: list[int]) -> None:
+        self._datos[:] = [self._datos[i] for i in perm]
 
     def rowCount(self, parent=None):
         return len(self._datos)
@@ -135,28 +142,34 @@ class ModeloTablaInventario(QAbstractTableModel):
     def columnCount(self, parent=None):
         return len(self._keys)
 
+    def _texto(self, row: int, col: int) -> str:
+        fila = self._datos[row]
+        clave = self._keys[col]
+        val = fila.get(clave, "")
+
+        if clave == "precio":
+            return _fmt_precio(val)
+
+        if clave == "stock":
+            return str(_stock_no_negativo(_to_int(val)))
+
+        if clave == "estado":
+            stock = _stock_no_negativo(_to_int(fila.get("stock")))
+            manage_stock = bool(fila.get("__manage_stock__", False))
+            stock_status = _safe_str(fila.get("__stock_status__", "")).lower().strip()
+            return _estado_texto(stock, self._filtro, manage_stock, stock_status)
+
+        return _safe_str(val)
+
     def data(self, index, role=Qt.DisplayRole):
         if not index.isValid():
             return None
 
-        fila = self._datos[index.row()]
-        clave = self._keys[index.column()]
-        val = fila.get(clave, "")
-
         if role == Qt.DisplayRole:
-            if clave == "precio":
-                return _fmt_precio(val)
-
-            if clave == "stock":
-                return str(_stock_no_negativo(_to_int(val)))
+            return self._texto(index.row(), index.column())
 
-            if clave == "estado":
-                stock = _stock_no_negativo(_to_int(fila.get("stock")))
-                manage_stock = bool(fila.get("__manage_stock__", False))
-                stock_status = _safe_str(fila.get("__stock_status__", "")).lower().strip()
-                return _estado_texto(stock, self._filtro, manage_stock, stock_status)
-
-            return _safe_str(val)
+        if role == SORT_ROLE:
+            return self.claves_orden.key(index.row(), index.column())
 
         if role == Qt.TextAlignmentRole:
             return Qt.AlignCenter
@@ -177,14 +190,21 @@ class ModeloTablaInventario(QAbstractTableModel):
 
 
 class ControladorInventario:
-    def __init__(self):
-        self.cliente = ClienteWooCommerce()
+    def __init__(self, catalogo: ServicioCatalogo | None = None):
+        # Catálogo compartido del menú; sin él (uso aislado), uno propio.
+        self._catalogo_propio = catalogo is None
+        self.catalogo = catalogo or ServicioCatalogo()
         self._simples: list[dict] = []
         self._variados: list[dict] = []
         self._ultimo_filtro: str = "todos"
         self._headers = list(HEADERS)
         self._keys = list(COLUMN_KEYS)
 
+    def cerrar(self) -> None:
+        """Libera las conexiones HTTP del catálogo propio (el compartido lo cierra el menú)."""
+        if self._catalogo_propio:
+            self.catalogo.cerrar()
+
     @property
     def simples(self):
         return self._simples
@@ -206,16 +226,23 @@ class ControladorInventario:
             return f"{base} ({' | '.join(parts)})"
         return base or "Variación"
 
-    def generar_inventario(self, filtro: str, callback_progreso=None):
+    def generar_inventario(self, filtro: str, callback_progreso=None, cancelacion: TokenCancelacion | None = None):
         self._ultimo_filtro = filtro
 
-        productos = self.cliente.obtener_productos(per_page=100, filtro_stock=None)
+        self.catalogo.asegurar(callback_progreso, cancelacion=cancelacion)
+        # El filtro se resuelve en la consulta al catálogo; _pasa_filtro queda como comprobación final.
+        productos = self.catalogo.productos(filtro_stock=filtro, cancelacion=cancelacion)
+        variaciones_por_producto = self.catalogo.variaciones_por_producto(filtro_stock=filtro, cancelacion=cancelacion)
         total = max(len(productos), 1)
+        avance = AgregadorProgreso(callback_progreso)
 
         self._simples.clear()
         self._variados.clear()
 
         for i, p in enumerate(productos, start=1):
+            if cancelacion:
+                cancelacion.verificar()
+
             tipo = (p.get("type") or "").strip().lower()
             categorias = _join_categorias(p)
 
@@ -224,7 +251,7 @@ class ControladorInventario:
                 if not producto_id:
                     continue
 
-                variaciones = self.cliente.obtener_variaciones_producto(int(producto_id), per_page=100)
+                variaciones = variaciones_por_producto.get(int(producto_id), [])
 
                 for v in variaciones:
                     manage = _bool_manage_stock(v)
@@ -273,8 +300,8 @@ class ControladorInventario:
                 }
                 self._simples.append(fila)
 
-            if callback_progreso:
-                callback_progreso(int((i / total) * 100), f"Procesando producto {i} de {total}")
+            avance(i, total, "Procesando productos")
+        avance.terminar()
 
         optional = {"categoria", "estado"}
         combinadas = list(self._simples) + list(self._variados)
@@ -289,7 +316,7 @@ class ControladorInventario:
         if filtro is None:
             filtro = self._ultimo_filtro
 
-        workbook = xlsxwriter.Workbook(ruta)
+        workbook = xlsxwriter.Workbook(ruta, {"constant_memory": True})
 
         header_fmt = workbook.add_format(
             {"bold": True, "align": "center", "valign": "vcenter", "border": 1, "bg_color": "#D9E1F2"}
@@ -306,12 +333,12 @@ class ControladorInventario:
         for nombre, datos in (("Productos Simples", datos_simples), ("Productos Variados", datos_variados)):
             ws = workbook.add_worksheet(nombre[:31])
 
-            for col, h in enumerate(self._headers):
-                ws.write(0, col, h, header_fmt)
-
             for col, key in enumerate(self._keys):
                 ws.set_column(col, col, col_widths.get(key, 18))
 
+            for col, h in enumerate(self._headers):
+                ws.write(0, col, h, header_fmt)
+
             last_row = 0
             for row, fila in enumerate(datos, start=1):
                 last_row = row
@@ -2,13 +2,13 @@ from __future__ import annotations
 
 from PySide6.QtCore import QThread, QDate, Qt
 from PySide6.QtWidgets import QFileDialog, QHeaderView, QHBoxLayout, QLabel, QLineEdit, QPushButton
-from shiboken6 import isValid
 
 from app.inventario.ui.ui_view_inventario import Ui_Inventario
 from app.inventario.controlador_inventario import ControladorInventario
 from app.inventario.worker_inventario import WorkerInventario
 
-from app.core.base_windows import BaseModuleWindow
+from app.core.base_windows import BaseModuleWindow, soltar_hilo
+from app.core.cancelacion import TokenCancelacion
 from app.core.proceso import ProcessDialog
 from app.core.dialogos import mostrar_error, mostrar_info
 from app.core.table_enhancer import TableEnhancer
@@ -32,10 +32,11 @@ class InventarioView(BaseModuleWindow):
         except Exception:
             pass
 
-        self.controlador = ControladorInventario()
+        self.controlador = ControladorInventario(self.catalogo_compartido())
 
         self.thread: QThread | None = None
         self.worker = None
+        self.cancelacion: TokenCancelacion | None = None
         self.dialogo: ProcessDialog | None = None
 
         self._generado = False
@@ -128,6 +129,7 @@ class InventarioView(BaseModuleWindow):
 
     def closeEvent(self, event):
         self._detener_hilo()
+        self.controlador.cerrar()
         try:
             if self.menu_controller:
                 self.menu_controller.show()
@@ -137,15 +139,26 @@ class InventarioView(BaseModuleWindow):
 
 
     def _detener_hilo(self):
-        if self.thread and isValid(self.thread):
-            try:
-                if self.thread.isRunning():
-                    self.thread.quit()
-                    self.thread.wait()
-            except RuntimeError:
-                pass
+        soltar_hilo(self.thread, self.worker, self.cancelacion)
         self.thread = None
         self.worker = None
+        self.cancelacion = None
+
+    def _cerrar_dialogo(self):
+        # Se suelta antes de cerrarlo: su closeEvent emite rejected, que aquí significa "cancelar".
+        dialogo, self.dialogo = self.dialogo, None
+        if dialogo:
+            dialogo.close()
+
+    def _cancelar(self):
+        if self.dialogo is None:
+            return
+        self._cerrar_dialogo()
+        self._detener_hilo()
+        self._ocupado = False
+        self.ui.progressBar.setValue(0)
+        self.ui.lblProcesando.setText("")
+        self.ui.labelEstado.setText("Generación cancelada")
 
 
     def _generar(self):
@@ -163,10 +176,12 @@ class InventarioView(BaseModuleWindow):
         self.dialogo.set_titulo("Generando Inventario")
         self.dialogo.reset()
         self.dialogo.set_mensaje("Procesando inventario...")
+        self.dialogo.rejected.connect(self._cancelar)
         self.dialogo.show()
 
+        self.cancelacion = TokenCancelacion()
         self.thread = QThread(self)
-        self.worker = WorkerInventario(self.controlador, filtro)
+        self.worker = WorkerInventario(self.controlador, filtro, self.cancelacion)
         self.worker.moveToThread(self.thread)
 
         self.thread.started.connect(self.worker.ejecutar)
@@ -191,8 +206,7 @@ class InventarioView(BaseModuleWindow):
 
     def _finalizar(self, modelo_simples, modelo_variados):
         if self.dialogo:
-            self.dialogo.close()
-            self.dialogo = None
+            self._cerrar_dialogo()
 
         self._enhancer.set_models((modelo_simples, modelo_variados))
 
@@ -213,10 +227,10 @@ class InventarioView(BaseModuleWindow):
         mostrar_info("Inventario generado correctamente.", self)
 
     def _error(self, mensaje):
-        if self.dialogo:
-            self.dialogo.close()
-            self.dialogo = None
+        self._cerrar_dialogo()
         self._ocupado = False
+        if mensaje == "__CANCELADO__":
+            return
         mostrar_error(mensaje, self)
 
 
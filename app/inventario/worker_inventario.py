@@ -1,23 +1,29 @@
 from PySide6.QtCore import QObject, Signal
 
+from app.core.excepciones import OperacionCancelada
+
 
 class WorkerInventario(QObject):
     progreso = Signal(int, str)
     terminado = Signal(object, object)
     error = Signal(str)
 
-    def __init__(self, controlador, filtro):
+    def __init__(self, controlador, filtro, cancelacion=None):
         super().__init__()
         self.controlador = controlador
         self.filtro = filtro
+        self.cancelacion = cancelacion
 
     def ejecutar(self):
         try:
             modelo_simples, modelo_variados = self.controlador.generar_inventario(
                 filtro=self.filtro,
-                callback_progreso=self._emitir_progreso
+                callback_progreso=self._emitir_progreso,
+                cancelacion=self.cancelacion,
             )
             self.terminado.emit(modelo_simples, modelo_variados)
+        except OperacionCancelada:
+            self.error.emit("__CANCELADO__")
         except Exception as e:
             self.error.emit(str(e))
 
@@ -7,7 +7,10 @@ from PySide6.QtCore import QAbstractTableModel, QModelIndex, Qt
 from PySide6.QtGui import QFont, QBrush, QColor
 import xlsxwriter
 
-from app.core.cliente_woocommerce import ClienteWooCommerce
+from app.core.cancelacion import TokenCancelacion
+from app.core.progreso import AgregadorProgreso
+from app.core.servicio_catalogo import ServicioCatalogo
+from app.core.table_enhancer import SORT_ROLE, SortKeyCache
 
 
 HEADERS_INTERNAL = [
@@ -126,6 +129,10 @@ class ModeloTablaDistribuidores(QAbstractTableModel):
 
         self._font_url = QFont()
         self._font_url.setUnderline(True)
+        self.claves_orden = SortKeyCache(self, self._texto, self._reordenar)
+
+    def _reordenar(self, perm: List[int]) -> None:
+        self._datos[:] = [self._datos[i] for i in perm]
 
     def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
         return len(self._datos)
@@ -133,6 +140,13 @@ class ModeloTablaDistribuidores(QAbstractTableModel):
     def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
         return len(HEADERS_INTERNAL)
 
+    def _texto(self, row: int, col: int) -> str:
+        fila = self._datos[row] if row < len(self._datos) else []
+        valor = fila[col] if col < len(fila) else ""
+        if col == COL_GANANCIA:
+            return _fmt_2_dec_trim(valor)
+        return _safe_str(valor)
+
     def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
         if not index.isValid():
             return None
@@ -149,9 +163,10 @@ class ModeloTablaDistribuidores(QAbstractTableModel):
             return Qt.AlignCenter
 
         if role == Qt.DisplayRole:
-            if col == COL_GANANCIA:
-                return _fmt_2_dec_trim(valor)
-            return _safe_str(valor)
+            return self._texto(row, col)
+
+        if role == SORT_ROLE:
+            return self.claves_orden.key(row, col)
 
         if col == COL_URL:
             if role == Qt.ForegroundRole:
@@ -177,11 +192,18 @@ class ModeloTablaDistribuidores(QAbstractTableModel):
 
 
 class ControladorListaDistribuidores:
-    def __init__(self):
-        self.cliente = ClienteWooCommerce()
+    def __init__(self, catalogo: ServicioCatalogo | None = None):
+        # Catálogo compartido del menú; sin él (uso aislado), uno propio.
+        self._catalogo_propio = catalogo is None
+        self.catalogo = catalogo or ServicioCatalogo()
         self.simples: List[List[Any]] = []
         self.variados: List[List[Any]] = []
 
+    def cerrar(self) -> None:
+        """Libera las conexiones HTTP del catálogo propio (el compartido lo cierra el menú)."""
+        if self._catalogo_propio:
+            self.catalogo.cerrar()
+
     def _por_descuento(self, ganancia: float) -> float:
         if ganancia <= 0.1:
             return 0.0
@@ -194,23 +216,36 @@ class ControladorListaDistribuidores:
             return "COMPRA MÍNIMA 2 UNIDADES"
         return ""
 
-    def generar_lista(self, callback_progreso=None) -> Tuple[ModeloTablaDistribuidores, ModeloTablaDistribuidores]:
-        productos = self.cliente.obtener_productos(per_page=100)
+    def generar_lista(
+        self, callback_progreso=None, cancelacion: TokenCancelacion | None = None
+    ) -> Tuple[ModeloTablaDistribuidores, ModeloTablaDistribuidores]:
+        self.catalogo.asegurar(callback_progreso, cancelacion=cancelacion)
+        # Solo lo que tiene unidades: los padres sin ninguna variación con stock ni se leen.
+        productos = self.catalogo.productos(
+            filtro_stock="con_unidades", tipos=("simple", "variable"), cancelacion=cancelacion
+        )
+        variaciones_por_producto = self.catalogo.variaciones_por_producto(
+            filtro_stock="con_unidades", cancelacion=cancelacion
+        )
         total = max(len(productos), 1)
+        avance = AgregadorProgreso(callback_progreso)
 
         self.simples.clear()
         self.variados.clear()
 
         for i, p in enumerate(productos, start=1):
+            if cancelacion:
+                cancelacion.verificar()
+
             tipo = (p.get("type") or "").strip().lower()
 
             if tipo == "simple":
                 self._procesar_simple(p)
-            elif tipo == "variable":
-                self._procesar_variaciones(p)
+            elif tipo == "variable" and p.get("id"):
+                self._procesar_variaciones(p, variaciones_por_producto.get(int(p["id"]), []))
 
-            if callback_progreso:
-                callback_progreso(int((i / total) * 100), f"Procesando producto {i} de {total}")
+            avance(i, total, "Procesando productos")
+        avance.terminar()
 
         return (ModeloTablaDistribuidores(self.simples), ModeloTablaDistribuidores(self.variados))
 
@@ -259,16 +294,7 @@ class ControladorListaDistribuidores:
             url,
         ])
 
-    def _procesar_variaciones(self, producto: dict):
-        producto_id = producto.get("id")
-        if not producto_id:
-            return
-
-        try:
-            variaciones = self.cliente.obtener_variaciones_producto(int(producto_id), per_page=100)
-        except Exception:
-            return
-
+    def _procesar_variaciones(self, producto: dict, variaciones: List[dict]):
         for v in variaciones:
             stock = _to_int(v.get("stock_quantity"))
             if stock <= 0:
@@ -326,7 +352,7 @@ class ControladorListaDistribuidores:
         SKU | NOMBRE | VARIACIÓN | STOCK | PVP | PVD | OBSERVACIÓN | URL
         (en 2 hojas: Simples / Variados)
         """
-        wb = xlsxwriter.Workbook(ruta)
+        wb = xlsxwriter.Workbook(ruta, {"constant_memory": True})
 
         header = wb.add_format({
             "bold": True, "align": "center", "valign": "vcenter",
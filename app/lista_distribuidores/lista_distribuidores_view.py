@@ -1,13 +1,13 @@
 from PySide6.QtCore import QThread, QDate, QEvent, Qt, QUrl
 from PySide6.QtWidgets import QFileDialog, QHeaderView, QHBoxLayout, QLabel, QLineEdit, QPushButton
 from PySide6.QtGui import QDesktopServices, QCursor
-from shiboken6 import isValid
 
 from app.lista_distribuidores.ui.ui_view_lista_distribuidores import Ui_ListaDistribuidores
 from app.lista_distribuidores.controlador_lista_distribuidores import ControladorListaDistribuidores
 from app.lista_distribuidores.worker_lista_distribuidores import WorkerListaDistribuidores
 
-from app.core.base_windows import BaseModuleWindow
+from app.core.base_windows import BaseModuleWindow, soltar_hilo
+from app.core.cancelacion import TokenCancelacion
 from app.core.proceso import ProcessDialog
 from app.core.dialogos import mostrar_error, mostrar_info
 from app.core.table_enhancer import TableEnhancer
@@ -30,10 +30,11 @@ class ListaDistribuidoresView(BaseModuleWindow):
 
         self._build_menu()
 
-        self.controlador = ControladorListaDistribuidores()
+        self.controlador = ControladorListaDistribuidores(self.catalogo_compartido())
 
         self.thread = None
         self.worker = None
+        self.cancelacion: TokenCancelacion | None = None
         self.dialogo = None
         self._generado = False
         self._ocupado = False
@@ -116,18 +117,24 @@ class ListaDistribuidoresView(BaseModuleWindow):
             parent.show()
 
     def _detener_hilo(self):
-        if self.thread and isValid(self.thread):
-            try:
-                if self.thread.isRunning():
-                    self.thread.quit()
-                    self.thread.wait()
-            except RuntimeError:
-                pass
+        soltar_hilo(self.thread, self.worker, self.cancelacion)
         self.thread = None
         self.worker = None
+        self.cancelacion = None
+
+    def _cancelar(self):
+        if self.dialogo is None:
+            return
+        self._cerrar_dialogo()
+        self._detener_hilo()
+        self._set_ocupado(False)
+        self.ui.progressBar.setValue(0)
+        self.ui.lblProcesando.setText("")
+        self.ui.labelEstado.setText("Generación cancelada")
 
     def closeEvent(self, event):
         self._detener_hilo()
+        self.controlador.cerrar()
         if getattr(self, "menu_controller", None):
             try:
                 self.menu_controller.raise_()
@@ -148,10 +155,12 @@ class ListaDistribuidoresView(BaseModuleWindow):
         self.dialogo.set_titulo("Generando Lista de Productos para Distribuidores")
         self.dialogo.reset()
         self.dialogo.set_mensaje("Generando lista de productos para distribuidores...")
+        self.dialogo.rejected.connect(self._cancelar)
         self.dialogo.show()
 
+        self.cancelacion = TokenCancelacion()
         self.thread = QThread(self)
-        self.worker = WorkerListaDistribuidores(self.controlador)
+        self.worker = WorkerListaDistribuidores(self.controlador, self.cancelacion)
         self.worker.moveToThread(self.thread)
 
         self.thread.started.connect(self.worker.ejecutar)
@@ -175,12 +184,13 @@ class ListaDistribuidoresView(BaseModuleWindow):
             self.dialogo.set_mensaje(mensaje)
 
     def _cerrar_dialogo(self):
-        if self.dialogo:
+        # Se suelta antes de cerrarlo: su closeEvent emite rejected, que aquí significa "cancelar".
+        dialogo, self.dialogo = self.dialogo, None
+        if dialogo:
             try:
-                self.dialogo.close()
+                dialogo.close()
             except Exception:
                 pass
-            self.dialogo = None
 
 
     def _aplicar_columnas_dinamicas(self):
@@ -231,6 +241,8 @@ class ListaDistribuidoresView(BaseModuleWindow):
     def _error(self, mensaje):
         self._cerrar_dialogo()
         self._set_ocupado(False)
+        if mensaje == "__CANCELADO__":
+            return
         mostrar_error(mensaje, self)
 
     def _filas_ordenadas(self, tabla):
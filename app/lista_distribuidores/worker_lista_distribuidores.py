@@ -1,20 +1,26 @@
 from PySide6.QtCore import QObject, Signal
 
+from app.core.excepciones import OperacionCancelada
+
 class WorkerListaDistribuidores(QObject):
     progreso = Signal(int, str)
     terminado = Signal(object, object)
     error = Signal(str)
 
-    def __init__(self, controlador):
+    def __init__(self, controlador, cancelacion=None):
         super().__init__()
         self.controlador = controlador
+        self.cancelacion = cancelacion
 
     def ejecutar(self):
         try:
             m_simples, m_variados = self.controlador.generar_lista(
-                callback_progreso=self._emitir
+                callback_progreso=self._emitir,
+                cancelacion=self.cancelacion,
             )
             self.terminado.emit(m_simples, m_variados)
+        except OperacionCancelada:
+            self.error.emit("__CANCELADO__")
         except Exception as e:
             self.error.emit(str(e))
 
@@ -1,16 +1,22 @@
 from __future__ import annotations
 
 import os
+from datetime import datetime
 
-from PySide6.QtWidgets import QMainWindow, QMessageBox, QDialog
-from PySide6.QtGui import QPixmap
-from PySide6.QtCore import Qt
+from PySide6.QtWidgets import QMainWindow, QMessageBox, QDialog, QLabel
+from PySide6.QtGui import QAction, QPixmap
+from PySide6.QtCore import Qt, QThread, QTimer
+from shiboken6 import isValid
 
 from app.menu.ui.ui_view_menu import Ui_MenuPrincipal
 from app.core.configuracion import Configuracion
 from app.core.excepciones import ConfiguracionError
 from app.core.credenciales_view import CredencialesApiWooView
-from app.core.dialogos import mostrar_error
+from app.core.dialogos import mostrar_error, mostrar_info
+from app.core.base_windows import esperar_hilos_sueltos
+from app.core.cancelacion import TokenCancelacion
+from app.core.servicio_catalogo import ServicioCatalogo
+from app.menu.worker_precarga_catalogo import WorkerPrecargaCatalogo
 
 
 class MenuPrincipalView(QMainWindow):
@@ -21,8 +27,21 @@ class MenuPrincipalView(QMainWindow):
         self.ui.setupUi(self)
 
         self.ventana = None
+        # Un solo catálogo para todos los módulos (ver ServicioCatalogo).
+        self.catalogo = ServicioCatalogo()
+
+        # Precarga del catálogo en segundo plano (los módulos se enganchan a ella).
+        self.thread_precarga: QThread | None = None
+        self.worker_precarga = None
+        self.cancelacion_precarga: TokenCancelacion | None = None
+        self.lblCatalogo = QLabel("Catálogo: sin sincronizar")
+        self.statusBar().addPermanentWidget(self.lblCatalogo)
+
         self._conectar_eventos()
 
+        # Con credenciales ya guardadas la precarga arranca apenas se muestra el menú.
+        QTimer.singleShot(0, self._precargar_si_hay_credenciales)
+
     def _conectar_eventos(self):
         self.ui.btnVentas.clicked.connect(self._ventas)
         self.ui.btnInventario.clicked.connect(self._inventario)
@@ -36,19 +55,114 @@ class MenuPrincipalView(QMainWindow):
         self.ui.actionLista_de_Distribuidores.triggered.connect(self._distribuidores)
         self.ui.actionAcerca_de.triggered.connect(self._acerca_de)
 
+        act_catalogo = QAction("Actualizar catálogo", self)
+        act_catalogo.triggered.connect(self.refrescar_catalogo)
+        self.ui.menuWoo.addAction(act_catalogo)
+
     def _abrir_credenciales(self):
         dlg = CredencialesApiWooView(self)
-        dlg.exec()
+        if dlg.exec() == QDialog.Accepted:
+            self.catalogo.reiniciar()
+            self._precargar_si_hay_credenciales()
+
+    def refrescar_catalogo(self):
+        """
+        Sincronización completa; la que dispara la vigencia al abrir un módulo es incremental.
+        Si ya hay una precarga en curso, la completa queda pendiente y arranca cuando esa termina.
+        """
+        self.catalogo.invalidar()
+        self._precargar_catalogo()
+        mostrar_info("El catálogo se está sincronizando en segundo plano.", self)
+
+    def closeEvent(self, event):
+        self._detener_precarga()
+        esperar_hilos_sueltos()
+        self.catalogo.cerrar()
+        super().closeEvent(event)
+
+    # ----------------------------
+    # Precarga del catálogo
+    # ----------------------------
+    def _precargar_si_hay_credenciales(self):
+        try:
+            Configuracion().obtener_credenciales()
+        except ConfiguracionError:
+            return
+        self._precargar_catalogo()
+
+    def _precargar_catalogo(self):
+        """Sincroniza el catálogo en un hilo de baja prioridad, salvo que ya esté al día o en curso."""
+        if self.thread_precarga is not None or self.catalogo.vigente():
+            return
+
+        self.lblCatalogo.setText("Catálogo: sincronizando...")
+
+        self.cancelacion_precarga = TokenCancelacion()
+        self.thread_precarga = QThread(self)
+        self.worker_precarga = WorkerPrecargaCatalogo(self.catalogo, self.cancelacion_precarga)
+        self.worker_precarga.moveToThread(self.thread_precarga)
+
+        self.thread_precarga.started.connect(self.worker_precarga.ejecutar)
+        self.worker_precarga.progreso.connect(self._progreso_precarga)
+        self.worker_precarga.terminado.connect(self._fin_precarga)
+        self.worker_precarga.error.connect(self._error_precarga)
+
+        self.worker_precarga.terminado.connect(self.thread_precarga.quit)
+        self.worker_precarga.error.connect(self.thread_precarga.quit)
+        self.worker_precarga.terminado.connect(self.worker_precarga.deleteLater)
+        self.worker_precarga.error.connect(self.worker_precarga.deleteLater)
+        self.thread_precarga.finished.connect(self.thread_precarga.deleteLater)
+
+        self.thread_precarga.start(QThread.LowPriority)
+
+    def _progreso_precarga(self, valor, mensaje):
+        self.lblCatalogo.setText(f"Catálogo: {mensaje} ({valor}%)")
+
+    def _fin_precarga(self, _sincronizo):
+        self.thread_precarga = None
+        self.worker_precarga = None
+        if self.catalogo.vigente():
+            self.lblCatalogo.setText(f"Catálogo al día ({datetime.now():%H:%M})")
+        else:
+            # Se pidió una sincronización completa o cambiaron las credenciales durante la descarga.
+            self._precargar_catalogo()
+
+    def _error_precarga(self, mensaje):
+        self.thread_precarga = None
+        self.worker_precarga = None
+        if mensaje == "__CANCELADO__":
+            return
+        # No es bloqueante: el módulo que se abra volverá a intentar la sincronización.
+        self.lblCatalogo.setText("Catálogo: no se pudo precargar")
+        self.lblCatalogo.setToolTip(mensaje)
+
+    def _detener_precarga(self):
+        # Al salir de la app sí se espera: con el token cancelado, el hilo termina enseguida.
+        if self.cancelacion_precarga is not None:
+            self.cancelacion_precarga.cancelar()
+        if self.thread_precarga and isValid(self.thread_precarga):
+            try:
+                if self.thread_precarga.isRunning():
+                    self.thread_precarga.quit()
+                    self.thread_precarga.wait()
+            except RuntimeError:
+                pass
+        self.thread_precarga = None
+        self.worker_precarga = None
+        self.cancelacion_precarga = None
 
     def _asegurar_credenciales(self) -> bool:
         try:
             Configuracion().obtener_credenciales()
+            self._precargar_catalogo()
             return True
         except ConfiguracionError:
             dlg = CredencialesApiWooView(self)
             if dlg.exec() == QDialog.Accepted:
+                self.catalogo.reiniciar()
                 try:
                     Configuracion().obtener_credenciales()
+                    self._precargar_catalogo()
                     return True
                 except ConfiguracionError:
                     mostrar_error("Credenciales incompletas o inválidas.")
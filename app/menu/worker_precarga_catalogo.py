@@ -0,0 +1,28 @@
+from PySide6.QtCore import QObject, Signal, Slot
+
+from app.core.excepciones import OperacionCancelada
+
+
+class WorkerPrecargaCatalogo(QObject):
+    progreso = Signal(int, str)
+    terminado = Signal(bool)
+    error = Signal(str)
+
+    def __init__(self, catalogo, cancelacion=None):
+        super().__init__()
+        self.catalogo = catalogo
+        self.cancelacion = cancelacion
+
+    @Slot()
+    def ejecutar(self):
+        try:
+            # Cancelar (al cerrar la app) deshace la transacción del espejo.
+            sincronizo = self.catalogo.asegurar(callback_progreso=self._emitir_progreso, cancelacion=self.cancelacion)
+            self.terminado.emit(sincronizo)
+        except OperacionCancelada:
+            self.error.emit("__CANCELADO__")
+        except Exception as e:
+            self.error.emit(str(e))
+
+    def _emitir_progreso(self, valor, mensaje):
+        self.progreso.emit(valor, mensaje)
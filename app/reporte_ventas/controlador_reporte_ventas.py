@@ -9,7 +9,12 @@ from PySide6.QtGui import QFont
 import xlsxwriter
 
 from app.core.cliente_woocommerce import ClienteWooCommerce
+from app.core.almacen_pedidos import AlmacenPedidos
+from app.core.cancelacion import TokenCancelacion
 from app.core.column_utils import prune_empty_columns
+from app.core.costos import resolver_costos
+from app.core.progreso import AgregadorProgreso
+from app.core.table_enhancer import SORT_ROLE, SortKeyCache
 
 
 HEADERS = [
@@ -71,6 +76,13 @@ def _estado_es(status: str) -> str:
     return mapa.get(s, status or "")
 
 
+def _clave_costo(line_item: dict) -> tuple[int, int]:
+    try:
+        return int(line_item.get("product_id") or 0), int(line_item.get("variation_id") or 0)
+    except (TypeError, ValueError):
+        return 0, 0
+
+
 def _normalizar_doc(v: Any) -> str | None:
     """Devuelve cédula/RUC válida (solo dígitos 10 o 13). Evita hashes/alfanuméricos."""
     if v is None:
@@ -94,6 +106,10 @@ class ModeloTablaReporteVentas(QAbstractTableModel):
         self._datos = datos
         self._headers = headers
         self._keys = keys
+        self.claves_orden = SortKeyCache(self, self._texto, self._reordenar)
+
+    def _reordenar(self, perm: list[int]) -> None:
+        self._datos[:] = [self._datos[i] for i in perm]
 
     def rowCount(self, parent=None):
         return len(self._datos)
@@ -101,15 +117,20 @@ class ModeloTablaReporteVentas(QAbstractTableModel):
     def columnCount(self, parent=None):
         return len(self._keys)
 
+    def _texto(self, row: int, col: int) -> str:
+        return _safe_str(self._datos[row].get(self._keys[col], ""))
+
     def data(self, index, role=Qt.DisplayRole):
         if not index.isValid():
             return None
 
-        fila = self._datos[index.row()]
         clave = self._keys[index.column()]
 
         if role == Qt.DisplayRole:
-            return _safe_str(fila.get(clave, ""))
+            return self._texto(index.row(), index.column())
+
+        if role == SORT_ROLE:
+            return self.claves_orden.key(index.row(), index.column())
 
         if role == Qt.TextAlignmentRole:
             if clave in ("subtotal", "envio", "iva", "descuento", "total", "utilidad"):
@@ -135,10 +156,15 @@ class ModeloTablaReporteVentas(QAbstractTableModel):
 class ControladorReporteVentas:
     def __init__(self):
         self.cliente = ClienteWooCommerce()
+        self.almacen = AlmacenPedidos(self.cliente)
         self._pedidos: list[dict] = []
         self._headers = list(HEADERS)
         self._keys = list(COLUMN_KEYS)
 
+    def cerrar(self) -> None:
+        """Libera las conexiones HTTP del cliente (al cerrar la ventana)."""
+        self.cliente.cerrar()
+
     def _extraer_identificacion(self, o: dict) -> str | None:
         """
         Identificación real (cédula/RUC/DNI/VAT) desde billing/meta_data.
@@ -189,85 +215,103 @@ class ControladorReporteVentas:
                     return s
         return None
 
+    def _fila_pedido(self, o: dict, costos: dict[tuple[int, int], Decimal]) -> dict:
+        pedido_id = o.get("id", "")
+        fecha = (o.get("date_created") or "").replace("T", " ")[:16]
+        estado = _estado_es(o.get("status", ""))
+
+        billing = o.get("billing") or {}
+        shipping = o.get("shipping") or {}
+
+        cliente = (billing.get("first_name", "") + " " + billing.get("last_name", "")).strip()
+        if not cliente:
+            cliente = billing.get("email", "") or ""
+
+        correo = (billing.get("email") or "").strip()
+        telefono = (billing.get("phone") or "").strip()
+
+        direccion = " ".join(
+            [
+                (shipping.get("address_1") or billing.get("address_1") or "").strip(),
+                (shipping.get("address_2") or billing.get("address_2") or "").strip(),
+            ]
+        ).strip()
+        direccion = direccion or None
+
+        identificacion = self._extraer_identificacion(o)
+        cajero = self._extraer_cajero(o)
+
+        subtotal = Decimal("0")
+        utilidad: Decimal | None = Decimal("0")
+        for li in (o.get("line_items") or []):
+            subtotal += _to_decimal(li.get("subtotal"))
+            # Utilidad de la línea: total cobrado (con descuentos, sin IVA) - costo de compra x cantidad.
+            costo = costos.get(_clave_costo(li))
+            if costo is None:
+                # Sin costo no se asume 0 (sería contar la venta entera como utilidad): queda N/A.
+                utilidad = None
+            elif utilidad is not None:
+                utilidad += _to_decimal(li.get("total")) - costo * _to_decimal(li.get("quantity"))
+
+        subtotal = _clamp_nonneg_dec(subtotal)
+        envio = _clamp_nonneg_dec(_to_decimal(o.get("shipping_total")))
+        iva = _clamp_nonneg_dec(_to_decimal(o.get("total_tax")))
+        descuento = _clamp_nonneg_dec(_to_decimal(o.get("discount_total")))
+        total_orden = _clamp_nonneg_dec(_to_decimal(o.get("total")))
+        # La utilidad no se recorta: un pedido vendido bajo costo tiene que verse en negativo.
+
+        return {
+            "fecha": fecha or "N/A",
+            "cliente": cliente or "N/A",
+            "subtotal": _money_dec(subtotal),
+            "envio": _money_dec(envio),
+            "iva": _money_dec(iva),
+            "descuento": _money_dec(descuento),
+            "total": _money_dec(total_orden),
+            "utilidad": None if utilidad is None else _money_dec(utilidad),
+            "estado": estado or "N/A",
+            "notas": (o.get("customer_note") or "").strip() or None,
+            "pedido": pedido_id or "N/A",
+            "identificacion": identificacion,
+            "correo": correo or None,
+            "telefono": telefono or None,
+            "direccion": direccion,
+            "ciudad": (shipping.get("city") or billing.get("city") or "").strip() or None,
+            "cajero": cajero,
+        }
+
     def generar_reporte(
         self,
         desde,
         hasta,
         callback_progreso: Optional[Callable[[int, str], None]] = None,
-        should_cancel: Optional[Callable[[], bool]] = None,
+        cancelacion: Optional[TokenCancelacion] = None,
         **_kwargs,
     ):
-        pedidos = self.cliente.obtener_pedidos(desde=desde, hasta=hasta)
+        with self.cliente.cancelable(cancelacion):
+            # Cancelar durante la descarga deshace la transacción del almacén.
+            self.almacen.sincronizar(desde, hasta, callback_progreso)
+            pedidos = self.almacen.pedidos(desde, hasta)
+
+            # Todos los costos del rango en bloque: el bucle de pedidos no hace peticiones.
+            pares = {_clave_costo(li) for o in pedidos for li in (o.get("line_items") or [])}
+            if pares and callback_progreso:
+                callback_progreso(0, f"Obteniendo costos de {len(pares)} productos")
+            costos = resolver_costos(self.cliente, pares)
 
-        self._pedidos.clear()
         total = max(len(pedidos), 1)
+        avance = AgregadorProgreso(callback_progreso)
+
+        self._pedidos.clear()
 
         for i, o in enumerate(pedidos, start=1):
-            if should_cancel and should_cancel():
-                raise RuntimeError("__CANCELADO__")
-
-            pedido_id = o.get("id", "")
-            fecha = (o.get("date_created") or "").replace("T", " ")[:16]
-            estado = _estado_es(o.get("status", ""))
-
-            billing = o.get("billing") or {}
-            shipping = o.get("shipping") or {}
-
-            cliente = (billing.get("first_name", "") + " " + billing.get("last_name", "")).strip()
-            if not cliente:
-                cliente = billing.get("email", "") or ""
-
-            correo = (billing.get("email") or "").strip()
-            telefono = (billing.get("phone") or "").strip()
-
-            direccion = " ".join(
-                [
-                    (shipping.get("address_1") or billing.get("address_1") or "").strip(),
-                    (shipping.get("address_2") or billing.get("address_2") or "").strip(),
-                ]
-            ).strip()
-            direccion = direccion or None
-
-            identificacion = self._extraer_identificacion(o)
-            cajero = self._extraer_cajero(o)
-
-            subtotal = Decimal("0")
-            for li in (o.get("line_items") or []):
-                subtotal += _to_decimal(li.get("subtotal"))
-
-            subtotal = _clamp_nonneg_dec(subtotal)
-            envio = _clamp_nonneg_dec(_to_decimal(o.get("shipping_total")))
-            iva = _clamp_nonneg_dec(_to_decimal(o.get("total_tax")))
-            descuento = _clamp_nonneg_dec(_to_decimal(o.get("discount_total")))
-            total_orden = _clamp_nonneg_dec(_to_decimal(o.get("total")))
-
-            fila = {
-                "fecha": fecha or "N/A",
-                "cliente": cliente or "N/A",
-                "subtotal": _money_dec(subtotal),
-                "envio": _money_dec(envio),
-                "iva": _money_dec(iva),
-                "descuento": _money_dec(descuento),
-                "total": _money_dec(total_orden),
-                "utilidad": _money_dec(Decimal("0")),
-                "estado": estado or "N/A",
-                "notas": (o.get("customer_note") or "").strip() or None,
-                "pedido": pedido_id or "N/A",
-                "identificacion": identificacion,
-                "correo": correo or None,
-                "telefono": telefono or None,
-                "direccion": direccion,
-                "ciudad": (shipping.get("city") or billing.get("city") or "").strip() or None,
-                "cajero": cajero,
-            }
-
-            self._pedidos.append(fila)
-
-            if callback_progreso:
-                callback_progreso(
-                    int((i / total) * 100),
-                    f"Procesando pedido {i} de {total}"
-                )
+            if cancelacion:
+                cancelacion.verificar()
+
+            self._pedidos.append(self._fila_pedido(o, costos))
+
+            avance(i, total, "Procesando pedidos")
+        avance.terminar()
 
         optional = {
             "identificacion",
@@ -285,7 +329,8 @@ class ControladorReporteVentas:
         return modelo_principal, modelo_vacio
 
     def exportar_excel(self, ruta: str, filas=None):
-        workbook = xlsxwriter.Workbook(ruta)
+        # constant_memory: cada fila se vuelca a disco al pasar a la siguiente, la memoria no crece con el reporte.
+        workbook = xlsxwriter.Workbook(ruta, {"constant_memory": True})
 
         header_fmt = workbook.add_format({
             "bold": True,
@@ -303,14 +348,21 @@ class ControladorReporteVentas:
             ws.write(0, col, h, header_fmt)
 
         datos = filas if filas is not None else self._pedidos
+        columnas = [
+            (c, key, key in ("subtotal", "envio", "iva", "descuento", "total", "utilidad"))
+            for c, key in enumerate(self._keys)
+        ]
 
         for r, fila in enumerate(datos, start=1):
-            for c, key in enumerate(self._keys):
+            for c, key, monetaria in columnas:
                 val = fila.get(key, "")
-                if key in ("subtotal", "envio", "iva", "descuento", "total", "utilidad"):
-                    ws.write_number(r, c, _safe_float(val), money_fmt)
-                else:
+                if not monetaria:
                     ws.write(r, c, val, text_fmt)
+                elif val is None:
+                    # Utilidad sin costo de compra conocido.
+                    ws.write_string(r, c, "N/A", text_fmt)
+                else:
+                    ws.write_number(r, c, _safe_float(val), money_fmt)
 
         ws.freeze_panes(1, 0)
         ws.autofilter(0, 0, max(1, len(datos)), max(0, len(self._headers) - 1))
@@ -4,9 +4,9 @@ from datetime import date
 
 from PySide6.QtCore import QThread, QDate, Qt
 from PySide6.QtWidgets import QFileDialog, QHeaderView, QHBoxLayout, QLabel, QLineEdit, QPushButton
-from shiboken6 import isValid
 
-from app.core.base_windows import BaseModuleWindow
+from app.core.base_windows import BaseModuleWindow, soltar_hilo
+from app.core.cancelacion import TokenCancelacion
 from app.reporte_ventas.ui.ui_view_reporte_ventas import Ui_ReporteVentas
 from app.reporte_ventas.controlador_reporte_ventas import ControladorReporteVentas
 from app.reporte_ventas.worker_reporte_ventas import WorkerReporteVentas
@@ -39,6 +39,7 @@ class ReporteVentasView(BaseModuleWindow):
 
         self.thread: QThread | None = None
         self.worker = None
+        self.cancelacion: TokenCancelacion | None = None
         self.dialogo: ProcessDialog | None = None
 
         self._cancel_requested = False
@@ -133,6 +134,7 @@ class ReporteVentasView(BaseModuleWindow):
     def closeEvent(self, event):
         self._cancelar_si_hay_proceso()
         self._detener_hilo()
+        self.controlador.cerrar()
         try:
             if self.menu_controller:
                 self.menu_controller.show()
@@ -142,24 +144,21 @@ class ReporteVentasView(BaseModuleWindow):
 
 
     def _detener_hilo(self):
-        if self.thread and isValid(self.thread):
-            try:
-                if self.thread.isRunning():
-                    self.thread.quit()
-                    self.thread.wait()
-            except RuntimeError:
-                pass
+        soltar_hilo(self.thread, self.worker, self.cancelacion)
         self.thread = None
         self.worker = None
+        self.cancelacion = None
 
     def _cancelar_si_hay_proceso(self):
         self._cancel_requested = True
-        if self.dialogo:
+        if self.cancelacion is not None:
+            self.cancelacion.cancelar()
+        dialogo, self.dialogo = self.dialogo, None
+        if dialogo:
             try:
-                self.dialogo.reject()
+                dialogo.reject()
             except Exception:
                 pass
-            self.dialogo = None
 
     def _generar(self):
         self._detener_hilo()
@@ -190,13 +189,9 @@ class ReporteVentasView(BaseModuleWindow):
 
         self.dialogo.show()
 
+        self.cancelacion = TokenCancelacion()
         self.thread = QThread(self)
-        self.worker = WorkerReporteVentas(
-            self.controlador,
-            desde,
-            hasta,
-            should_cancel=lambda: self._cancel_requested,
-        )
+        self.worker = WorkerReporteVentas(self.controlador, desde, hasta, self.cancelacion)
         self.worker.moveToThread(self.thread)
 
         self.thread.started.connect(self.worker.ejecutar)
@@ -1,16 +1,18 @@
 from PySide6.QtCore import QObject, Signal, Slot
 
+from app.core.excepciones import OperacionCancelada
+
 class WorkerReporteVentas(QObject):
     progreso = Signal(int, str)
     terminado = Signal(object, object)
     error = Signal(str)
 
-    def __init__(self, controlador, desde, hasta, should_cancel=None):
+    def __init__(self, controlador, desde, hasta, cancelacion=None):
         super().__init__()
         self.controlador = controlador
         self.desde = desde
         self.hasta = hasta
-        self.should_cancel = should_cancel
+        self.cancelacion = cancelacion
 
     @Slot()
     def ejecutar(self):
@@ -19,12 +21,10 @@ class WorkerReporteVentas(QObject):
                 self.desde,
                 self.hasta,
                 callback_progreso=self.progreso.emit,
-                should_cancel=self.should_cancel,
+                cancelacion=self.cancelacion,
             )
             self.terminado.emit(*modelos)
+        except OperacionCancelada:
+            self.error.emit("__CANCELADO__")
         except Exception as e:
-            msg = str(e)
-            if msg == "__CANCELADO__":
-                self.error.emit("__CANCELADO__")
-            else:
-                self.error.emit(f"Error al generar reporte: {e}")
+            self.error.emit(f"Error al generar reporte: {e}")
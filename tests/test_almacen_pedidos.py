@@ -0,0 +1,135 @@
+import os
+import tempfile
+import unittest
+from datetime import date
+
+from app.core.almacen_pedidos import AlmacenPedidos, _tramos_faltantes, _unir_tramos
+from app.core.cliente_woocommerce import Pagina
+
+
+class TestTramos(unittest.TestCase):
+    def test_sin_cubiertos(self):
+        self.assertEqual(
+            _tramos_faltantes([], date(2024, 1, 1), date(2024, 1, 31)),
+            [(date(2024, 1, 1), date(2024, 1, 31))],
+        )
+
+    def test_solape_parcial(self):
+        cubiertos = [["2024-01-10", "2024-01-20"]]
+        self.assertEqual(
+            _tramos_faltantes(cubiertos, date(2024, 1, 15), date(2024, 1, 25)),
+            [(date(2024, 1, 21), date(2024, 1, 25))],
+        )
+        self.assertEqual(
+            _tramos_faltantes(cubiertos, date(2024, 1, 5), date(2024, 1, 12)),
+            [(date(2024, 1, 5), date(2024, 1, 9))],
+        )
+
+    def test_rango_contenido(self):
+        cubiertos = [["2024-01-01", "2024-01-31"]]
+        self.assertEqual(_tramos_faltantes(cubiertos, date(2024, 1, 10), date(2024, 1, 20)), [])
+        self.assertEqual(_tramos_faltantes(cubiertos, date(2024, 1, 1), date(2024, 1, 31)), [])
+
+    def test_hueco_entre_tramos(self):
+        cubiertos = [["2024-01-21", "2024-01-31"], ["2024-01-01", "2024-01-09"]]
+        self.assertEqual(
+            _tramos_faltantes(cubiertos, date(2024, 1, 1), date(2024, 2, 2)),
+            [(date(2024, 1, 10), date(2024, 1, 20)), (date(2024, 2, 1), date(2024, 2, 2))],
+        )
+
+    def test_unir_adyacentes(self):
+        self.assertEqual(
+            _unir_tramos([["2024-01-01", "2024-01-09"]], date(2024, 1, 10), date(2024, 1, 15)),
+            [["2024-01-01", "2024-01-15"]],
+        )
+
+    def test_unir_con_hueco_no_fusiona(self):
+        self.assertEqual(
+            _unir_tramos([["2024-01-01", "2024-01-09"]], date(2024, 1, 11), date(2024, 1, 15)),
+            [["2024-01-01", "2024-01-09"], ["2024-01-11", "2024-01-15"]],
+        )
+
+    def test_unir_solapados_y_contenidos(self):
+        cubiertos = [["2024-01-01", "2024-01-10"], ["2024-01-20", "2024-01-25"]]
+        self.assertEqual(
+            _unir_tramos(cubiertos, date(2024, 1, 5), date(2024, 1, 21)),
+            [["2024-01-01", "2024-01-25"]],
+        )
+        self.assertEqual(
+            _unir_tramos(cubiertos, date(2024, 1, 2), date(2024, 1, 3)),
+            cubiertos,
+        )
+
+
+class ClienteFalso:
+    """Tienda en memoria con la parte de ClienteWooCommerce que usa AlmacenPedidos."""
+
+    base_url = "https://tienda.test/wp-json/wc/v3"
+
+    def __init__(self):
+        self.pedidos = [
+            {"id": 1, "date_created": "2024-01-02T10:00:00", "total": "10"},
+            {"id": 2, "date_created": "2024-01-03T11:00:00", "total": "20"},
+            {"id": 3, "date_created": "2024-01-05T12:00:00", "total": "30"},
+        ]
+        self.descargas: list[tuple] = []
+
+    def iter_pedidos(self, desde=None, hasta=None, per_page=100, campos=None, modificado_despues=None):
+        self.descargas.append((desde, hasta, modificado_despues))
+        if modificado_despues is not None:
+            items = []
+        else:
+            items = [
+                p for p in self.pedidos
+                if desde.isoformat() <= p["date_created"][:10] <= hasta.isoformat()
+            ]
+        yield Pagina(1, 1, len(items), items)
+
+    def contar_pedidos(self, desde, hasta):
+        return sum(desde.isoformat() <= p["date_created"][:10] <= hasta.isoformat() for p in self.pedidos)
+
+
+class TestSincronizacionPedidos(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.cliente = ClienteFalso()
+        self.almacen = AlmacenPedidos(self.cliente, ruta=os.path.join(self.dir.name, "pedidos.sqlite3"))
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def _por_fecha(self):
+        return [(d, h) for d, h, m in self.cliente.descargas if m is None]
+
+    def test_solo_descarga_dias_no_cubiertos(self):
+        self.almacen.sincronizar(date(2024, 1, 1), date(2024, 1, 3))
+        self.almacen.sincronizar(date(2024, 1, 2), date(2024, 1, 6))
+
+        self.assertEqual(
+            self._por_fecha(),
+            [(date(2024, 1, 1), date(2024, 1, 3)), (date(2024, 1, 4), date(2024, 1, 6))],
+        )
+        self.assertEqual([p["id"] for p in self.almacen.pedidos(date(2024, 1, 1), date(2024, 1, 6))], [1, 2, 3])
+
+    def test_rango_cubierto_no_descarga_por_fecha(self):
+        self.almacen.sincronizar(date(2024, 1, 1), date(2024, 1, 6))
+        self.cliente.descargas.clear()
+
+        self.almacen.sincronizar(date(2024, 1, 2), date(2024, 1, 4))
+
+        self.assertEqual(self._por_fecha(), [])
+
+    def test_total_distinto_vuelve_a_descargar_el_rango(self):
+        self.almacen.sincronizar(date(2024, 1, 1), date(2024, 1, 6))
+        # Un pedido enviado a la papelera: modified_after no lo devuelve, pero el total baja.
+        del self.cliente.pedidos[1]
+        self.cliente.descargas.clear()
+
+        self.almacen.sincronizar(date(2024, 1, 1), date(2024, 1, 6))
+
+        self.assertEqual(self._por_fecha(), [(date(2024, 1, 1), date(2024, 1, 6))])
+        self.assertEqual([p["id"] for p in self.almacen.pedidos(date(2024, 1, 1), date(2024, 1, 6))], [1, 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
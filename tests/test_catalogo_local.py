@@ -0,0 +1,169 @@
+import os
+import tempfile
+import unittest
+from collections import Counter
+from datetime import datetime, timezone
+
+from app.core.catalogo_local import CatalogoLocal
+from app.core.cliente_woocommerce import Pagina, ResultadoVariaciones
+
+
+def _proyectar(obj: dict, campos) -> dict:
+    return {k: v for k, v in obj.items() if not campos or k in campos}
+
+
+class ClienteFalso:
+    """Tienda en memoria con la parte de ClienteWooCommerce que usa CatalogoLocal."""
+
+    base_url = "https://tienda.test/wp-json/wc/v3"
+
+    def __init__(self):
+        self.productos = [
+            {"id": 1, "type": "variable", "name": "Camiseta", "sku": "CAM",
+             "date_modified_gmt": "2024-01-01T10:00:00"},
+            {"id": 2, "type": "simple", "name": "Gorra", "sku": "GOR", "stock_quantity": 5,
+             "manage_stock": True, "stock_status": "instock", "price": "10",
+             "date_modified_gmt": "2024-01-01T10:00:00"},
+            # El más reciente fija la marca: los otros quedan fuera del solape de modified_after.
+            {"id": 3, "type": "simple", "name": "Llavero", "sku": "LLA", "stock_quantity": 1,
+             "manage_stock": True, "stock_status": "instock", "price": "2",
+             "date_modified_gmt": "2024-01-01T12:00:00"},
+        ]
+        self.variaciones = {
+            1: [{"id": 10, "sku": "CAM-0", "stock_quantity": 50, "manage_stock": True,
+                 "stock_status": "instock", "price": "20"}],
+        }
+        self.pedidos: list[dict] = []
+        self.llamadas = Counter()
+        self.pedidos_por_id: list[tuple] = []
+
+    def vender(self, producto_id, variacion_id=0):
+        ahora = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+        self.pedidos.append({
+            "id": len(self.pedidos) + 100, "date_modified_gmt": ahora,
+            "line_items": [{"product_id": producto_id, "variation_id": variacion_id}],
+        })
+
+    def iter_productos(self, per_page=100, campos=None, modificado_despues=None):
+        self.llamadas["iter_productos"] += 1
+        items = [
+            _proyectar(p, campos) for p in self.productos
+            if modificado_despues is None
+            or p["date_modified_gmt"] > modificado_despues.strftime("%Y-%m-%dT%H:%M:%S")
+        ]
+        yield Pagina(1, 1, len(items), items)
+
+    def iter_pedidos(self, desde=None, hasta=None, per_page=100, campos=None, modificado_despues=None):
+        self.llamadas["iter_pedidos"] += 1
+        items = [
+            {"id": o["id"], "line_items": o["line_items"]} for o in self.pedidos
+            if o["date_modified_gmt"] > modificado_despues
+        ]
+        yield Pagina(1, 1, len(items), items)
+
+    def obtener_productos_por_ids(self, producto_ids, campos=None, refrescar=False):
+        self.llamadas["obtener_productos_por_ids"] += 1
+        self.pedidos_por_id.append(("productos", set(producto_ids), refrescar))
+        return {p["id"]: _proyectar(p, campos) for p in self.productos if p["id"] in set(producto_ids)}
+
+    def obtener_variaciones_por_ids(self, ids_por_producto, campos=None, refrescar=False):
+        self.llamadas["obtener_variaciones_por_ids"] += 1
+        self.pedidos_por_id.append(("variaciones", {p: set(v) for p, v in ids_por_producto.items()}, refrescar))
+        return {
+            v["id"]: _proyectar(v, campos)
+            for pid, vids in ids_por_producto.items()
+            for v in self.variaciones.get(pid, []) if v["id"] in vids
+        }
+
+    def obtener_variaciones_productos(self, producto_ids, per_page=100, campos=None):
+        # Una petición por padre.
+        self.llamadas["variaciones_de_padre"] += len(producto_ids)
+        return [
+            ResultadoVariaciones(pid, [_proyectar(v, campos) for v in self.variaciones.get(pid, [])])
+            for pid in producto_ids
+        ]
+
+    def contar_productos(self):
+        self.llamadas["contar_productos"] += 1
+        return len(self.productos)
+
+
+class TestSincronizacionIncremental(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.cliente = ClienteFalso()
+        self.catalogo = CatalogoLocal(self.cliente, ruta=os.path.join(self.dir.name, "catalogo.sqlite3"))
+        self.catalogo.sincronizar()
+        self.cliente.llamadas.clear()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_cambio_solo_de_variacion(self):
+        # Una venta baja el stock de la variación sin tocar el date_modified del padre.
+        self.cliente.variaciones[1][0].update(stock_quantity=3, price="18")
+        self.cliente.vender(1, 10)
+
+        self.catalogo.sincronizar()
+
+        variacion = self.catalogo.variaciones_por_producto()[1][0]
+        self.assertEqual(variacion["stock_quantity"], 3)
+        self.assertEqual(variacion["price"], "18")
+        self.assertEqual(variacion["sku"], "CAM-0")
+        self.assertEqual(self.catalogo.variaciones_por_producto(filtro_stock="con_unidades")[1][0]["id"], 10)
+        # Solo lo vendido, sin la caché del cliente y sin recorrer las variaciones de cada padre.
+        self.assertEqual(self.cliente.pedidos_por_id, [
+            ("productos", {1}, True),
+            ("variaciones", {1: {10}}, True),
+        ])
+        self.assertEqual(self.cliente.llamadas["variaciones_de_padre"], 0)
+        self.assertEqual(self.cliente.llamadas["iter_productos"], 1)
+
+    def test_variacion_agotada_sale_del_filtro(self):
+        self.cliente.variaciones[1][0].update(stock_quantity=0, stock_status="outofstock")
+        self.cliente.vender(1, 10)
+
+        self.catalogo.sincronizar()
+
+        self.assertEqual(self.catalogo.variaciones_por_producto(filtro_stock="con_stock"), {})
+        self.assertEqual([p["id"] for p in self.catalogo.productos(filtro_stock="con_stock")], [2, 3])
+
+    def test_venta_de_producto_simple(self):
+        self.cliente.productos[1]["stock_quantity"] = 4
+        self.cliente.vender(2)
+
+        self.catalogo.sincronizar()
+
+        gorra = next(p for p in self.catalogo.productos() if p["id"] == 2)
+        self.assertEqual(gorra["stock_quantity"], 4)
+        self.assertEqual(gorra["name"], "Gorra")
+        self.assertEqual(self.cliente.pedidos_por_id, [("productos", {2}, True)])
+        self.assertEqual(self.cliente.llamadas["obtener_variaciones_por_ids"], 0)
+
+    def test_sin_ventas_no_pide_stock(self):
+        self.catalogo.sincronizar()
+
+        self.assertEqual(self.cliente.llamadas["iter_pedidos"], 1)
+        self.assertEqual(self.cliente.pedidos_por_id, [])
+        self.assertEqual(self.cliente.llamadas["variaciones_de_padre"], 0)
+
+    def test_venta_de_producto_fuera_del_espejo(self):
+        # Producto creado después de la última sincronización: lo trae la completa, no el refresco.
+        self.cliente.vender(99, 990)
+
+        self.catalogo.sincronizar()
+
+        self.assertEqual(self.cliente.llamadas["iter_pedidos"], 1)
+        self.assertEqual(self.cliente.pedidos_por_id, [])
+
+    def test_completa_no_revisa_pedidos(self):
+        self.cliente.vender(2)
+
+        self.catalogo.sincronizar(completa=True)
+
+        self.assertEqual(self.cliente.llamadas["iter_pedidos"], 0)
+        self.assertEqual(self.cliente.llamadas["iter_productos"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
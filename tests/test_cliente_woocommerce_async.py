@@ -0,0 +1,159 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import unittest
+from collections import Counter
+
+from aiohttp import web
+
+from app.core.catalogo_local import CatalogoLocal
+from app.core.cancelacion import TokenCancelacion
+from app.core.cliente_woocommerce_async import AsyncClienteWooCommerce
+from app.core.excepciones import OperacionCancelada
+
+from test_catalogo_local import ClienteFalso
+
+
+class TiendaFalsa:
+    """Servidor HTTP local con las rutas de la API que usan las pruebas."""
+
+    def __init__(self, demora: float = 0.05):
+        self.demora = demora
+        self.en_vuelo = 0
+        self.maximo_en_vuelo = 0
+        self.peticiones = Counter()
+        self.saturar = 0  # cuántas respuestas 503 dar antes de contestar bien
+
+        app = web.Application()
+        app.router.add_get("/wp-json/wc/v3/products/{pid}/variations", self._variaciones)
+        app.router.add_get("/wp-json/wc/v3/products/{pid}", self._producto)
+        app.router.add_post("/wp-json/wc/v3/products/batch", self._lote)
+        self._runner = web.AppRunner(app)
+
+        self._loop = asyncio.new_event_loop()
+        self._hilo = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._hilo.start()
+        asyncio.run_coroutine_threadsafe(self._iniciar(), self._loop).result()
+        self.credenciales = {
+            "url": f"http://127.0.0.1:{self._runner.addresses[0][1]}",
+            "consumer_key": "ck",
+            "consumer_secret": "cs",
+        }
+
+    async def _iniciar(self):
+        await self._runner.setup()
+        await web.TCPSite(self._runner, "127.0.0.1", 0).start()
+
+    def detener(self):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._hilo.join()
+        self._loop.close()
+
+    async def _atender(self, clave: str, datos):
+        self.peticiones[clave] += 1
+        self.en_vuelo += 1
+        self.maximo_en_vuelo = max(self.maximo_en_vuelo, self.en_vuelo)
+        try:
+            await asyncio.sleep(self.demora)
+        finally:
+            self.en_vuelo -= 1
+        if self.saturar:
+            self.saturar -= 1
+            return web.Response(status=503, headers={"Retry-After": "0"})
+        return web.json_response(datos, headers={"X-WP-TotalPages": "1"})
+
+    async def _variaciones(self, request):
+        pid = int(request.match_info["pid"])
+        return await self._atender(f"variaciones/{pid}", [{"id": pid * 10, "stock_quantity": pid}])
+
+    async def _producto(self, request):
+        pid = int(request.match_info["pid"])
+        return await self._atender(f"producto/{pid}", {"id": pid})
+
+    async def _lote(self, request):
+        cuerpo = await request.json()
+        return await self._atender("lote", {"update": [{"id": c["id"]} for c in cuerpo["update"]]})
+
+
+class TestAsyncClienteWooCommerce(unittest.TestCase):
+    def setUp(self):
+        self.tienda = TiendaFalsa()
+        self.cliente = AsyncClienteWooCommerce(self.tienda.credenciales)
+
+    def tearDown(self):
+        self.tienda.detener()
+
+    def test_variaciones_en_vuelo_a_la_vez(self):
+        ids = list(range(1, 41))
+
+        with self.cliente.abierto():
+            resultados = self.cliente.correr(self.cliente.obtener_variaciones_productos(ids))
+
+        self.assertEqual([r.producto_id for r in resultados], ids)
+        self.assertTrue(all(r.ok for r in resultados))
+        self.assertEqual(resultados[4].variaciones, [{"id": 50, "stock_quantity": 5}])
+        self.assertGreater(self.tienda.maximo_en_vuelo, 1)
+
+    def test_cancelar_corta_las_peticiones_en_vuelo(self):
+        self.tienda.demora = 1
+        token = TokenCancelacion()
+        threading.Timer(0.2, token.cancelar).start()
+
+        inicio = time.monotonic()
+        with self.cliente.abierto(), self.cliente.cancelable(token):
+            with self.assertRaises(OperacionCancelada):
+                self.cliente.correr(self.cliente.obtener_variaciones_productos(range(1, 11)))
+            # El limitador quedó libre: el loop sigue sirviendo.
+            self.assertEqual(self.cliente._local.limitador._en_vuelo, 0)
+
+        self.assertLess(time.monotonic() - inicio, 0.8)
+
+    def test_lote_invalida_la_cache(self):
+        with self.cliente.abierto():
+            self.cliente.correr(self.cliente.obtener_producto(7))
+            self.cliente.correr(self.cliente.obtener_producto(7))
+            self.assertEqual(self.tienda.peticiones["producto/7"], 1)
+
+            self.cliente.correr(self.cliente.actualizar_productos_lote([{"id": 7, "stock": 3}]))
+            self.cliente.correr(self.cliente.obtener_producto(7))
+
+        self.assertEqual(self.tienda.peticiones["producto/7"], 2)
+
+    def test_reintenta_saturacion(self):
+        self.tienda.saturar = 2
+
+        variaciones = self.cliente.correr(self.cliente.obtener_variaciones_producto(3))
+
+        self.assertEqual(variaciones, [{"id": 30, "stock_quantity": 3}])
+        self.assertEqual(self.tienda.peticiones["variaciones/3"], 3)
+
+
+class TestCatalogoConClienteAsync(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.tienda = TiendaFalsa(demora=0)
+
+    def tearDown(self):
+        self.tienda.detener()
+        self.dir.cleanup()
+
+    def test_variaciones_por_el_cliente_async(self):
+        cliente = ClienteFalso()
+        catalogo = CatalogoLocal(
+            cliente,
+            ruta=os.path.join(self.dir.name, "catalogo.sqlite3"),
+            cliente_async=AsyncClienteWooCommerce(self.tienda.credenciales),
+        )
+
+        catalogo.sincronizar()
+
+        self.assertEqual(cliente.llamadas["variaciones_de_padre"], 0)
+        self.assertEqual(self.tienda.peticiones["variaciones/1"], 1)
+        self.assertEqual(catalogo.variaciones_por_producto()[1], [{"id": 10, "stock_quantity": 1}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+from datetime import date
+
+from app.core.cliente_woocommerce import (
+    PAGINAS_POR_TRAMO,
+    _params_tramo,
+    _sin_repetidos,
+    _tramos_fechas,
+)
+
+POR_TRAMO = 100 * PAGINAS_POR_TRAMO
+
+
+class TestTramosFechas(unittest.TestCase):
+    def _contiguos(self, tramos, desde, hasta):
+        self.assertEqual(tramos[0][0], desde)
+        self.assertEqual(tramos[-1][1], hasta)
+        for (_, fin), (inicio, _) in zip(tramos, tramos[1:]):
+            self.assertEqual((inicio - fin).days, 1)
+
+    def test_pocos_pedidos_un_tramo(self):
+        desde, hasta = date(2024, 1, 1), date(2024, 12, 31)
+        self.assertEqual(_tramos_fechas(desde, hasta, POR_TRAMO), [(desde, hasta)])
+        self.assertEqual(_tramos_fechas(desde, hasta, 0), [(desde, hasta)])
+
+    def test_un_dia_no_se_parte(self):
+        dia = date(2024, 3, 1)
+        self.assertEqual(_tramos_fechas(dia, dia, POR_TRAMO * 10), [(dia, dia)])
+
+    def test_tramos_de_semanas_enteras(self):
+        desde, hasta = date(2024, 1, 1), date(2024, 3, 31)
+        tramos = _tramos_fechas(desde, hasta, POR_TRAMO * 4)
+
+        self._contiguos(tramos, desde, hasta)
+        for a, b in tramos[:-1]:
+            self.assertEqual(((b - a).days + 1) % 7, 0)
+
+    def test_tramos_de_dias(self):
+        desde, hasta = date(2024, 1, 1), date(2024, 1, 10)
+        tramos = _tramos_fechas(desde, hasta, POR_TRAMO * 5)
+
+        self._contiguos(tramos, desde, hasta)
+        self.assertEqual(tramos[0], (date(2024, 1, 1), date(2024, 1, 2)))
+        self.assertEqual(len(tramos), 5)
+
+
+class TestParamsTramo(unittest.TestCase):
+    def setUp(self):
+        self.tramos = [
+            (date(2024, 1, 1), date(2024, 1, 7)),
+            (date(2024, 1, 8), date(2024, 1, 14)),
+            (date(2024, 1, 15), date(2024, 1, 20)),
+        ]
+
+    def test_extremos_como_rango_completo(self):
+        self.assertEqual(_params_tramo(self.tramos, 0)["after"], "2024-01-01T00:00:00Z")
+        self.assertEqual(_params_tramo(self.tramos, 2)["before"], "2024-01-20T23:59:59Z")
+
+    def test_cortes_a_medianoche(self):
+        primero, medio, ultimo = (_params_tramo(self.tramos, i) for i in range(3))
+
+        self.assertEqual(primero["before"], "2024-01-08T00:00:00Z")
+        self.assertEqual(medio["after"], "2024-01-07T23:59:59Z")
+        self.assertEqual(medio["before"], "2024-01-15T00:00:00Z")
+        self.assertEqual(ultimo["after"], "2024-01-14T23:59:59Z")
+
+    def test_filtros_de_pedidos(self):
+        params = _params_tramo(self.tramos, 1)
+        self.assertEqual((params["orderby"], params["order"], params["status"]), ("date", "asc", "any"))
+
+    def test_un_solo_tramo(self):
+        params = _params_tramo([(date(2024, 1, 1), date(2024, 1, 31))], 0)
+        self.assertEqual(params["after"], "2024-01-01T00:00:00Z")
+        self.assertEqual(params["before"], "2024-01-31T23:59:59Z")
+
+
+class TestSinRepetidos(unittest.TestCase):
+    def test_descarta_ids_ya_vistos(self):
+        vistos = set()
+        primera = _sin_repetidos([{"id": 1}, {"id": 2}], vistos)
+        segunda = _sin_repetidos([{"id": 2}, {"id": 3}, {"id": 3}], vistos)
+
+        self.assertEqual([o["id"] for o in primera], [1, 2])
+        self.assertEqual([o["id"] for o in segunda], [3])
+        self.assertEqual(vistos, {1, 2, 3})
+
+    def test_conserva_pedidos_sin_id(self):
+        self.assertEqual(_sin_repetidos([{"total": "1"}, {"total": "1"}], set()), [{"total": "1"}, {"total": "1"}])
+
+
+if __name__ == "__main__":
+    unittest.main()